@@ -0,0 +1,278 @@
+"""Общий для процессов кэш в файле SQLite.
+
+LocMemCache живёт внутри одного процесса: у каждого воркера свой кэш,
+а смена версии в одном процессе не видна остальным. Этот бэкенд хранит
+записи в одном файле SQLite в режиме WAL, поэтому все воркеры на хосте
+видят одни и те же данные, и внешний сервер при этом не нужен.
+
+Размер ограничен числом записей (MAX_ENTRIES) и объёмом (MAX_BYTES):
+при переполнении вытесняются давно не читанные записи (LRU). Целые числа
+хранятся как INTEGER, поэтому incr выполняется одним UPDATE.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+)
+
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_bytes = int(options.get('MAX_BYTES', 256 * 1024 * 1024))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self.mmap_size = int(options.get('MMAP_SIZE', 64 * 1024 * 1024))
+        # Время последнего чтения обновляется не чаще раза в столько секунд:
+        # точности LRU этого достаточно, а чтения не превращаются в записи
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.cull_interval = int(options.get('CULL_INTERVAL', 100))
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # После fork соединение родителя использовать нельзя
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, isolation_level=None,
+            check_same_thread=False,
+        )
+        for pragma in PRAGMAS:
+            connection.execute(pragma)
+        connection.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _row(self, key, value, timeout, now):
+        stored = self._dump(value)
+        size = 8 if isinstance(stored, int) else len(stored)
+        return key, stored, self.get_backend_timeout(timeout), now, size
+
+    @contextmanager
+    def _immediate(self):
+        """Транзакция с блокировкой записи с самого начала."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @metrics.timed('cache')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        row = self._row(self._key(key, version), value, timeout, now)
+        # Без UPSERT (SQLite 3.24): просроченную запись удаляем, живую
+        # INSERT OR IGNORE не трогает
+        with self._immediate() as connection:
+            connection.execute(
+                'DELETE FROM cache '
+                'WHERE key = ? AND expires IS NOT NULL AND expires <= ?',
+                (row[0], now),
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache '
+                '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+                row,
+            )
+        self._after_write(1)
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    @metrics.timed('cache')
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_map = {self._key(key, version): key for key in keys}
+        now = time.time()
+        connection = self._connection()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = connection.execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) AND {ALIVE}',
+            (*key_map, now),
+        ).fetchall()
+        stale = [
+            key for key, _, accessed in rows
+            if accessed < now - self.access_resolution
+        ]
+        if stale:
+            placeholders = ', '.join('?' * len(stale))
+            connection.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})',
+                (now, *stale),
+            )
+        found = {key_map[key]: self._load(value) for key, value, _ in rows}
+        metrics.cache_read(len(found), len(key_map) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    @metrics.timed('cache')
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [
+            self._row(self._key(key, version), value, timeout, now)
+            for key, value in data.items()
+        ]
+        if not rows:
+            return []
+        with self._immediate() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache '
+                '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+        self._after_write(len(rows))
+        return []
+
+    @metrics.timed('cache')
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        cursor = self._connection().execute(
+            f'UPDATE cache SET expires = ?, accessed = ? '
+            f'WHERE key = ? AND {ALIVE}',
+            (
+                self.get_backend_timeout(timeout), now,
+                self._key(key, version), now,
+            ),
+        )
+        return cursor.rowcount > 0
+
+    @metrics.timed('cache')
+    def incr(self, key, delta=1, version=None):
+        stored_key = self._key(key, version)
+        now = time.time()
+        # Без RETURNING (SQLite 3.35): новое значение читаем в той же
+        # транзакции
+        with self._immediate() as connection:
+            updated = connection.execute(
+                f'UPDATE cache SET value = value + ?, accessed = ? '
+                f"WHERE key = ? AND typeof(value) = 'integer' AND {ALIVE}",
+                (delta, now, stored_key, now),
+            ).rowcount
+            if updated:
+                return connection.execute(
+                    'SELECT value FROM cache WHERE key = ?', (stored_key,)
+                ).fetchone()[0]
+        if self.has_key(key, version=version):
+            raise TypeError(f'Значение по ключу {key!r} не целое число')
+        raise ValueError(f"Key '{key}' not found")
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    @metrics.timed('cache')
+    def delete_many(self, keys, version=None):
+        stored_keys = [self._key(key, version) for key in keys]
+        if stored_keys:
+            placeholders = ', '.join('?' * len(stored_keys))
+            self._connection().execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', stored_keys
+            )
+
+    @metrics.timed('cache')
+    def has_key(self, key, version=None):
+        row = self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return row is not None
+
+    @metrics.timed('cache')
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы потока: открывать файл заново
+        # на каждый запрос дороже, чем держать его
+        pass
+
+    def _after_write(self, rows):
+        self._writes += rows
+        if self._writes >= self.cull_interval:
+            self._writes = 0
+            self.cull()
+
+    def cull(self):
+        """Удаляет просроченные записи и вытесняет давно не читанные
+        сверх лимитов."""
+        with self._immediate() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+                (time.time(),),
+            )
+            entries, size = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+            if entries > self._max_entries or size > self.max_bytes:
+                # Как и встроенные бэкенды, освобождаем сразу долю кэша,
+                # чтобы не вытеснять по одной записи на каждую вставку
+                keep = min(entries, self._max_entries)
+                if self._cull_frequency:
+                    keep -= keep // self._cull_frequency
+                else:
+                    keep = 0
+                if size > self.max_bytes:
+                    keep = min(keep, int(entries * self.max_bytes / size))
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN '
+                    '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                    (entries - keep,),
+                )
@@ -0,0 +1,10 @@
+def query_budget(max_queries):
+    """Объявляет, сколько SQL-запросов может сделать запрос к view.
+
+    Бюджет проверяет core.middleware.QueryBudgetMiddleware; он считает
+    все запросы за время обработки, включая сессию и пользователя.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
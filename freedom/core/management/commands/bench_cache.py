@@ -0,0 +1,155 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.commands.createcachetable import (
+    Command as CreateCacheTable,
+)
+from django.db import connection, connections
+
+from core.cache import SQLiteCache
+
+BENCH_TABLE = 'bench_cache_table'
+
+
+def make_backends(directory):
+    return {
+        'locmem': lambda: LocMemCache('bench', {}),
+        'db': lambda: DatabaseCache(BENCH_TABLE, {}),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'bench.sqlite3'), {}
+        ),
+    }
+
+
+def timed(func, ops):
+    started = time.perf_counter()
+    func()
+    return ops / (time.perf_counter() - started)
+
+
+def single_process(cache, ops, value):
+    keys = [f'key:{num}' for num in range(ops)]
+    results = {
+        'set': timed(lambda: [cache.set(key, value) for key in keys], ops),
+        'get': timed(lambda: [cache.get(key) for key in keys], ops),
+        'get_many(10)': timed(
+            lambda: [
+                cache.get_many(keys[num:num + 10])
+                for num in range(0, ops, 10)
+            ],
+            ops,
+        ),
+    }
+    cache.set('counter', 0)
+    results['incr'] = timed(
+        lambda: [cache.incr('counter') for _ in range(ops)], ops
+    )
+    return results
+
+
+def worker(factory, index, workers, ops, value, barrier, queue):
+    # Каждый процесс пишет свою часть ключей, а читает все: доля попаданий
+    # показывает, видят ли процессы записи друг друга
+    try:
+        cache = factory()
+        own = [f'shared:{num}' for num in range(index, ops, workers)]
+        for key in own:
+            cache.set(key, value)
+        barrier.wait()
+        started = time.perf_counter()
+        hits = sum(
+            cache.get(f'shared:{num}') is not None for num in range(ops)
+        )
+        for _ in range(len(own)):
+            cache.incr('counter')
+        queue.put((hits, time.perf_counter() - started))
+    except Exception as error:
+        barrier.abort()
+        queue.put(error)
+
+
+def multi_process(factory, workers, ops, value):
+    cache = factory()
+    cache.clear()
+    cache.set('counter', 0)
+    # Соединения с БД нельзя делить между процессами после fork
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    queue = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(factory, index, workers, ops, value, barrier, queue),
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise CommandError(f'Ошибка в процессе бенчмарка: {errors[0]!r}')
+    hits = sum(hits for hits, _ in results)
+    elapsed = max(elapsed for _, elapsed in results)
+    try:
+        counter = factory().get('counter')
+    except ValueError:
+        counter = None
+    return {
+        'ops/s': (ops * workers + ops) / elapsed,
+        'hit rate': hits / (ops * workers),
+        'incr': f'{counter}/{ops}',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша: LocMemCache, кэш в БД и общий кэш в SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ops', type=int, default=2000, help='Операций каждого вида',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Процессов в многопроцессном тесте',
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=1000,
+            help='Размер значения в байтах',
+        )
+
+    def handle(self, *args, ops, workers, value_size, **options):
+        value = 'x' * value_size
+        create_table = CreateCacheTable()
+        create_table.verbosity = 0
+        create_table.create_table(connection.alias, BENCH_TABLE, False)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for name, factory in make_backends(directory).items():
+                    self.stdout.write(self.style.MIGRATE_HEADING(name))
+                    rates = single_process(factory(), ops, value)
+                    for operation, rate in rates.items():
+                        self.stdout.write(
+                            f'  {operation:<14}{rate:>12,.0f} ops/s'
+                        )
+                    shared = multi_process(factory, workers, ops, value)
+                    self.stdout.write(
+                        f'  процессов {workers}: '
+                        f'{shared["ops/s"]:,.0f} ops/s, '
+                        f'попаданий {shared["hit rate"]:.0%}, '
+                        f'incr {shared["incr"]}'
+                    )
+        finally:
+            table = connection.ops.quote_name(BENCH_TABLE)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+# Нагрузка похожа на сайт: писатели добавляют комментарий и меняют счётчик
+# поста в одной транзакции (чтение, потом запись - как add_comment),
+# читатели листают ленту по индексу
+SCHEMA = (
+    'CREATE TABLE bench_post (id INTEGER PRIMARY KEY, pub_date REAL NOT NULL, '
+    'text TEXT NOT NULL, comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX bench_post_date ON bench_post (pub_date DESC, id DESC)',
+    'CREATE TABLE bench_comment (id INTEGER PRIMARY KEY, '
+    'post_id INTEGER NOT NULL, text TEXT NOT NULL, created REAL NOT NULL)',
+)
+FEED_SQL = (
+    'SELECT id, text, comments_count FROM bench_post '
+    'ORDER BY pub_date DESC, id DESC LIMIT 10 OFFSET %s'
+)
+
+
+def make_profiles(path):
+    """Псевдонимы баз: настройки Django по умолчанию и профиль сайта."""
+    plain = {
+        'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'PRAGMAS': {},
+    }
+    production = {
+        'ENGINE': settings.DATABASES['default']['ENGINE'],
+        'NAME': path,
+        'PRAGMAS': settings.SQLITE_PRAGMAS,
+    }
+    return {
+        'django': {
+            'write': 'bench_plain',
+            'read': 'bench_plain',
+            'databases': {'bench_plain': plain},
+        },
+        'production': {
+            'write': 'bench_write',
+            'read': 'bench_read',
+            'databases': {
+                'bench_write': production,
+                'bench_read': {**production, 'READ_ONLY': True},
+            },
+        },
+    }
+
+
+def create_schema(alias, posts):
+    with connections[alias].cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        now = time.time()
+        cursor.executemany(
+            'INSERT INTO bench_post (pub_date, text) VALUES (%s, %s)',
+            [(now - num, f'Пост {num}') for num in range(posts)],
+        )
+
+
+def write_once(alias, post_id):
+    connection = connections[alias]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT comments_count FROM bench_post WHERE id = %s', [post_id]
+        )
+        count = cursor.fetchone()[0]
+        cursor.execute(
+            'INSERT INTO bench_comment (post_id, text, created) '
+            'VALUES (%s, %s, %s)',
+            [post_id, 'Комментарий', time.time()],
+        )
+        cursor.execute(
+            'UPDATE bench_post SET comments_count = %s WHERE id = %s',
+            [count + 1, post_id],
+        )
+
+
+def read_once(alias, page):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(FEED_SQL, [page * 10])
+        cursor.fetchall()
+
+
+def worker(kind, alias, posts, seconds, barrier, queue):
+    try:
+        # Соединения родителя после fork не трогаем, открываем свои
+        for connection in connections.all():
+            connection.connection = None
+        latencies = []
+        errors = 0
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        num = os.getpid()
+        while time.perf_counter() < deadline:
+            num += 1
+            started = time.perf_counter()
+            try:
+                if kind == 'write':
+                    write_once(alias, num % posts + 1)
+                else:
+                    read_once(alias, num % 50)
+            except OperationalError:
+                # «database is locked»: запрос сайта получил бы ошибку 500
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+        queue.put((kind, latencies, errors))
+    except Exception as error:
+        barrier.abort()
+        queue.put(error)
+
+
+def run(profile, writers, readers, posts, seconds):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(writers + readers)
+    queue = context.Queue()
+    jobs = (
+        [('write', profile['write'])] * writers
+        + [('read', profile['read'])] * readers
+    )
+    connections.close_all()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(kind, alias, posts, seconds, barrier, queue),
+        )
+        for kind, alias in jobs
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        raise CommandError(f'Ошибка в процессе бенчмарка: {failures[0]!r}')
+    summary = {}
+    for kind in ('write', 'read'):
+        own = [result for result in results if result[0] == kind]
+        latencies = sorted(
+            latency for _, values, _ in own for latency in values
+        )
+        errors = sum(count for _, _, count in own)
+        summary[kind] = (latencies, errors)
+    return summary
+
+
+def percentile(values, share):
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite с настройками Django по умолчанию и профиль сайта '
+        '(WAL, прагмы, BEGIN IMMEDIATE, отдельное соединение для чтения) '
+        'при параллельных записях и чтениях из нескольких процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers', type=int, default=4, help='Процессов-писателей'
+        )
+        parser.add_argument(
+            '--readers', type=int, default=8, help='Процессов-читателей'
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого прогона',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=10000, help='Постов в тестовой базе'
+        )
+
+    def handle(self, *args, writers, readers, seconds, posts, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            profiles = make_profiles(os.path.join(directory, 'bench.sqlite3'))
+            for name, profile in profiles.items():
+                path = next(iter(profile['databases'].values()))['NAME']
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                connections.databases.update(profile['databases'])
+                try:
+                    create_schema(profile['write'], posts)
+                    summary = run(profile, writers, readers, posts, seconds)
+                finally:
+                    for alias in profile['databases']:
+                        connections[alias].close()
+                        del connections.databases[alias]
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for kind, (latencies, errors) in summary.items():
+                    self.stdout.write(
+                        f'  {kind:<6}{len(latencies) / seconds:>10,.0f} оп/с  '
+                        f'p50 {percentile(latencies, 0.5) * 1000:.2f} мс  '
+                        f'p99 {percentile(latencies, 0.99) * 1000:.2f} мс  '
+                        f'ошибок блокировки {errors}'
+                    )
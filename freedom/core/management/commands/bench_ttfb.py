@@ -0,0 +1,92 @@
+import time
+import uuid
+from statistics import median
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.cache import UpdateCacheMiddleware
+from django.test import Client, override_settings
+
+from .bench_db import percentile
+
+
+def measure(client, url):
+    """Время до первого байта и до конца ответа в секундах.
+
+    Адрес получает уникальный параметр, чтобы не попасть в кэш страниц;
+    кэш карточек остаётся общим для обоих режимов.
+    """
+    separator = '&' if '?' in url else '?'
+    started = time.perf_counter()
+    response = client.get(f'{url}{separator}bench={uuid.uuid4().hex}')
+    if response.status_code != 200:
+        raise CommandError(f'{url}: ответ {response.status_code}')
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        next(chunks, b'')
+        first_byte = time.perf_counter() - started
+        for _ in chunks:
+            pass
+    else:
+        first_byte = time.perf_counter() - started
+    return first_byte, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время до первого байта и полное время ответа страниц '
+        'при обычном и потоковом рендере (STREAMING_RENDER)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=['/'], help='Адреса страниц'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на адрес и режим',
+        )
+        parser.add_argument(
+            '--user', help='Пользователь, от имени которого открывать страницы'
+        )
+
+    def handle(self, *args, urls, requests, user, **options):
+        # Адрес не из INTERNAL_IPS: debug toolbar встраивается только в обычные
+        # ответы и исказил бы сравнение
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        if user:
+            try:
+                client.force_login(
+                    get_user_model().objects.get(username=user)
+                )
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'Нет пользователя {user}')
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        for url in urls:
+            self.stdout.write(self.style.MIGRATE_HEADING(url))
+            for name, streaming in (('обычный', False), ('потоковый', True)):
+                # Сравниваем рендер: сохранение обычных страниц в кэш
+                # не засчитываем
+                overrides = override_settings(
+                    STREAMING_RENDER=streaming, ALLOWED_HOSTS=allowed_hosts
+                )
+                no_cache_update = mock.patch.object(
+                    UpdateCacheMiddleware, '_should_update_cache',
+                    return_value=False,
+                )
+                with overrides, no_cache_update:
+                    # Первый запрос прогревает шаблоны, соединения
+                    # и кэш карточек
+                    measure(client, url)
+                    results = [measure(client, url) for _ in range(requests)]
+                first_bytes = sorted(first_byte for first_byte, _ in results)
+                totals = sorted(total for _, total in results)
+                self.stdout.write(
+                    f'  {name:<10}первый байт '
+                    f'p50 {median(first_bytes) * 1000:.2f} мс  '
+                    f'p95 {percentile(first_bytes, 0.95) * 1000:.2f} мс  '
+                    f'весь ответ p50 {median(totals) * 1000:.2f} мс  '
+                    f'p95 {percentile(totals, 0.95) * 1000:.2f} мс'
+                )
@@ -0,0 +1,354 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+Каждый процесс копит значения в словаре в памяти: на горячем пути нет
+обращений к диску, только короткая блокировка словаря от потоков
+сервера. Раз в METRICS_FLUSH_INTERVAL секунд
+(проверяется в конце запроса) накопленное прибавляется к общему файлу
+SQLite METRICS_DB, поэтому страница метрик показывает сумму по всем
+воркерам и процессам пула миниатюр.
+
+Гистограммы хранятся по корзинам без накопления; накопленные значения
+le считаются при выводе.
+
+Те же счётчики запроса дают заголовок Server-Timing и строку лога
+с разбивкой по фазам: SQL, кэш, шаблоны и миниатюры.
+"""
+import atexit
+import bisect
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+# Строки разбивки запросов по фазам (SERVER_TIMING_LOG), одна на запрос
+timing_logger = logging.getLogger('core.metrics.timing')
+
+# Имя: (тип, описание)
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по view, методу и статусу ответа',
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса по view',
+    ),
+    'yatube_db_queries_total': ('counter', 'SQL-запросы по view'),
+    'yatube_db_query_seconds_total': ('counter', 'Время SQL-запросов по view'),
+    'yatube_cache_hits_total': ('counter', 'Найденные в кэше ключи по view'),
+    'yatube_cache_misses_total': (
+        'counter', 'Не найденные в кэше ключи по view',
+    ),
+    'yatube_cache_seconds_total': (
+        'counter', 'Время обращений к кэшу по view',
+    ),
+    'yatube_thumbnail_seconds': (
+        'histogram', 'Время создания миниатюр и вариантов картинки поста',
+    ),
+}
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKET_LABELS = tuple(f'{bound:g}' for bound in BUCKETS) + ('+Inf',)
+# Фазы запроса для Server-Timing и лога; всё остальное - код приложения
+PHASES = ('db', 'cache', 'template', 'thumbnail')
+# Метка view для работы вне запросов: фоновые задачи, команды
+BACKGROUND = 'background'
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS metrics ('
+    ' name TEXT NOT NULL,'
+    ' labels TEXT NOT NULL,'
+    ' le TEXT NOT NULL,'
+    ' value REAL NOT NULL,'
+    ' PRIMARY KEY (name, labels, le)'
+    ') WITHOUT ROWID'
+)
+# Без UPSERT (SQLite 3.24): создаём недостающие строки и прибавляем
+INSERT = (
+    'INSERT OR IGNORE INTO metrics (name, labels, le, value) '
+    'VALUES (?, ?, ?, 0)'
+)
+ADD = (
+    'UPDATE metrics SET value = value + ? '
+    'WHERE name = ? AND labels = ? AND le = ?'
+)
+
+# (имя, метки, le) -> прирост с последнего сброса в файл
+_values = defaultdict(float)
+# Потоки сервера пишут в _values, пока flush подменяет словарь
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_local = threading.local()
+_db = threading.local()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; попадают в общие метрики с именем view.
+
+    Время считается по фазам (PHASES) без пересечений: время вложенных фаз
+    вычитается из внешней, например SQL хранилища ключей sorl попадает
+    в db, а не в thumbnail.
+    """
+    __slots__ = (
+        'queries', 'cache_hits', 'cache_misses', 'phases', '_stack',
+        '_accounted',
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._stack = []
+        self._accounted = 0.0
+
+    def enter(self):
+        self._stack.append((time.perf_counter(), self._accounted))
+
+    def leave(self, phase):
+        started, accounted = self._stack.pop()
+        own = time.perf_counter() - started - (self._accounted - accounted)
+        self.phases[phase] += own
+        self._accounted += own
+
+
+def labels(**values):
+    return ','.join(f'{name}="{value}"' for name, value in values.items())
+
+
+def inc(name, label_string='', value=1):
+    with _lock:
+        _values[name, label_string, ''] += value
+
+
+def observe(name, label_string, value):
+    bucket = BUCKET_LABELS[bisect.bisect_left(BUCKETS, value)]
+    with _lock:
+        _values[f'{name}_bucket', label_string, bucket] += 1
+        _values[f'{name}_sum', label_string, ''] += value
+        _values[f'{name}_count', label_string, ''] += 1
+
+
+def start_request(current=None):
+    """Делает счётчики текущими для потока; без аргумента - новые."""
+    current = _local.current = current or RequestMetrics()
+    return current
+
+
+def current_request():
+    return getattr(_local, 'current', None)
+
+
+def finish_request(view, method, status, seconds, current):
+    _local.current = None
+    view_labels = labels(view=view)
+    inc(
+        'yatube_requests_total',
+        labels(view=view, method=method, status=status),
+    )
+    observe('yatube_request_duration_seconds', view_labels, seconds)
+    _add_counters(view_labels, current)
+    maybe_flush()
+
+
+def _add_counters(view_labels, current):
+    if current.queries:
+        inc('yatube_db_queries_total', view_labels, current.queries)
+        inc('yatube_db_query_seconds_total', view_labels, current.phases['db'])
+    if current.cache_hits or current.cache_misses:
+        inc('yatube_cache_hits_total', view_labels, current.cache_hits)
+        inc('yatube_cache_misses_total', view_labels, current.cache_misses)
+    if current.phases['cache']:
+        inc('yatube_cache_seconds_total', view_labels, current.phases['cache'])
+
+
+def cache_read(hits, misses):
+    """Учитывает чтение кэша: в счётчиках текущего запроса или как фоновое."""
+    current = current_request()
+    if current is None:
+        background = RequestMetrics()
+        background.cache_hits, background.cache_misses = hits, misses
+        _add_counters(labels(view=BACKGROUND), background)
+        return
+    current.cache_hits += hits
+    current.cache_misses += misses
+
+
+def timed(phase):
+    """Декоратор: время вызова идёт в фазу текущего запроса.
+
+    Вне запроса функция вызывается как есть.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current = getattr(_local, 'current', None)
+            if current is None:
+                return func(*args, **kwargs)
+            current.enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                current.leave(phase)
+        return wrapper
+    return decorator
+
+
+class QueryTimer:
+    """execute_wrapper: число и время SQL-запросов текущего запроса."""
+
+    def __init__(self, current):
+        self.current = current
+
+    def __call__(self, execute, sql, params, many, context):
+        self.current.enter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.current.queries += 1
+            self.current.leave('db')
+
+
+def server_timing(current, seconds):
+    """Значение заголовка Server-Timing: фазы запроса и общее время в мс."""
+    phases = current.phases
+    return ', '.join((
+        f'db;dur={phases["db"] * 1000:.2f};desc="{current.queries} SQL"',
+        f'cache;dur={phases["cache"] * 1000:.2f};'
+        f'desc="{current.cache_hits} hit, {current.cache_misses} miss"',
+        f'template;dur={phases["template"] * 1000:.2f}',
+        f'thumbnail;dur={phases["thumbnail"] * 1000:.2f}',
+        f'total;dur={seconds * 1000:.2f}',
+    ))
+
+
+def timing_record(current, seconds, **fields):
+    """Разбивка запроса по фазам для структурированного лога."""
+    record = dict(fields)
+    record['total_ms'] = round(seconds * 1000, 2)
+    for phase, phase_seconds in current.phases.items():
+        record[f'{phase}_ms'] = round(phase_seconds * 1000, 2)
+    record['db_queries'] = current.queries
+    record['cache_hits'] = current.cache_hits
+    record['cache_misses'] = current.cache_misses
+    return record
+
+
+def _connection():
+    connection = getattr(_db, 'connection', None)
+    # После fork соединение родителя использовать нельзя
+    key = (os.getpid(), settings.METRICS_DB)
+    if connection is not None and _db.key == key:
+        return connection
+    connection = sqlite3.connect(
+        settings.METRICS_DB, timeout=5, isolation_level=None,
+        check_same_thread=False,
+    )
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute(SCHEMA)
+    _db.connection = connection
+    _db.key = key
+    return connection
+
+
+def flush():
+    """Прибавляет накопленное в процессе к общему файлу метрик."""
+    global _values, _last_flush
+    with _lock:
+        _last_flush = time.monotonic()
+        pending, _values = _values, defaultdict(float)
+    if not pending:
+        return
+    try:
+        connection = _connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(INSERT, pending)
+            connection.executemany(
+                ADD, [(value, *key) for key, value in pending.items()]
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+    except sqlite3.Error:
+        logger.warning('Не удалось сохранить метрики', exc_info=True)
+        # Значения не теряем: прибавятся при следующем сбросе
+        with _lock:
+            for key, value in pending.items():
+                _values[key] += value
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _histogram_lines(base, rows):
+    buckets = defaultdict(dict)
+    totals = []
+    for name, label_string, le, value in rows:
+        if le:
+            buckets[label_string][le] = value
+        else:
+            totals.append((name, label_string, value))
+    lines = []
+    # Корзины хранятся только непустые, выводятся все
+    for label_string in sorted(buckets):
+        cumulative = 0
+        prefix = f'{label_string},' if label_string else ''
+        for le in BUCKET_LABELS:
+            cumulative += buckets[label_string].get(le, 0)
+            lines.append(f'{base}_bucket{{{prefix}le="{le}"}} {cumulative:g}')
+    return lines + _counter_lines(totals)
+
+
+def _counter_lines(rows):
+    return [
+        f'{name}{{{label_string}}} {value:g}' if label_string
+        else f'{name} {value:g}'
+        for name, label_string, value in sorted(rows)
+    ]
+
+
+def render():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    flush()
+    by_metric = defaultdict(list)
+    for name, label_string, le, value in _connection().execute(
+        'SELECT name, labels, le, value FROM metrics'
+    ):
+        base = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                base = name[:-len(suffix)]
+        by_metric[base].append((name, label_string, le, value))
+    lines = []
+    for base, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {base} {description}')
+        lines.append(f'# TYPE {base} {kind}')
+        rows = by_metric.get(base, ())
+        if kind == 'histogram':
+            lines.extend(_histogram_lines(base, rows))
+        else:
+            lines.extend(_counter_lines(
+                (name, label_string, value)
+                for name, label_string, _, value in rows
+            ))
+    return '\n'.join(lines) + '\n'
+
+
+def _forget_parent_values():
+    global _lock
+    # Несброшенные значения родителя сбросит сам родитель; блокировку
+    # в момент fork мог держать другой поток родителя
+    _lock = threading.Lock()
+    _values.clear()
+
+
+atexit.register(flush)
+os.register_at_fork(after_in_child=_forget_parent_values)
@@ -0,0 +1,148 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self, ignore_tables=()):
+        self.count = 0
+        self.ignore_tables = tuple(ignore_tables)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not any(table in sql for table in self.ignore_tables):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы по имени view и сверяет их с @query_budget.
+
+    В DEBUG и в тестах превышение бюджета поднимает QueryBudgetExceeded,
+    иначе пишется предупреждение в лог. Последние замеры доступны в stats.
+    """
+    # view_name -> (запросов в последнем обращении, максимум)
+    stats = {}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter(settings.QUERY_BUDGET_IGNORE_TABLES)
+        with self.counting(counter):
+            response = self.get_response(request)
+        if response.streaming:
+            # Потоковый ответ делает запросы, пока его читает сервер:
+            # досчитываем их и сверяем бюджет в конце потока
+            response.streaming_content = self.counted_stream(
+                request, counter, response.streaming_content
+            )
+            return response
+        self.check(request, counter.count)
+        return response
+
+    @staticmethod
+    def counting(counter):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        return stack
+
+    def counted_stream(self, request, counter, content):
+        with self.counting(counter):
+            yield from content
+        self.check(request, counter.count)
+
+    def check(self, request, count):
+        match = request.resolver_match
+        if match is None:
+            return
+        _, maximum = self.stats.get(match.view_name, (0, 0))
+        self.stats[match.view_name] = (count, max(maximum, count))
+        budget = getattr(match.func, 'query_budget', None)
+        if budget is not None and count > budget:
+            message = (
+                f'{match.view_name}: {count} SQL-запросов '
+                f'при бюджете {budget} ({request.get_full_path()})'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+def timings_visible(request):
+    """Можно ли показать клиенту разбивку запроса по фазам."""
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class MetricsMiddleware:
+    """Пишет в core.metrics время ответа, статус, SQL-запросы и чтения кэша
+    по имени view. Стоит первым, чтобы время включало остальные middleware.
+
+    С SERVER_TIMING_LOG разбивка запроса по фазам пишется в лог.
+    С SERVER_TIMING та же разбивка уходит в заголовке Server-Timing,
+    но только адресам METRICS_ALLOWED_IPS и сотрудникам: остальным число
+    запросов и время фаз не показываем. У потоковых ответов заголовки
+    уходят раньше, чем известны фазы, поэтому разбивка для них есть
+    только в логе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        current = metrics.start_request()
+        with QueryBudgetMiddleware.counting(metrics.QueryTimer(current)):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.timed_stream(
+                request, response, started, current, response.streaming_content
+            )
+            return response
+        self.finish(request, response, started, current)
+        return response
+
+    def timed_stream(self, request, response, started, current, content):
+        metrics.start_request(current)
+        with QueryBudgetMiddleware.counting(metrics.QueryTimer(current)):
+            yield from content
+        self.finish(request, response, started, current)
+
+    @staticmethod
+    def finish(request, response, started, current):
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.finish_request(
+            view=view,
+            method=request.method,
+            status=response.status_code,
+            seconds=seconds,
+            current=current,
+        )
+        if (settings.SERVER_TIMING and not response.streaming
+                and timings_visible(request)):
+            response['Server-Timing'] = metrics.server_timing(current, seconds)
+        if settings.SERVER_TIMING_LOG:
+            record = metrics.timing_record(
+                current, seconds, view=view, method=request.method,
+                path=request.path, status=response.status_code,
+            )
+            metrics.timing_logger.info(
+                json.dumps(record), extra={'timing': record}
+            )
@@ -0,0 +1,40 @@
+from django.db import connections
+
+WRITE_DB = 'default'
+
+
+def is_read_only(alias):
+    return bool(connections.databases[alias].get('READ_ONLY'))
+
+
+class ReadWriteRouter:
+    """Чтения - через соединение только для чтения, записи - через основное.
+
+    Обе базы - один файл SQLite: в режиме WAL читатели не ждут писателя
+    и сразу видят закоммиченные данные, поэтому отставания реплики нет.
+    Внутри транзакции основного соединения чтения остаются на нём:
+    они должны видеть её незакоммиченные изменения.
+    """
+
+    def __init__(self):
+        self.read_db = next(
+            (
+                alias for alias in connections.databases
+                if is_read_only(alias)
+            ),
+            None,
+        )
+
+    def db_for_read(self, model, **hints):
+        if self.read_db is None or connections[WRITE_DB].in_atomic_block:
+            return WRITE_DB
+        return self.read_db
+
+    def db_for_write(self, model, **hints):
+        return WRITE_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return not is_read_only(db)
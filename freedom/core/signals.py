@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Прагмы, которые нельзя выполнить на соединении только для чтения
+WRITE_PRAGMAS = ('journal_mode',)
+
+
+def pragma_statements(pragmas, read_only=False):
+    for name, value in pragmas.items():
+        if read_only and name in WRITE_PRAGMAS:
+            continue
+        yield f'PRAGMA {name} = {value}'
+    if read_only:
+        yield 'PRAGMA query_only = ON'
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite.
+
+    Прагмы берутся из PRAGMAS в настройках базы, по умолчанию - SQLITE_PRAGMAS.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', settings.SQLITE_PRAGMAS)
+    read_only = connection.settings_dict.get('READ_ONLY', False)
+    # Напрямую через sqlite3: прагмы - не запросы view и не должны
+    # попадать в подсчёт запросов и журнал отладки
+    for statement in pragma_statements(pragmas, read_only):
+        connection.connection.execute(statement)
@@ -0,0 +1,19 @@
+"""SQLite с транзакциями BEGIN IMMEDIATE для соединения-писателя.
+
+Обычный BEGIN откладывает блокировку до первой записи. Если к этому
+моменту другой процесс уже что-то записал, SQLite в режиме WAL сразу
+отвечает «database is locked», не дожидаясь busy_timeout. BEGIN IMMEDIATE
+берёт блокировку записи в начале транзакции, и писатели встают в очередь
+через busy_timeout. Соединения с READ_ONLY в настройках базы ничего
+не пишут и начинают транзакции обычным BEGIN.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        if self.settings_dict.get('READ_ONLY'):
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute('BEGIN IMMEDIATE')
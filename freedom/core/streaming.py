@@ -0,0 +1,204 @@
+"""Потоковый рендер шаблонов.
+
+Обычный render() собирает страницу целиком и только потом отдаёт первый
+байт. Здесь шаблон обходится по узлам: всё до первого потокового
+фрагмента (шапка, навигация, заголовок страницы) рендерится сразу
+и уходит клиенту, а фрагменты StreamedHTML - например, карточки постов -
+отдаются по одному по мере готовности. Наследование шаблонов ({% extends %}
+и {% block %}) разворачивается так же, как при обычном рендере, поэтому
+шаблоны менять не нужно. Потоковые фрагменты внутри {% if %} тоже
+отдаются по частям; внутри остальных тегов ({% for %}, {% with %}
+и т. п.) фрагмент рендерится одной строкой.
+
+_iter_block, _iter_extends и _iter_if повторяют внутренности
+BlockNode.render, ExtendsNode.render и IfNode.render Django 2.2. При
+обновлении Django их нужно сверить с новой версией; совпадение
+с обычным рендером проверяет posts.tests.test_streaming.
+
+Режим включается настройкой STREAMING_RENDER. Такие ответы не попадают
+в кэш страниц: cache_page не сохраняет потоковые ответы.
+"""
+import logging
+
+from django.conf import settings
+from django.core.signals import got_request_exception
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render as render_page
+from django.template import loader
+from django.template.base import TextNode, VariableDoesNotExist
+from django.template.context import make_context
+from django.template.defaulttags import IfNode
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode,
+)
+
+logger = logging.getLogger('django.request')
+
+ERROR_TEMPLATE = 'includes/stream_error.html'
+
+
+class StreamedHTML:
+    """Безопасный HTML из нескольких частей.
+
+    В обычном рендере превращается в одну строку, в потоковом каждая
+    часть отдаётся клиенту отдельно, как только готова. Части можно
+    прочитать только один раз.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __str__(self):
+        return ''.join(self.chunks)
+
+    def __html__(self):
+        return self
+
+
+def _iter_block(node, context):
+    # Повторяет BlockNode.render, но отдаёт части по одной
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            yield from iter_nodes(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+        yield from iter_nodes(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
+
+
+def _iter_extends(node, context):
+    # Повторяет ExtendsNode.render, но обходит узлы родителя по одному
+    compiled_parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for parent_node in compiled_parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                parent_blocks = compiled_parent.nodelist.get_nodes_by_type(
+                    BlockNode
+                )
+                blocks = {block.name: block for block in parent_blocks}
+                block_context.add_blocks(blocks)
+            break
+    with context.render_context.push_state(
+        compiled_parent, isolated_context=False
+    ):
+        yield from iter_nodes(compiled_parent.nodelist, context)
+
+
+def _iter_if(node, context):
+    # Повторяет IfNode.render: выводится первая ветка с истинным условием
+    for condition, nodelist in node.conditions_nodelists:
+        if condition is None:
+            match = True
+        else:
+            try:
+                match = condition.eval(context)
+            except VariableDoesNotExist:
+                match = None
+        if match:
+            yield from iter_nodes(nodelist, context)
+            return
+
+
+def iter_nodes(nodelist, context):
+    """Части вывода узлов по порядку; StreamedHTML отдаётся как есть."""
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            yield from _iter_extends(node, context)
+        elif isinstance(node, BlockNode):
+            yield from _iter_block(node, context)
+        elif isinstance(node, IfNode):
+            yield from _iter_if(node, context)
+        else:
+            bit = node.render_annotated(context)
+            yield bit if isinstance(bit, StreamedHTML) else str(bit)
+
+
+def iter_template(template_name, context, request):
+    """Строки страницы: накопленный текст уходит перед каждым потоковым
+    фрагментом."""
+    backend_template = loader.get_template(template_name)
+    template = backend_template.template
+    context = make_context(
+        context, request,
+        autoescape=backend_template.backend.engine.autoescape,
+    )
+    buffer = []
+    with context.render_context.push_state(template), \
+            context.bind_template(template):
+        context.template_name = template.name
+        for bit in iter_nodes(template.nodelist, context):
+            if not isinstance(bit, StreamedHTML):
+                buffer.append(bit)
+                continue
+            if buffer:
+                yield ''.join(buffer)
+                buffer = []
+            for chunk in bit:
+                yield str(chunk)
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _guard(request, chunks):
+    """Ошибку после начала ответа уже не превратить в страницу 500:
+    пишем её в лог и закрываем страницу коротким сообщением."""
+    try:
+        yield from chunks
+    except Exception:
+        if settings.DEBUG:
+            raise
+        logger.exception('Ошибка при потоковом рендере %s', request.path)
+        got_request_exception.send(sender=None, request=request)
+        yield loader.render_to_string(ERROR_TEMPLATE, request=request)
+
+
+def stream_render(request, template_name, context=None, content_type=None,
+                  status=None):
+    """Как render(), но отдаёт страницу по частям.
+
+    Начало страницы рендерится сразу: ошибка в нём ещё приводит к обычной
+    странице ошибки. Сессия и CSRF-токен запрашиваются заранее, потому что
+    middleware обработают ответ до того, как шаблон дойдёт
+    до {% csrf_token %}
+    или данных пользователя.
+    """
+    request.user.is_authenticated
+    get_token(request)
+    chunks = iter_template(template_name, context or {}, request)
+    first = next(chunks, '')
+    response = StreamingHttpResponse(
+        _guard(request, _prepend(first, chunks)),
+        content_type=content_type, status=status,
+    )
+    return response
+
+
+def _prepend(first, chunks):
+    yield first
+    yield from chunks
+
+
+def render(request, template_name, context=None, content_type=None,
+           status=None):
+    """render() или stream_render() в зависимости от STREAMING_RENDER."""
+    if settings.STREAMING_RENDER:
+        return stream_render(
+            request, template_name, context, content_type, status
+        )
+    return render_page(request, template_name, context, content_type, status)
@@ -0,0 +1,20 @@
+"""Шаблоны Django, время рендера которых попадает в фазу template запроса."""
+from django.template.backends import django
+
+from . import metrics
+
+
+class Template(django.Template):
+
+    @metrics.timed('template')
+    def render(self, context=None, request=None):
+        return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -1,6 +1,28 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import views
+
+from . import metrics
+from .cache import SQLiteCache
+from .middleware import QueryBudgetExceeded, QueryBudgetMiddleware
+from .routers import ReadWriteRouter
+
+User = get_user_model()
 
 
 class CoreViewsTests(TestCase):
@@ -9,3 +31,302 @@ class CoreViewsTests(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+
+    def test_queries_are_recorded_per_view(self):
+        """Число запросов записывается по имени view."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/group/nonexist/')
+        last, maximum = QueryBudgetMiddleware.stats['posts:group_list']
+        self.assertEqual(last, len(context.captured_queries))
+        self.assertGreaterEqual(maximum, last)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_budget_exceeded_raises(self):
+        """Превышение бюджета запросов поднимает исключение."""
+        with mock.patch.object(views.group_posts, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/group/nonexist/')
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_budget_exceeded_logs_warning(self):
+        """Без строгого режима превышение бюджета только пишется в лог."""
+        with mock.patch.object(views.group_posts, 'query_budget', 0):
+            with self.assertLogs('core.middleware', 'WARNING'):
+                response = self.client.get('/group/nonexist/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+def _incr_in_process(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+def _count_in_process(times):
+    for _ in range(times):
+        metrics.inc('yatube_requests_total', metrics.labels(view='worker'))
+    metrics.flush()
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        # Отдельный файл на тест: значения других тестов не мешают
+        metrics.flush()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(METRICS_DB=os.path.join(directory.name, 'metrics.sqlite3'))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_requests_are_exposed_per_view(self):
+        """Страница метрик показывает запросы и гистограмму времени по view."""
+        self.client.get('/')
+        response = self.client.get('/internal/metrics/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertRegex(text, r'yatube_requests_total\{view="posts:index",method="GET",status="200"\} \d+')
+        self.assertRegex(
+            text, r'yatube_request_duration_seconds_bucket\{view="posts:index",le="\+Inf"\} \d+'
+        )
+        self.assertRegex(text, r'yatube_cache_hits_total\{view="posts:index"\} \d+')
+
+    def test_hidden_from_external_addresses(self):
+        """С адреса не из METRICS_ALLOWED_IPS страницы метрик нет."""
+        response = self.client.get('/internal/metrics/', REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Корзины гистограммы выводятся накопленными, с суммой и числом."""
+        for seconds in (0.001, 0.02, 20):
+            metrics.observe('yatube_thumbnail_seconds', '', seconds)
+        text = metrics.render()
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="0.005"} 1\n', text)
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="10"} 2\n', text)
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('yatube_thumbnail_seconds_count 3\n', text)
+
+    def test_concurrent_increments_are_not_lost(self):
+        """Сброс в файл во время записи из других потоков не теряет значений."""
+        def count():
+            for _ in range(5000):
+                metrics.inc('yatube_requests_total', metrics.labels(view='thread'))
+
+        # Переключение потоков как можно чаще, чтобы гонка проявлялась
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            metrics.flush()
+        for thread in threads:
+            thread.join()
+        self.assertIn('yatube_requests_total{view="thread"} 20000\n', metrics.render())
+
+    def test_values_are_summed_across_processes(self):
+        """Значения разных процессов складываются в общем файле."""
+        metrics.inc('yatube_requests_total', metrics.labels(view='worker'), 5)
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_count_in_process, args=(25,)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        text = metrics.render()
+        self.assertIn('yatube_requests_total{view="worker"} 105\n', text)
+
+
+class ServerTimingTests(TestCase):
+
+    def test_header_has_phases(self):
+        """Ответ получает Server-Timing со временем SQL, кэша, шаблонов и общим."""
+        response = self.client.get('/group/nonexist/')
+        header = response['Server-Timing']
+        for phase in ('db', 'cache', 'template', 'thumbnail', 'total'):
+            self.assertRegex(header, rf'(^|, ){phase};dur=\d+\.\d\d')
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="[1-9]\d* SQL"')
+        template = float(header.split('template;dur=')[1].split(',')[0])
+        self.assertGreater(template, 0)
+
+    def test_header_is_hidden_from_outside(self):
+        """Внешний адрес получает заголовок, только если пользователь - сотрудник."""
+        outside = {'REMOTE_ADDR': '203.0.113.5'}
+        response = self.client.get('/group/nonexist/', **outside)
+        self.assertNotIn('Server-Timing', response)
+        user = User.objects.create_user(username='reader')
+        self.client.force_login(user)
+        response = self.client.get('/group/nonexist/', **outside)
+        self.assertNotIn('Server-Timing', response)
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/group/nonexist/', **outside)
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_can_be_disabled(self):
+        """Без SERVER_TIMING заголовка нет."""
+        response = self.client.get('/group/nonexist/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_structured_log_line(self):
+        """С SERVER_TIMING_LOG на каждый запрос пишется строка JSON с фазами."""
+        with self.assertLogs('core.metrics.timing', 'INFO') as logs:
+            self.client.get('/group/nonexist/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:group_list')
+        self.assertEqual(record['status'], HTTPStatus.NOT_FOUND)
+        self.assertGreater(record['db_queries'], 0)
+        for phase in metrics.PHASES:
+            self.assertIn(f'{phase}_ms', record)
+        self.assertEqual(logs.records[0].timing, record)
+
+    def test_nested_phases_do_not_overlap(self):
+        """Время вложенной фазы вычитается из внешней."""
+        current = metrics.RequestMetrics()
+        with mock.patch.object(metrics.time, 'perf_counter', side_effect=[0, 1, 3, 10]):
+            current.enter()
+            current.enter()
+            current.leave('db')
+            current.leave('template')
+        self.assertEqual(current.phases['db'], 2)
+        self.assertEqual(current.phases['template'], 8)
+
+
+class SQLiteCacheTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Записи видны через другой экземпляр бэкенда на том же файле."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.cache.set_many({'int': 5, 'flag': True})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': [1, 2]})
+        self.assertEqual(other.get_many(['int', 'flag', 'missing']), {'int': 5, 'flag': True})
+        self.assertIs(other.get('flag'), True)
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живую запись, просроченные записи не читаются."""
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+        self.cache.set('expired', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 'fresh'))
+        self.assertEqual(self.cache.get('expired'), 'fresh')
+
+    def test_incr(self):
+        """incr меняет целые числа и отказывает для отсутствующих ключей."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 10), 11)
+        self.assertEqual(self.cache.decr('counter'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Одновременные incr из нескольких процессов не теряют приращений."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_incr_in_process, args=(self.path, 50)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2, CULL_INTERVAL=1, ACCESS_RESOLUTION=0)
+        for num in range(10):
+            cache.set(f'key{num}', num)
+        cache.get('key0')
+        cache.set('key10', 10)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertEqual(cache.get('key10'), 10)
+        self.assertIsNone(cache.get('key1'))
+        self.assertLessEqual(len(cache.get_many([f'key{num}' for num in range(11)])), 10)
+
+    def test_size_limit(self):
+        """Объём кэша ограничен MAX_BYTES."""
+        cache = self.make_cache(MAX_BYTES=10000, CULL_INTERVAL=1)
+        for num in range(20):
+            cache.set(f'key{num}', 'x' * 1000)
+        found = cache.get_many([f'key{num}' for num in range(20)])
+        self.assertLess(len(found), 10)
+        self.assertIn('key19', found)
+
+    def test_configured_cache_is_shared_between_threads(self):
+        """Кэш из настроек тестов общий для всех потоков, как и на сайте."""
+        caches['default'].set('shared', 'value')
+        self.addCleanup(caches['default'].delete, 'shared')
+        found = []
+        # caches отдаёт каждому потоку свой экземпляр бэкенда
+        thread = threading.Thread(
+            target=lambda: found.append(caches['default'].get('shared'))
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual(found, ['value'])
+
+
+class SQLiteProfileTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def pragma(self, alias, name):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        """Новые соединения получают прагмы, соединение для чтения - ещё и query_only."""
+        for alias in ('default', 'replica'):
+            with self.subTest(alias=alias):
+                self.assertEqual(self.pragma(alias, 'busy_timeout'), 5000)
+                self.assertEqual(self.pragma(alias, 'cache_size'), -64000)
+        self.assertEqual(self.pragma('default', 'query_only'), 0)
+        self.assertEqual(self.pragma('replica', 'query_only'), 1)
+
+    def test_writer_transactions_begin_immediate(self):
+        """Транзакция основного соединения сразу берёт блокировку записи."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'db.sqlite3')
+            writer = type(connections['default'])({**connection.settings_dict, 'NAME': path}, 'writer')
+            other = sqlite3.connect(path, timeout=0)
+            try:
+                writer.ensure_connection()
+                writer._start_transaction_under_autocommit()
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                    other.execute('BEGIN IMMEDIATE')
+            finally:
+                other.close()
+                writer.close()
+
+
+class ReadWriteRouterTests(SimpleTestCase):
+
+    def test_reads_go_to_replica_outside_transactions(self):
+        """Чтения идут в соединение для чтения, а внутри транзакции - в основное."""
+        router = ReadWriteRouter()
+        self.assertEqual(router.db_for_read(None), 'replica')
+        self.assertEqual(router.db_for_write(None), 'default')
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(router.db_for_read(None), 'default')
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
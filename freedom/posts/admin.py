@@ -1,9 +1,89 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import connection
 
+from . import search
 from .models import Post, Group, Comment, Follow
+from .paginator import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск в админке по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+
+    search_ids(match) - подзапрос с первичными ключами подходящих записей.
+    """
+    search_ids = staticmethod(search.matching_post_ids)
+
+    def get_search_results(self, request, queryset, search_term):
+        if connection.vendor != 'sqlite':
+            return super().get_search_results(request, queryset, search_term)
+        match = search.build_match(search_term)
+        if match is None:
+            return queryset, False
+        return queryset.filter(pk__in=self.search_ids(match)), False
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, подписывающее выбранное значение загруженным объектом.
+
+    Обычный виджет делает запрос за выбранным объектом для каждой строки
+    списка с list_editable; объект из list_select_related его заменяет.
+    """
+    instance = None
+
+    def optgroups(self, name, value, attr=None):
+        empty_values = self.choices.field.empty_values
+        selected = {str(v) for v in value if str(v) not in empty_values}
+        if self.instance is None or selected != {str(self.instance.pk)}:
+            return super().optgroups(name, value, attr)
+        default = (None, [], 0)
+        if not self.is_required:
+            default[1].append(self.create_option(name, '', '', False, 0))
+        label = self.choices.field.label_from_instance(self.instance)
+        default[1].append(self.create_option(
+            name, self.instance.pk, label, True, len(default[1])
+        ))
+        return [default]
+
+
+class PreloadedChangeListForm(forms.ModelForm):
+    """Форма строки списка: отдаёт автодополнению загруженные объекты."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            model_field = self.instance._meta.get_field(name)
+            if (isinstance(widget, PreloadedAutocompleteSelect)
+                    and model_field.is_cached(self.instance)):
+                widget.instance = getattr(self.instance, name)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список большой таблицы: без точного COUNT(*) и подсчёта всех записей.
+
+    Связанные объекты из list_display подгружаются соединением
+    (list_select_related), а внешние ключи выбираются через автодополнение,
+    а не <select> со всеми строками таблицы.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            db = kwargs.get('using')
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site, using=db
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', PreloadedChangeListForm)
+        return super().get_changelist_form(request, **kwargs)
+
+
+class PostAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,8 +92,11 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
 
@@ -24,26 +107,33 @@ class GroupAdmin(admin.ModelAdmin):
         'slug',
         'description'
     )
+    search_fields = ('title', 'slug')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = (
         'text',
         'created',
         'post',
         'author'
     )
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
     search_fields = ('text',)
+    search_ids = staticmethod(search.matching_comment_ids)
     list_filter = ('created',)
+    date_hierarchy = 'created'
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author'
     )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
 
 
 admin.site.register(Post, PostAdmin)
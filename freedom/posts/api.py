@@ -0,0 +1,231 @@
+"""JSON API v1 для лент, профиля и страницы поста.
+
+Повторяет страницы сайта теми же запросами и курсорной пагинацией.
+Посты сериализуются вручную: параметр fields выбирает поля ответа,
+и из базы читаются только нужные для них колонки. Ответы сжимаются
+gzip и кэшируются так же, как HTML-страницы лент.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.gzip import gzip_page
+
+from core.decorators import query_budget
+
+from . import counters, feed_cache, thumbnails
+from .models import Group, Post, User
+from .views import (
+    get_comments_page, get_page_obj, group_scopes, index_scopes,
+    post_detail_scopes, profile_scopes,
+)
+
+
+def _image(post):
+    if not post.image:
+        return None
+    thumbnail = thumbnails.ready_thumbnail(
+        post, settings.POST_CARD_THUMBNAIL_GEOMETRY
+    )
+    data = {
+        'original': post.image.url,
+        # url пустой, пока миниатюра готовится в фоне
+        'url': thumbnail.url,
+        'width': thumbnail.width,
+        'height': thumbnail.height,
+    }
+    if isinstance(thumbnail, thumbnails.Responsive):
+        data['srcset'] = thumbnail.srcset
+    return data
+
+
+def _group(post):
+    if post.group_id is None:
+        return None
+    return {'slug': post.group.slug, 'title': post.group.title}
+
+
+# Поле ответа: (колонки для only(), связи для select_related, функция значения)
+POST_FIELDS = {
+    'id': ((), (), lambda post: post.pk),
+    'text': (('text',), (), lambda post: post.text),
+    'pub_date': ((), (), lambda post: post.pub_date.isoformat()),
+    'updated': (('updated',), (), lambda post: post.updated.isoformat()),
+    'author': (
+        ('author__username',), ('author',),
+        lambda post: post.author.username if post.author_id else None,
+    ),
+    'group': (('group__slug', 'group__title'), ('group',), _group),
+    'comments_count': (
+        ('comments_count',), (), lambda post: post.comments_count,
+    ),
+    # Постановке миниатюры в очередь нужны автор и группа поста
+    'image': (('image', 'image_variants', 'author', 'group'), (), _image),
+}
+# Ключ курсора пагинации читается всегда
+REQUIRED_COLUMNS = ('id', 'pub_date')
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(request):
+    """Поля из параметра fields=id,text,...; по умолчанию - все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return tuple(POST_FIELDS)
+    names = (name.strip() for name in raw.split(','))
+    fields = tuple(dict.fromkeys(name for name in names if name))
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown or not fields:
+        raise FieldsError(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(POST_FIELDS)}'
+        )
+    return fields
+
+
+def select_fields(queryset, fields):
+    """Ограничивает queryset колонками и соединениями, нужными полям ответа."""
+    columns = list(REQUIRED_COLUMNS)
+    related = []
+    for name in fields:
+        field_columns, field_related, _ = POST_FIELDS[name]
+        columns.extend(field_columns)
+        related.extend(field_related)
+    if related:
+        queryset = queryset.select_related(*dict.fromkeys(related))
+    return queryset.only(*dict.fromkeys(columns))
+
+
+def serialize_posts(posts, fields):
+    getters = [(name, POST_FIELDS[name][2]) for name in fields]
+    return [{name: getter(post) for name, getter in getters} for post in posts]
+
+
+def serialize_comments(comments):
+    return [
+        {
+            'id': comment.pk,
+            'author': comment.author.username,
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+        }
+        for comment in comments
+    ]
+
+
+def serialize_page(page_obj, fields):
+    return {
+        'results': serialize_posts(page_obj, fields),
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+    }
+
+
+def json_response(data, status=200):
+    # Компактный JSON с постоянным порядком ключей хорошо сжимается
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return HttpResponse(
+        content, status=status,
+        content_type='application/json; charset=utf-8',
+    )
+
+
+def error_response(status, message):
+    return json_response({'error': message}, status=status)
+
+
+def api_view(scopes, budget):
+    """Бюджет запросов, кэш страницы по версиям областей, gzip и ошибки fields.
+
+    gzip стоит внутри кэша: сжатый ответ сохраняется и не сжимается повторно.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def view(request, *args, **kwargs):
+            try:
+                fields = parse_fields(request)
+            except FieldsError as error:
+                return error_response(400, str(error))
+            return view_func(request, fields, *args, **kwargs)
+        cached = feed_cache.cache_feed(scopes)(gzip_page(view))
+        return query_budget(budget)(cached)
+    return decorator
+
+
+@api_view(index_scopes, budget=4)
+def posts(request, fields):
+    post_list = select_fields(Post.objects.all(), fields)
+    page_obj = get_page_obj(request, post_list, total_limit=None)
+    return json_response(serialize_page(page_obj, fields))
+
+
+@api_view(group_scopes, budget=6)
+def group_posts(request, fields, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error_response(404, 'Группа не найдена')
+    post_list = select_fields(group.posts.all(), fields)
+    page_obj = get_page_obj(request, post_list, total_limit=None)
+    data = {
+        'group': {
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+        },
+        **serialize_page(page_obj, fields),
+    }
+    return json_response(data)
+
+
+@api_view(profile_scopes, budget=6)
+def profile(request, fields, username):
+    user = (
+        User.objects.select_related('stats').filter(username=username).first()
+    )
+    if user is None:
+        return error_response(404, 'Пользователь не найден')
+    stats = counters.stats_for(user)
+    post_list = select_fields(user.posts.all(), fields)
+    page_obj = get_page_obj(request, post_list, total_limit=None)
+    data = {
+        'author': {
+            'username': user.username,
+            'full_name': user.get_full_name(),
+            'posts_count': stats.posts_count,
+            'followers_count': stats.followers_count,
+            'following_count': stats.following_count,
+        },
+        **serialize_page(page_obj, fields),
+    }
+    return json_response(data)
+
+
+@api_view(post_detail_scopes, budget=5)
+def post_detail(request, fields, post_id):
+    post = select_fields(Post.objects.filter(pk=post_id), fields).first()
+    if post is None:
+        return error_response(404, 'Пост не найден')
+    comments = get_comments_page(request, post_id)
+    data = {
+        'post': serialize_posts([post], fields)[0],
+        'comments': serialize_comments(comments),
+        'comments_next': comments.next_cursor,
+    }
+    return json_response(data)
+
+
+@api_view(post_detail_scopes, budget=4)
+def post_comments(request, fields, post_id):
+    """Следующие страницы комментариев по курсору comments_next."""
+    if not Post.objects.filter(pk=post_id).exists():
+        return error_response(404, 'Пост не найден')
+    comments = get_comments_page(request, post_id)
+    return json_response({
+        'results': serialize_comments(comments),
+        'next': comments.next_cursor,
+        'previous': comments.previous_cursor,
+    })
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Управление сообщениями и подписками на сайте'
+
+    def ready(self):
+        from . import search, signals  # noqa: F401
+
+        # Индекс поиска не описан в миграциях: триггеры снимаются на время
+        # migrate, индекс и триггеры создаются после него
+        pre_migrate.connect(search.drop_triggers, sender=self)
+        post_migrate.connect(search.install, sender=self)
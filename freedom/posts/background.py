@@ -0,0 +1,42 @@
+"""Пул процессов для фоновой работы: миниатюры картинок постов
+и догрузка лент подписок.
+
+Размер пула задаёт POST_THUMBNAIL_WORKERS. Без пула (в тестах) задача
+выполняется сразу в вызывающем процессе.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_executor_pid = None
+
+
+def init_worker():
+    # Соединения с БД, унаследованные при fork, принадлежат родителю: их
+    # нужно забыть, но не закрывать, иначе оборвётся и соединение родителя
+    for connection in connections.all():
+        connection.connection = None
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=init_worker,
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def submit(func, *args):
+    """Выполняет func(*args) в пуле, а без пула - сразу."""
+    if settings.POST_THUMBNAIL_WORKERS:
+        _get_executor().submit(func, *args)
+    else:
+        func(*args)
@@ -0,0 +1,97 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются одним UPDATE с F()-выражением, поэтому параллельные
+запросы не теряют изменений. Строка UserStats создаётся лениво по
+фактическим данным; reconcile() исправляет накопившиеся расхождения.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _actual(model, field):
+    """Подзапрос с фактическим числом строк model для OuterRef('pk')."""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def get_stats(user_id):
+    """Счётчики пользователя; отсутствующие считаются по фактическим данным."""
+    try:
+        return UserStats.objects.get(user_id=user_id)
+    except UserStats.DoesNotExist:
+        pass
+    actual = {
+        name: model.objects.filter(**{field: user_id}).count()
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    stats, _ = UserStats.objects.get_or_create(
+        user_id=user_id, defaults=actual
+    )
+    return stats
+
+
+def stats_for(user):
+    """Счётчики пользователя, загруженного с select_related('stats')."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return get_stats(user.pk)
+
+
+def change_user_counter(user_id, name, delta):
+    if user_id is None:
+        return
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta}
+    )
+    # При уменьшении строку не создаём: пользователь может удаляться
+    # каскадом, а при создании get_stats уже учтёт новое значение
+    if not updated and delta > 0:
+        get_stats(user_id)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def _reconcile(queryset, name, actual):
+    wrong = queryset.annotate(actual=actual).exclude(**{name: F('actual')})
+    drift = wrong.count()
+    if drift:
+        queryset.filter(pk__in=wrong.values('pk')).update(**{name: actual})
+    return drift
+
+
+def reconcile():
+    """Пересчитывает все счётчики, возвращает число исправлений по каждому."""
+    missing = (
+        User.objects.filter(stats__isnull=True).values_list('pk', flat=True)
+    )
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in missing),
+        ignore_conflicts=True,
+    )
+    drift = {
+        name: _reconcile(UserStats.objects.all(), name, _actual(model, field))
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    drift['comments_count'] = _reconcile(
+        Post.objects.all(), 'comments_count', _actual(Comment, 'post')
+    )
+    return drift
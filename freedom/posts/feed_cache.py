@@ -0,0 +1,179 @@
+"""Кэш страниц лент с инвалидацией по версиям.
+
+Каждая лента зависит от нескольких областей (вся лента, группа, автор,
+пост, лента подписок пользователя). У области есть версия в кэше; ключ
+закэшированной страницы строится из версий её областей. Изменение данных
+меняет версии затронутых областей, и старые страницы просто перестают
+находиться, поэтому страницы можно держать в кэше долго.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_page
+
+VERSION_KEY = 'feed:version:{}'
+GLOBAL = 'global'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(user_id):
+    return f'author:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def new_version():
+    # Время в микросекундах: версия растёт и заодно говорит о моменте изменения
+    return time.time_ns() // 1000
+
+
+def get_versions(scopes):
+    """Версии областей в том же порядке; отсутствующие создаются."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            version = new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def bump(*scopes):
+    """Меняет версии областей: закэшированные страницы с ними устаревают."""
+    if scopes:
+        version = new_version()
+        cache.set_many(
+            {VERSION_KEY.format(scope): version for scope in scopes}, None
+        )
+
+
+def bump_many(scopes, batch_size=500):
+    batch = []
+    for scope in scopes:
+        batch.append(scope)
+        if len(batch) >= batch_size:
+            bump(*batch)
+            batch = []
+    bump(*batch)
+
+
+def visitor(request):
+    """Id пользователя из сессии и CSRF-cookie; у анонимов - пусто.
+
+    Шапка, кнопки подписки и форма комментария с CSRF-токеном есть только
+    у вошедших, поэтому анонимы видят одну общую страницу, а у каждого
+    вошедшего - своя, привязанная к его CSRF-cookie.
+    """
+    session = getattr(request, 'session', None)
+    user_id = session.get(SESSION_KEY) if session is not None else None
+    if not user_id:
+        return ()
+    return user_id, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+
+
+def page_key(versions, visitor_key):
+    key = ':'.join(map(str, (*versions, *visitor_key)))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def shared_page_guard(view_func, visitor_key):
+    """Не даёт положить в кэш страницу с CSRF-токеном, если ключ не привязан
+    к CSRF-cookie: такой токен достался бы другим посетителям."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if request.META.get('CSRF_COOKIE_USED') and not any(visitor_key[1:]):
+            patch_cache_control(response, private=True)
+        return response
+    return wrapper
+
+
+def validators(request, versions):
+    """ETag и Last-Modified страницы по версиям её областей.
+
+    Версия - время последнего изменения области в микросекундах. Страница
+    зависит ещё и от посетителя (шапка, кнопки подписки, форма с CSRF),
+    поэтому в ETag входят id пользователя из сессии и CSRF-cookie.
+    Last-Modified посетителя не различает: его получают только общие
+    страницы анонимов, иначе браузер после смены пользователя получил бы
+    304 на чужую страницу. ETag слабый: gzip меняет байты ответа, но не
+    его смысл.
+    """
+    session = getattr(request, 'session', None)
+    visitor_cookies = (
+        session.get(SESSION_KEY, '') if session is not None else '',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+    raw = ':'.join(map(str, (*versions, *visitor_cookies)))
+    etag = 'W/' + quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    last_modified = None if visitor(request) else max(versions) // 1_000_000
+    return etag, last_modified
+
+
+def cache_feed(scopes):
+    """Кэширует страницу view, пока не изменились версии её областей.
+
+    scopes(request, *args, **kwargs) возвращает список областей страницы
+    или None, если страницу кэшировать не нужно. Вошедшие пользователи
+    получают свои копии страниц (см. visitor). Те же версии дают
+    ETag и Last-Modified: на условный GET с прежними значениями отвечаем
+    304, не выполняя view.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            page_scopes = scopes(request, *args, **kwargs)
+            if page_scopes is None:
+                return view_func(request, *args, **kwargs)
+            versions = get_versions(page_scopes)
+            etag, last_modified = validators(request, versions)
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                if last_modified is not None:
+                    not_modified['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(not_modified, max_age=0)
+                return not_modified
+            # cache_page стоит внутри view, раньше, чем сессии и CSRF добавят
+            # Vary: Cookie, поэтому посетитель входит в ключ явно
+            visitor_key = visitor(request)
+            cached_view = cache_page(
+                settings.FEED_CACHE_TIMEOUT,
+                key_prefix=page_key(versions, visitor_key),
+            )(shared_page_guard(view_func, visitor_key))
+            response = cached_view(request, *args, **kwargs)
+            # Кэш на сервере живёт долго, но браузер должен перепроверять
+            # страницу: иначе он не увидит новые записи
+            if response.has_header('Expires'):
+                del response['Expires']
+            patch_cache_control(response, max_age=0)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                # Страница с CSRF-токеном своя у каждого посетителя
+                private = 'private' in response['Cache-Control']
+                if last_modified is not None and not private:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,72 @@
+"""Граф подписок: множества id авторов, на которых подписан пользователь.
+
+Множество хранится в кэше упакованным массивом id и сбрасывается
+сигналами после фиксации подписки или отписки, поэтому проверка «подписан ли»
+и список авторов для ленты не обращаются к таблице подписок.
+"""
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import Follow
+
+FOLLOWEES_KEY = 'follow:followees:{}'
+
+
+def _pack(ids):
+    return array('q', sorted(ids)).tobytes()
+
+
+def _unpack(raw):
+    ids = array('q')
+    ids.frombytes(raw)
+    return frozenset(ids)
+
+
+def followees(user_id):
+    """Id авторов, на которых подписан пользователь."""
+    if user_id is None:
+        return frozenset()
+    key = FOLLOWEES_KEY.format(user_id)
+    raw = cache.get(key)
+    if raw is None:
+        author_ids = Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        )
+        raw = _pack(author_ids)
+        cache.add(key, raw, settings.FOLLOW_GRAPH_TIMEOUT)
+    return _unpack(raw)
+
+
+def is_following(user_id, author_id):
+    return author_id in followees(user_id)
+
+
+def invalidate(user_id):
+    cache.delete(FOLLOWEES_KEY.format(user_id))
+
+
+def follow(user, author):
+    """Подписывает пользователя на автора; True, если подписки ещё не было.
+
+    На себя подписаться нельзя, повторная подписка ничего не меняет:
+    её, как и гонку двух одновременных запросов, отсекает уникальное
+    ограничение. Кэш здесь не спрашиваем: запись не должна зависеть
+    от устаревшего множества.
+    """
+    if user.pk == author.pk:
+        return False
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Отписывает пользователя от автора; True, если подписка была."""
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
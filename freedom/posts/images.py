@@ -0,0 +1,170 @@
+"""Обработка картинок постов: загрузка и варианты разной ширины для srcset.
+
+Загруженная картинка нормализуется перед сохранением: поворот по EXIF,
+удаление метаданных, уменьшение до POST_IMAGE_MAX_SIZE и защита от
+«бомб» распаковки. Нормализация идёт прямо в запросе: JPEG декодируется
+сразу в уменьшенном масштабе, а результат пишется во временный файл
+и сохраняется в хранилище по частям.
+
+Для каждой картинки рядом с оригиналом сохраняются кадрированные под
+миниатюру варианты нескольких ширин в JPEG и, если Pillow собран с её
+поддержкой, в WebP: posts/photo.jpg -> posts/photo_480w.webp и т.д.
+Ширины готовых вариантов записываются в Post.image_variants, по ним
+шаблон строит srcset без обращений к хранилищу.
+"""
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+from sorl.thumbnail.parsers import parse_geometry
+
+from .models import Post
+
+JPEG = 'jpeg'
+WEBP = 'webp'
+# Форматы, которые перекодируются при загрузке; остальные (GIF, где нет
+# EXIF, и анимации) сохраняются как есть после проверки размеров
+NORMALIZED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def _normalize(upload):
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    # Размер известен по заголовку, до распаковки пикселей
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: не больше %(pixels)s пикселей',
+            code='too_many_pixels',
+            params={'pixels': settings.POST_IMAGE_MAX_PIXELS},
+        )
+    image_format = image.format
+    if (image_format not in NORMALIZED_FORMATS
+            or getattr(image, 'is_animated', False)):
+        upload.seek(0)
+        return upload, width, height
+    max_size = (settings.POST_IMAGE_MAX_SIZE, settings.POST_IMAGE_MAX_SIZE)
+    # JPEG декодируется сразу в уменьшенном масштабе: меньше памяти
+    # и времени
+    image.draft(image.mode, max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    options = {}
+    if image_format == 'JPEG':
+        options = {
+            'quality': settings.POST_IMAGE_UPLOAD_QUALITY, 'optimize': True,
+        }
+    if image.info.get('icc_profile'):
+        # Цветовой профиль нужен для правильных цветов, остальные
+        # метаданные - нет
+        options['icc_profile'] = image.info['icc_profile']
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(output, image_format, **options)
+    output.seek(0)
+    name = os.path.basename(upload.name)
+    return File(output, name=name), image.width, image.height
+
+
+def normalize_upload(upload):
+    """Нормализует загруженную картинку; возвращает файл, ширину и высоту."""
+    try:
+        return _normalize(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Картинка слишком большая', code='too_many_pixels'
+        )
+    except (OSError, ValueError, SyntaxError):
+        raise ValidationError(
+            'Не удалось обработать картинку', code='invalid_image'
+        )
+
+
+def variant_formats():
+    # WebP идёт первым: в <picture> браузер берёт первый подходящий source
+    if features.check('webp'):
+        return (WEBP, JPEG)
+    return (JPEG,)
+
+
+def variant_size(width, geometry):
+    geometry_width, geometry_height = parse_geometry(geometry)
+    return width, round(width * geometry_height / geometry_width)
+
+
+def variant_name(name, width, image_format):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_{width}w.{image_format}'
+
+
+def parse_widths(image_variants):
+    return [int(width) for width in image_variants.split(',') if width]
+
+
+def _open_rgb(name, max_size):
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        # JPEG можно сразу декодировать в уменьшенном масштабе
+        image.draft('RGB', max_size)
+        image.load()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def create_variants(name, geometry=None):
+    """Сохраняет варианты картинки и возвращает их ширины.
+
+    Ширины больше исходной не создаются (кроме самой маленькой), чтобы
+    не раздувать файлы растягиванием. Существующие файлы перезаписываются:
+    после сбоя на их месте могли остаться недописанные.
+    """
+    geometry = geometry or settings.POST_CARD_THUMBNAIL_GEOMETRY
+    configured = sorted(settings.POST_IMAGE_VARIANT_WIDTHS)
+    image = _open_rgb(name, variant_size(configured[-1], geometry))
+    widths = [
+        width for width in configured if width <= image.width
+    ] or configured[:1]
+    for width in widths:
+        variant = ImageOps.fit(
+            image, variant_size(width, geometry), Image.LANCZOS
+        )
+        for image_format in variant_formats():
+            buffer = io.BytesIO()
+            variant.save(
+                buffer, image_format.upper(),
+                quality=settings.POST_IMAGE_VARIANT_QUALITY,
+            )
+            target = variant_name(name, width, image_format)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def build_variants(post_id, name):
+    """Создаёт варианты и отмечает их у поста, если картинка та же."""
+    widths = create_variants(name)
+    return Post.objects.filter(pk=post_id, image=name).update(
+        image_variants=','.join(map(str, widths))
+    )
+
+
+def variant_url(name, width, image_format):
+    return default_storage.url(variant_name(name, width, image_format))
+
+
+def srcset(name, widths, image_format):
+    return ', '.join(
+        f'{variant_url(name, width, image_format)} {width}w'
+        for width in widths
+    )
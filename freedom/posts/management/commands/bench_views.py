@@ -0,0 +1,216 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from statistics import median
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.middleware.cache import UpdateCacheMiddleware
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from core.management.commands.bench_db import percentile
+from core.management.commands.bench_ttfb import measure
+from core.middleware import QueryBudgetMiddleware
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import Seeder
+
+BENCH_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+# Рост меньше этого не считается регрессией: шум измерений
+LATENCY_SLACK = 0.002
+MEMORY_SLACK_KB = 64
+
+
+def pick_targets():
+    """Самые тяжёлые страницы базы: крупнейшая группа, самый активный автор,
+    самый обсуждаемый пост и пользователь с наибольшим числом подписок."""
+    group = (
+        Group.objects.annotate(total=Count('posts')).order_by('-total')
+        .first()
+    )
+    author = User.objects.order_by('-stats__posts_count').first()
+    post = Post.objects.order_by('-comments_count').first()
+    reader = (
+        User.objects.annotate(total=Count('follower')).order_by('-total')
+        .first()
+    )
+    return {
+        'posts:index': (reverse('posts:index'), None),
+        'posts:group_list': (
+            reverse('posts:group_list', kwargs={'slug': group.slug}), None
+        ),
+        'posts:profile': (
+            reverse('posts:profile', kwargs={'username': author.username}),
+            None,
+        ),
+        'posts:post_detail': (
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}), None
+        ),
+        'posts:follow_index': (reverse('posts:follow_index'), reader),
+    }
+
+
+def run_view(client, view_name, url, requests):
+    measure(client, url)
+    latencies = sorted(measure(client, url)[1] for _ in range(requests))
+    queries, _ = QueryBudgetMiddleware.stats[view_name]
+    # Память меряем отдельным запросом: трассировка замедляет Python в разы
+    tracemalloc.start()
+    try:
+        measure(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50': median(latencies),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'queries': queries,
+        'peak_kb': peak // 1024,
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Описания ухудшений относительно сохранённых замеров."""
+    found = []
+    for view_name, sizes in results.items():
+        for size, current in sizes.items():
+            base = baseline.get(view_name, {}).get(size)
+            if base is None:
+                continue
+            where = f'{view_name} @ {size}'
+            if current['queries'] > base['queries']:
+                found.append(
+                    f'{where}: запросов {base["queries"]} -> '
+                    f'{current["queries"]}'
+                )
+            if current['p95'] > base['p95'] * (1 + tolerance) + LATENCY_SLACK:
+                found.append(
+                    f'{where}: p95 {base["p95"] * 1000:.2f} -> '
+                    f'{current["p95"] * 1000:.2f} мс'
+                )
+            peak_limit = base['peak_kb'] * (1 + tolerance) + MEMORY_SLACK_KB
+            if current['peak_kb'] > peak_limit:
+                found.append(
+                    f'{where}: память {base["peak_kb"]} -> '
+                    f'{current["peak_kb"]} КБ'
+                )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет временную базу синтетическими данными нескольких размеров '
+        'и меряет страницы posts: задержки, число запросов и пиковую память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+            help='Размеры базы в постах, по возрастанию',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=30,
+            help='Запросов на страницу и размер',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Зерно генератора данных',
+        )
+        parser.add_argument(
+            '--baseline', help='JSON с прежними замерами: ухудшение - ошибка',
+        )
+        parser.add_argument(
+            '--save', help='Куда записать замеры для следующих сравнений',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый относительный рост p95 и памяти',
+        )
+
+    def handle(self, *args, sizes, requests, seed, baseline, save, tolerance,
+               **options):
+        sizes = sorted(sizes)
+        previous = {}
+        if baseline:
+            with open(baseline, encoding='utf-8') as stream:
+                previous = json.load(stream)
+        with tempfile.TemporaryDirectory() as directory:
+            # Отдельная база в файле: сайт и его данные не затрагиваются
+            test_settings = (
+                settings.DATABASES['default'].setdefault('TEST', {})
+            )
+            saved_name = test_settings.get('NAME')
+            test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                with override_settings(
+                    CACHES=BENCH_CACHES,
+                    QUERY_BUDGET_RAISE=False,
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                ), mock.patch.object(
+                    UpdateCacheMiddleware, '_should_update_cache',
+                    return_value=False,
+                ):
+                    results = self.measure_sizes(sizes, requests, seed)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                test_settings['NAME'] = saved_name
+        self.report(results)
+        if save:
+            with open(save, 'w', encoding='utf-8') as stream:
+                json.dump(results, stream, indent=2, sort_keys=True)
+        found = regressions(results, previous, tolerance)
+        if found:
+            raise CommandError('Регрессия относительно {}:\n{}'.format(
+                baseline, '\n'.join(found)
+            ))
+
+    def measure_sizes(self, sizes, requests, seed):
+        seeder = Seeder(seed=seed, workers=os.cpu_count())
+        # Люди и подписки создаются под самый большой размер сразу:
+        # между замерами растут только посты и комментарии
+        users = max(50, sizes[-1] // 50)
+        seeder.create_people(users=users, groups=max(5, users // 100))
+        results = {}
+        total = 0
+        for size in sizes:
+            started = time.perf_counter()
+            seeder.add_posts(size - total)
+            seeder.finish()
+            total = size
+            self.stdout.write(
+                f'{size:,} постов: {Comment.objects.count():,} комментариев, '
+                f'{Follow.objects.count():,} подписок, '
+                f'данные за {time.perf_counter() - started:.1f} с'
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            for view_name, (url, user) in pick_targets().items():
+                # Адрес не из INTERNAL_IPS: без debug toolbar
+                client = Client(REMOTE_ADDR='192.0.2.1')
+                if user is not None:
+                    client.force_login(user)
+                result = run_view(client, view_name, url, requests)
+                results.setdefault(view_name, {})[str(size)] = result
+        return results
+
+    def report(self, results):
+        for view_name, sizes in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(view_name))
+            for size, result in sizes.items():
+                self.stdout.write(
+                    f'  {int(size):>10,}  '
+                    f'p50 {result["p50"] * 1000:7.2f} мс  '
+                    f'p95 {result["p95"] * 1000:7.2f} мс  '
+                    f'p99 {result["p99"] * 1000:7.2f} мс  '
+                    f'запросов {result["queries"]:>3}  '
+                    f'память {result["peak_kb"]:>6} КБ'
+                )
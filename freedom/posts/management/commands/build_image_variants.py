@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts import feed_cache, images
+from posts.background import init_worker
+from posts.models import Post
+
+
+def build(post_id, name):
+    try:
+        images.build_variants(post_id, name)
+    except Exception as error:
+        return post_id, f'{name}: {error}'
+    return post_id, None
+
+
+def batch_scopes(batch, post_ids):
+    """Области кэша лент, где видны посты порции с новыми вариантами."""
+    scopes = {feed_cache.GLOBAL}
+    for pk, _, author_id, group_id in batch:
+        if pk not in post_ids:
+            continue
+        scopes.add(feed_cache.post_scope(pk))
+        scopes.add(feed_cache.author_scope(author_id))
+        if group_id is not None:
+            scopes.add(feed_cache.group_scope(group_id))
+    return scopes
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт варианты картинок для srcset у постов, где их ещё нет. '
+        'Уже обработанные посты пропускаются, поэтому прерванный запуск '
+        'можно продолжить. После каждой порции сбрасывается кэш общей '
+        'ленты, групп, профилей и страниц постов; ленты подписок '
+        'не сбрасываются и обновятся сами через FEED_CACHE_TIMEOUT'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=multiprocessing.cpu_count(),
+            help='Процессов; 0 - обрабатывать в текущем процессе',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Постов в одной порции',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты у всех постов',
+        )
+
+    def handle(self, *args, workers, batch_size, force, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not force:
+            posts = posts.filter(image_variants='')
+        pending = posts.order_by('pk').values_list(
+            'pk', 'image', 'author_id', 'group_id'
+        )
+        started = time.monotonic()
+        executor = None
+        if workers:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=init_worker,
+            )
+        try:
+            done, failed = self.process(pending, batch_size, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, с ошибками: {failed}, за {elapsed:.1f} с'
+        ))
+
+    def process(self, pending, batch_size, executor):
+        """Обрабатывает посты порциями; возвращает числа успешных и ошибок."""
+        done = failed = 0
+        # Порции по возрастанию pk: в очереди не больше batch_size задач,
+        # а следующая порция начинается после последнего взятого поста
+        last_pk = 0
+        while True:
+            batch = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return done, failed
+            last_pk = batch[-1][0]
+            built = self.build_batch(batch, executor)
+            done += len(built)
+            failed += len(batch) - len(built)
+            feed_cache.bump_many(batch_scopes(batch, built))
+            self.stdout.write(f'Обработано постов: {done + failed}')
+
+    def build_batch(self, batch, executor):
+        """Id постов порции, у которых варианты созданы без ошибок."""
+        if executor is None:
+            results = [build(pk, name) for pk, name, _, _ in batch]
+        else:
+            futures = [
+                executor.submit(build, pk, name) for pk, name, _, _ in batch
+            ]
+            results = (future.result() for future in as_completed(futures))
+        built = set()
+        for post_id, error in results:
+            if error:
+                self.stderr.write(f'Пост {post_id}: {error}')
+            else:
+                built.add(post_id)
+        return built
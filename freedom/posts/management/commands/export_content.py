@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии, подписки и их авторов '
+        'в NDJSON. Записи читаются порциями, поэтому память не зависит '
+        'от размера базы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', help='Файл выгрузки (*.gz - со сжатием), «-» - stdout',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Строк в одном чтении из базы',
+        )
+        parser.add_argument(
+            '--media-dir', help='Скопировать картинки постов в этот каталог',
+        )
+        parser.add_argument(
+            '--include-passwords', action='store_true',
+            help='Выгрузить хэши паролей: без них пароли придётся сбросить',
+        )
+
+    def handle(self, *args, output, chunk_size, media_dir, include_passwords,
+               **options):
+        counts = {}
+        started = time.monotonic()
+        records = transfer.export_records(chunk_size, include_passwords)
+        with transfer.open_stream(output, 'w') as stream:
+            for model, row, line in records:
+                stream.write(line)
+                stream.write('\n')
+                counts[model] = counts.get(model, 0) + 1
+                if model == 'post' and media_dir and row['image']:
+                    self.copy_media(row['image'], media_dir)
+        elapsed = time.monotonic() - started
+        counts.pop('meta', None)
+        total = sum(counts.values())
+        # При выгрузке в stdout отчёт идёт в stderr, чтобы не портить файл
+        report = self.stderr if output == '-' else self.stdout
+        for model, count in counts.items():
+            report.write(f'{model}: {count}')
+        rate = total / max(elapsed, 1e-6)
+        report.write(self.style.SUCCESS(
+            f'Выгружено записей: {total} за {elapsed:.1f} с '
+            f'({rate:.0f} строк/с)'
+        ))
+
+    def copy_media(self, name, media_dir):
+        try:
+            transfer.copy_media_out(name, media_dir)
+        except OSError as error:
+            self.stderr.write(f'{name}: {error}')
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_content порциями bulk_create. '
+        'Пользователи и группы с теми же username и slug переиспользуются, '
+        'посты получают новые id'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help='Файл выгрузки (*.gz - со сжатием), «-» - stdin',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Записей в одной транзакции',
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='Каталог с картинками постов из export_content',
+        )
+        parser.add_argument(
+            '--progress', type=int, default=100000,
+            help='Печатать прогресс каждые N строк',
+        )
+
+    def handle(self, *args, input, batch_size, media_dir, progress,
+               **options):
+        importer = transfer.Importer(
+            batch_size=batch_size, media_dir=media_dir
+        )
+        started = time.monotonic()
+        lines = 0
+        try:
+            with transfer.open_stream(input, 'r') as stream:
+                for lines, line in enumerate(stream, 1):
+                    importer.feed(line)
+                    if progress and not lines % progress:
+                        self.report_rate(
+                            f'Прочитано строк: {lines}', lines, started
+                        )
+            importer.finish()
+        except transfer.TransferError as error:
+            raise CommandError(f'Строка {lines}: {error}')
+        loaded = time.monotonic()
+        for model, count in importer.counts.items():
+            self.stdout.write(f'{model}: {count}')
+        self.report_rate(f'Загружено строк: {lines}', lines, started)
+        importer.refresh_derived()
+        elapsed = time.monotonic() - loaded
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики и ленты пересчитаны за {elapsed:.1f} с'
+        ))
+
+    def report_rate(self, message, lines, started):
+        elapsed = time.monotonic() - started
+        rate = lines / max(elapsed, 1e-6)
+        self.stdout.write(f'{message} за {elapsed:.1f} с ({rate:.0f} строк/с)')
@@ -0,0 +1,539 @@
+import asyncio
+import bisect
+import multiprocessing
+import os
+import random
+import re
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import closing, contextmanager
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY,
+)
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+
+from core import metrics
+from core.management.commands.bench_db import percentile
+from posts.models import Comment, Group, Post, User
+
+# Сценарий: вес в смеси по умолчанию
+DEFAULT_MIX = {
+    'index': 30,
+    'group': 10,
+    'profile': 10,
+    'post_detail': 10,
+    'follow': 20,
+    'comment': 15,
+    'post': 5,
+}
+# Сценарии, которым нужна сессия
+LOGGED_IN = {'follow', 'comment', 'post'}
+# Границы корзин гистограммы задержек, мс
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+ERROR_HEADER = 'X-Load-Error'
+CSRF_TOKEN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+# Этим начинаются тексты постов и комментариев, созданных нагрузкой
+POST_TEXT = 'Пост нагрузки'
+COMMENT_TEXT = 'Комментарий нагрузки'
+# Сервер работает как в продакшене: без DEBUG и debug toolbar,
+# превышение бюджета запросов - предупреждение в логе, а не ошибка 500
+SERVER_SETTINGS = {'DEBUG': False, 'QUERY_BUDGET_RAISE': False}
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(listener):
+    """Однопоточный WSGI-воркер на общем сокете, как sync-воркер gunicorn.
+    """
+    override_settings(**SERVER_SETTINGS).enable()
+    from yatube.wsgi import application
+
+    last_error = threading.local()
+
+    def remember(sender, **kwargs):
+        last_error.value = sys.exc_info()[1]
+
+    got_request_exception.connect(remember, weak=False)
+
+    def app(environ, start_response):
+        # Причина ошибки 500 уходит клиенту заголовком: так отличаем
+        # «database is locked» от прочих ошибок и без DEBUG
+        last_error.value = None
+
+        def start(status, headers, exc_info=None):
+            error = last_error.value
+            if error is not None:
+                reason = f'{type(error).__name__}: {error}'
+                reason = reason.encode('ascii', 'replace').decode()[:200]
+                headers.append((ERROR_HEADER, reason))
+            return start_response(status, headers, exc_info)
+
+        return application(environ, start)
+
+    host, port = listener.getsockname()[:2]
+    server = WSGIServer((host, port), QuietHandler, bind_and_activate=False)
+    server.socket = listener
+    server.server_name, server.server_port = host, port
+    server.setup_environ()
+    server.set_app(app)
+    server.serve_forever()
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+async def http_request(host, port, method, path, cookies=None, data=None,
+                       timeout=10):
+    """Минимальный HTTP/1.1-клиент: одно соединение на запрос."""
+    lines = [
+        f'{method} {path} HTTP/1.1',
+        f'Host: {host}:{port}',
+        'Connection: close',
+    ]
+    if cookies:
+        pairs = (f'{name}={value}' for name, value in cookies.items())
+        lines.append('Cookie: ' + '; '.join(pairs))
+    body = b''
+    if data is not None:
+        body = urlencode(data).encode()
+        lines.append('Content-Type: application/x-www-form-urlencoded')
+        lines.append(f'Referer: http://{host}:{port}{path}')
+    lines.append(f'Content-Length: {len(body)}')
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port), timeout
+    )
+    try:
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = raw.partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = defaultdict(list)
+    for line in header_lines:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()].append(value.strip())
+    return Response(int(status_line.split()[1]), headers, body)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, started, error=None):
+        if error:
+            self.errors[endpoint][error] += 1
+        else:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+
+
+class VirtualUser:
+    """Посетитель: аноним или пользователь с сессией.
+
+    Выполняет сценарии смеси, пока не выйдет время.
+    """
+
+    def __init__(self, harness, session_key=None):
+        self.harness = harness
+        self.cookies = {}
+        self.logged_in = session_key is not None
+        if session_key:
+            self.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.csrf_token = None
+
+    async def call(self, endpoint, method, path, data=None, expected=200):
+        harness = self.harness
+        started = time.perf_counter()
+        try:
+            response = await http_request(
+                harness.host, harness.port, method, path, self.cookies, data,
+                harness.timeout,
+            )
+        except asyncio.TimeoutError:
+            harness.stats.record(endpoint, started, 'timeout')
+            return None
+        except OSError as error:
+            reason = f'connection: {type(error).__name__}'
+            harness.stats.record(endpoint, started, reason)
+            return None
+        for header in response.headers.get('set-cookie', ()):
+            cookie = SimpleCookie(header)
+            self.cookies.update(
+                {name: morsel.value for name, morsel in cookie.items()}
+            )
+        if response.status != expected:
+            reason = response.headers.get(
+                ERROR_HEADER.lower(), [f'HTTP {response.status}']
+            )[0]
+            if 'database is locked' in reason:
+                reason = 'database is locked'
+            harness.stats.record(endpoint, started, reason)
+            return None
+        harness.stats.record(endpoint, started)
+        return response
+
+    async def ensure_csrf(self):
+        if self.csrf_token is None:
+            response = await self.call(
+                'create_form', 'GET', reverse('posts:post_create')
+            )
+            match = response and CSRF_TOKEN.search(response.body.decode())
+            self.csrf_token = match.group(1) if match else None
+        return self.csrf_token
+
+    async def run(self, deadline):
+        harness = self.harness
+        rng = harness.rng
+        scenarios = [
+            name for name in harness.mix
+            if self.logged_in or name not in LOGGED_IN
+        ]
+        weights = [harness.mix[name] for name in scenarios]
+        # В смеси только сценарии с входом: анониму делать нечего
+        if not scenarios:
+            return
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            await getattr(self, f'scenario_{scenario}')(rng)
+
+    async def scenario_index(self, rng):
+        await self.call('index', 'GET', reverse('posts:index'))
+
+    async def scenario_group(self, rng):
+        slug = rng.choice(self.harness.slugs)
+        url = reverse('posts:group_list', kwargs={'slug': slug})
+        await self.call('group', 'GET', url)
+
+    async def scenario_profile(self, rng):
+        username = rng.choice(self.harness.usernames)
+        url = reverse('posts:profile', kwargs={'username': username})
+        await self.call('profile', 'GET', url)
+
+    async def scenario_post_detail(self, rng):
+        post_id = rng.choice(self.harness.post_ids)
+        url = reverse('posts:post_detail', kwargs={'post_id': post_id})
+        await self.call('post_detail', 'GET', url)
+
+    async def scenario_follow(self, rng):
+        await self.call('follow', 'GET', reverse('posts:follow_index'))
+
+    async def scenario_comment(self, rng):
+        token = await self.ensure_csrf()
+        post_id = rng.choice(self.harness.post_ids)
+        text = f'{COMMENT_TEXT} {rng.random()}'
+        await self.call(
+            'comment', 'POST',
+            reverse('posts:add_comment', kwargs={'post_id': post_id}),
+            {'csrfmiddlewaretoken': token, 'text': text},
+            expected=302,
+        )
+
+    async def scenario_post(self, rng):
+        token = await self.ensure_csrf()
+        text = f'{POST_TEXT} {rng.random()}'
+        await self.call(
+            'post', 'POST', reverse('posts:post_create'),
+            {'csrfmiddlewaretoken': token, 'text': text},
+            expected=302,
+        )
+
+
+class Harness:
+    def __init__(self, host, port, mix, timeout, seed):
+        self.host = host
+        self.port = port
+        self.mix = mix
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.stats = Stats()
+        self.post_ids = []
+        self.slugs = []
+        self.usernames = []
+
+    def load_targets(self, sample):
+        # Свежие посты читают и комментируют чаще старых
+        self.post_ids = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[:sample]
+        )
+        self.slugs = list(
+            Group.objects.values_list('slug', flat=True)[:sample]
+        )
+        self.usernames = list(
+            User.objects.filter(stats__posts_count__gt=0)
+            .order_by('-stats__followers_count')
+            .values_list('username', flat=True)[:sample]
+        )
+        if not self.post_ids or not self.usernames:
+            raise CommandError(
+                'В базе нет постов: сначала заполните её командой seed'
+            )
+        if not self.slugs:
+            self.mix.pop('group', None)
+
+    async def run(self, users, deadline):
+        await asyncio.gather(*(user.run(deadline) for user in users))
+
+
+def create_sessions(count):
+    """Сессии пользователей с подписками: вход без паролей и формы логина.
+    """
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    stores = []
+    readers = (
+        User.objects.filter(stats__following_count__gt=0).order_by('?')[:count]
+    )
+    for user in readers:
+        store = store_class()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = MODEL_BACKEND
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.create()
+        stores.append(store)
+    return stores
+
+
+@contextmanager
+def database_copy(directory):
+    """Переключает соединения на копию базы SQLite во временном каталоге.
+
+    Кэш и метрики тоже переносятся в этот каталог: нагрузка не пишет ни
+    в базу сайта, ни в его кэш страниц и версий лент, ни в его метрики.
+    """
+    source = connections['default'].settings_dict['NAME']
+    if connections['default'].vendor != 'sqlite':
+        raise CommandError(
+            'Копию можно сделать только у базы SQLite: запустите с --in-place'
+        )
+    copy = os.path.join(directory, 'load.sqlite3')
+    with closing(sqlite3.connect(source)) as original, \
+            closing(sqlite3.connect(copy)) as target:
+        original.backup(target)
+    connections.close_all()
+    saved = {}
+    for alias in connections:
+        settings_dict = connections[alias].settings_dict
+        if settings_dict['NAME'] == source:
+            saved[alias] = settings_dict['NAME']
+            settings_dict['NAME'] = copy
+    caches = {'default': {
+        **settings.CACHES['default'],
+        'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+    }}
+    metrics_db = os.path.join(directory, 'metrics.sqlite3')
+    try:
+        with override_settings(CACHES=caches, METRICS_DB=metrics_db):
+            try:
+                yield
+            finally:
+                # Накопленное самой командой тоже остаётся во временном файле
+                metrics.flush()
+    finally:
+        connections.close_all()
+        for alias, name in saved.items():
+            connections[alias].settings_dict['NAME'] = name
+
+
+def delete_created(last_post_id, last_comment_id):
+    """Удаляет посты и комментарии нагрузки.
+
+    Счётчики, ленты подписок и кэш поправят сигналы, поиск - триггеры.
+    """
+    _, comments = Comment.objects.filter(
+        pk__gt=last_comment_id, text__startswith=COMMENT_TEXT
+    ).delete()
+    _, posts = Post.objects.filter(
+        pk__gt=last_post_id, text__startswith=POST_TEXT
+    ).delete()
+    return posts.get(Post._meta.label, 0), comments.get(Comment._meta.label, 0)
+
+
+def last_pk(model):
+    pks = model.objects.order_by('-pk').values_list('pk', flat=True)
+    return pks.first() or 0
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise CommandError(
+                f'Неизвестный сценарий: {name}. '
+                f'Доступны: {", ".join(DEFAULT_MIX)}'
+            )
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Некорректный вес сценария {name}: {weight}')
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает yatube.wsgi.application в нескольких процессах '
+        'и нагружает его смесью сценариев: чтение лент, лента подписок, '
+        'комментарии, посты. Печатает пропускную способность, гистограммы '
+        'задержек и ошибки по адресам. По умолчанию работает на копии базы, '
+        'отдельных кэше и метриках во временном каталоге'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4, help='Процессов WSGI-сервера'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=32,
+            help='Одновременных посетителей',
+        )
+        parser.add_argument(
+            '--sessions', type=int, default=20, help='Из них с входом на сайт'
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=30, help='Длительность нагрузки'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10, help='Тайм-аут запроса, с'
+        )
+        parser.add_argument(
+            '--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+            help='Веса сценариев, например index=5,follow=2,comment=1',
+        )
+        parser.add_argument(
+            '--port', type=int, default=0,
+            help='Порт сервера (0 - любой свободный)',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Зерно выбора сценариев'
+        )
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Нагружать саму базу и кэш из настроек, а не их временную '
+                 'копию; созданные посты и комментарии удаляются в конце',
+        )
+
+    def handle(self, *args, in_place, **options):
+        if not in_place:
+            with tempfile.TemporaryDirectory() as directory, \
+                    database_copy(directory):
+                self.stdout.write(
+                    'Нагрузка идёт на копии базы во временном каталоге'
+                )
+                self.run_load(**options)
+            return
+        last_post = last_pk(Post)
+        last_comment = last_pk(Comment)
+        try:
+            self.run_load(**options)
+        finally:
+            posts, comments = delete_created(last_post, last_comment)
+            self.stdout.write(
+                f'Удалено созданных нагрузкой постов: {posts}, '
+                f'комментариев: {comments}'
+            )
+
+    def run_load(self, workers, concurrency, sessions, seconds, timeout, mix,
+                 port, seed, **options):
+        listener = socket.create_server(('127.0.0.1', port), backlog=1024)
+        host, port = listener.getsockname()[:2]
+        harness = Harness(host, port, mix, timeout, seed)
+        harness.load_targets(sample=1000)
+        stores = create_sessions(min(sessions, concurrency))
+        # Соединения с базой не должны достаться воркерам от родителя
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=serve, args=(listener,), daemon=True)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        users = [VirtualUser(harness, store.session_key) for store in stores]
+        anonymous = concurrency - len(users)
+        users += [VirtualUser(harness) for _ in range(anonymous)]
+        self.stdout.write(
+            f'{workers} воркеров на {host}:{port}, {len(users)} посетителей '
+            f'({len(stores)} с входом), {seconds:g} с'
+        )
+        started = time.perf_counter()
+        try:
+            asyncio.run(harness.run(users, started + seconds))
+        finally:
+            elapsed = time.perf_counter() - started
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            listener.close()
+            for store in stores:
+                store.delete()
+        self.report(harness.stats, elapsed)
+
+    def report(self, stats, elapsed):
+        endpoints = sorted(set(stats.latencies) | set(stats.errors))
+        total_ok = sum(len(values) for values in stats.latencies.values())
+        total_errors = sum(
+            sum(errors.values()) for errors in stats.errors.values()
+        )
+        for endpoint in endpoints:
+            latencies = sorted(stats.latencies[endpoint])
+            errors = stats.errors[endpoint]
+            failed = sum(errors.values())
+            requests = len(latencies) + failed
+            self.stdout.write(self.style.MIGRATE_HEADING(endpoint))
+            self.stdout.write(
+                f'  {len(latencies) / elapsed:8.1f} зап/с  '
+                f'p50 {percentile(latencies, 0.5) * 1000:.1f} мс  '
+                f'p95 {percentile(latencies, 0.95) * 1000:.1f} мс  '
+                f'p99 {percentile(latencies, 0.99) * 1000:.1f} мс  '
+                f'ошибок {failed / max(requests, 1):.1%}'
+            )
+            by_count = sorted(errors.items(), key=lambda item: -item[1])
+            for reason, count in by_count:
+                self.stdout.write(
+                    self.style.ERROR(f'    {count:>6}  {reason}')
+                )
+            self.write_histogram(latencies)
+        error_share = total_errors / max(total_ok + total_errors, 1)
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего: {total_ok / elapsed:.1f} успешных зап/с, '
+            f'ошибок {error_share:.1%}'
+        ))
+
+    def write_histogram(self, latencies):
+        if not latencies:
+            return
+        counts = [0] * (len(BUCKETS) + 1)
+        for latency in latencies:
+            counts[bisect.bisect_left(BUCKETS, latency * 1000)] += 1
+        widest = max(counts)
+        labels = [f'≤{bound} мс' for bound in BUCKETS]
+        labels.append(f'>{BUCKETS[-1]} мс')
+        for label, count in zip(labels, counts):
+            if count:
+                bar = '#' * max(1, round(40 * count / widest))
+                self.stdout.write(f'    {label:>10} {count:>7}  {bar}')
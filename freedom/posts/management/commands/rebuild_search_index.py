@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает индекс полнотекстового поиска по постам и комментариям'
+    )
+
+    def handle(self, *args, **options):
+        search.install()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Индекс поиска пересобран'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', dest='user_ids', type=int, action='append',
+            help='Id пользователя, чью ленту нужно пересобрать '
+                 '(можно несколько раз)',
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        timeline.rebuild(user_ids)
+        entries = TimelineEntry.objects.all()
+        if user_ids:
+            entries = entries.filter(user_id__in=user_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'Записей в лентах: {entries.count()}')
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, комментариев '
+        'и подписок'
+    )
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for name, rows in drift.items():
+            self.stdout.write(f'{name}: исправлено строк {rows}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
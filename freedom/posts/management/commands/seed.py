@@ -0,0 +1,92 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seeding import Seeder
+
+STAGES = (
+    ('load', 'Генерация и запись строк'),
+    ('indexes', 'Создание индексов'),
+    ('search', 'Поисковый индекс'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, подписками, '
+        'постами и комментариями: строки генерируются в нескольких процессах '
+        'и пишутся executemany, индексы создаются после загрузки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=100000, help='Постов'
+        )
+        parser.add_argument(
+            '--users', type=int,
+            help='Пользователей (по умолчанию постов / 50)',
+        )
+        parser.add_argument(
+            '--groups', type=int,
+            help='Групп (по умолчанию пользователей / 100)',
+        )
+        parser.add_argument(
+            '--follows-per-user', type=int, default=10,
+            help='Подписок в среднем',
+        )
+        parser.add_argument(
+            '--comments-per-post', type=float, default=2,
+            help='Комментариев в среднем',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить посты',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов для генерации строк',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Постов в одной транзакции',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Зерно генератора'
+        )
+        parser.add_argument(
+            '--no-search-index', dest='search_index', action='store_false',
+            help=(
+                'Не заполнять поисковый индекс '
+                '(потом - rebuild_search_index)'
+            ),
+        )
+
+    def handle(self, *args, posts, users, groups, follows_per_user,
+               comments_per_post, days, workers, batch_size, seed,
+               search_index, **options):
+        users = users or max(50, posts // 50)
+        groups = groups or max(5, users // 100)
+        if comments_per_post <= 0:
+            raise CommandError('--comments-per-post должно быть больше нуля')
+        seeder = Seeder(
+            seed=seed, batch_size=batch_size, workers=workers,
+            follows_per_user=follows_per_user,
+            comments_per_post=comments_per_post, days=days,
+            search_index=search_index,
+        )
+        started = time.monotonic()
+        seeder.create_people(users=users, groups=groups)
+        seeder.add_posts(posts)
+        seeder.finish()
+        elapsed = time.monotonic() - started
+        for model, count in seeder.counts.items():
+            self.stdout.write(f'{model}: {count}')
+        for stage, label in STAGES:
+            if stage in seeder.timings:
+                self.stdout.write(f'{label}: {seeder.timings[stage]:.1f} с')
+        rows = sum(seeder.counts.values())
+        rate = rows / max(elapsed, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано строк: {rows} за {elapsed:.1f} с ({rate:.0f} строк/с)'
+        ))
@@ -0,0 +1,149 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+def fill_new_columns(apps, schema_editor):
+    """Заполняет счётчики, даты изменения и ленты по данным до миграции."""
+    user = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    post = apps.get_model('posts', 'Post')._meta.db_table
+    comment = apps.get_model('posts', 'Comment')._meta.db_table
+    follow = apps.get_model('posts', 'Follow')._meta.db_table
+    stats = apps.get_model('posts', 'UserStats')._meta.db_table
+    timeline = apps.get_model('posts', 'TimelineEntry')._meta.db_table
+    # Повторные подписки и подписки на себя запрещают ограничения ниже
+    schema_editor.execute(
+        f'DELETE FROM {follow} WHERE user_id = author_id OR id NOT IN ('
+        f'SELECT MIN(id) FROM {follow} GROUP BY user_id, author_id)'
+    )
+    schema_editor.execute(
+        f'UPDATE {post} SET updated = pub_date, comments_count = ('
+        f'SELECT COUNT(*) FROM {comment} WHERE {comment}.post_id = {post}.id)'
+    )
+    schema_editor.execute(
+        f'INSERT INTO {stats} (user_id, posts_count, followers_count, following_count) '
+        f'SELECT id, '
+        f'(SELECT COUNT(*) FROM {post} WHERE {post}.author_id = {user}.id), '
+        f'(SELECT COUNT(*) FROM {follow} WHERE {follow}.author_id = {user}.id), '
+        f'(SELECT COUNT(*) FROM {follow} WHERE {follow}.user_id = {user}.id) '
+        f'FROM {user}'
+    )
+    # Посты знаменитостей в ленты не копируются, как и при fan-out
+    schema_editor.execute(
+        f'INSERT INTO {timeline} (user_id, post_id, author_id, pub_date) '
+        f'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+        f'FROM {follow} AS follow '
+        f'JOIN {post} AS post ON post.author_id = follow.author_id '
+        f'JOIN {stats} AS stats ON stats.user_id = follow.author_id '
+        f'WHERE stats.followers_count <= %s',
+        (settings.TIMELINE_CELEBRITY_FOLLOWERS,),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.IntegerField(db_index=True, default=0, verbose_name='Подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Варианты картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_new_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_unique_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='follow_not_self'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_unique_user_post'),
+        ),
+    ]
@@ -31,6 +31,9 @@ class Group(models.Model):
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста', help_text='Введите текст поста')
     pub_date = models.DateTimeField(verbose_name='Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения', auto_now=True
+    )
     author = models.ForeignKey(
         User,
         null=True,
@@ -54,14 +57,69 @@ class Post(models.Model):
         null=True,
         help_text='Загрузите картинку'
     )
+    # Размеры картинки после нормализации при загрузке (posts.images)
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    # Ширины готовых вариантов картинки для srcset, заполняет posts.images
+    image_variants = models.CharField(
+        verbose_name='Варианты картинки',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False
+    )
+    # Денормализованный счётчик, меняется только через posts.counters
+    comments_count = models.IntegerField(
+        verbose_name='Комментариев',
+        default=0,
+        editable=False
+    )
+
+    COUNTER_FIELDS = ('comments_count',)
+    # Поля, которые заполняются в фоне отдельным UPDATE
+    BACKGROUND_FIELDS = COUNTER_FIELDS + ('image_variants',)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name_plural = 'Посты'
+        # Ленты фильтруют по автору или группе и сортируют по (pub_date, id)
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'), name='post_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Счётчики меняются атомарными UPDATE ... F(), варианты картинки -
+        # фоновой задачей; обычное сохранение поста не должно перезаписывать
+        # их устаревшим значением из памяти
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.BACKGROUND_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     text = models.TextField(verbose_name='Текст комментария', help_text='Введите текст комментария')
@@ -81,6 +139,14 @@ class Comment(models.Model):
 
     class Meta:
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx',
+            ),
+            # Навигация по датам в админке
+            models.Index(fields=('created',), name='comment_created_idx'),
+        )
 
 
 class Follow(models.Model):
@@ -99,3 +165,88 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='follow_unique_user_author'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='follow_not_self',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'
+            ),
+        )
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    подписок читается одним диапазоном по индексу (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    # Копия Post.pub_date: сортировка ленты не требует соединения с постами
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='timeline_unique_user_post'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author_idx'
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Меняются атомарно через posts.counters при сохранении и удалении
+    постов и подписок; расхождения исправляет reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.IntegerField(verbose_name='Постов', default=0)
+    followers_count = models.IntegerField(
+        verbose_name='Подписчиков', default=0, db_index=True
+    )
+    following_count = models.IntegerField(verbose_name='Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
@@ -0,0 +1,328 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Порядок лент: новые записи сверху, id разбивает записи с одинаковой датой
+FEED_ORDERING = ('-pub_date', '-id')
+
+# Целые вне INTEGER SQLite не передать параметром запроса
+MIN_INT, MAX_INT = -2 ** 63, 2 ** 63 - 1
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+def _encode_value(value):
+    if hasattr(value, 'isoformat'):
+        return ['d', value.isoformat()]
+    if isinstance(value, int):
+        return ['i', value]
+    if isinstance(value, float):
+        return ['f', value]
+    return ['s', str(value)]
+
+
+def _decode_value(tag, raw):
+    if tag == 'd':
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+    if tag == 'i':
+        return int(raw)
+    if tag == 'f':
+        return float(raw)
+    if tag == 's':
+        return str(raw)
+    raise ValueError(tag)
+
+
+def _fits(field, value):
+    """Подходит ли значение курсора полю модели."""
+    if field.is_relation:
+        field = field.target_field
+    if isinstance(field, models.DateTimeField):
+        return isinstance(value, datetime)
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return isinstance(value, int) and MIN_INT <= value <= MAX_INT
+    return isinstance(value, str)
+
+
+def check_cursor_values(model, ordering, values):
+    """Поднимает InvalidPage, если значения курсора не подходят ordering."""
+    if len(values) != len(ordering):
+        raise InvalidPage('Некорректный курсор страницы')
+    for name, value in zip(ordering, values):
+        if not _fits(model._meta.get_field(name.lstrip('-')), value):
+            raise InvalidPage('Некорректный курсор страницы')
+
+
+def encode_cursor(direction, values=None):
+    payload = [direction]
+    if values is not None:
+        payload.extend(_encode_value(value) for value in values)
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, значения ключа) или поднимает InvalidPage."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, *values = payload
+        if direction not in (NEXT, PREVIOUS, LAST):
+            raise ValueError(direction)
+        values = [_decode_value(tag, raw) for tag, raw in values]
+    except (TypeError, ValueError, binascii.Error, UnicodeError):
+        raise InvalidPage('Некорректный курсор страницы')
+    if direction == LAST:
+        return direction, None
+    if not values:
+        raise InvalidPage('Некорректный курсор страницы')
+    return direction, values
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по курсору вместо LIMIT/OFFSET.
+
+    Страница выбирается условием «после последней показанной записи»
+    по ключу ordering, поэтому стоимость запроса не зависит от номера
+    страницы и размера таблицы. Общее число записей считается только
+    при заданном total_limit и не больше чем до этого предела.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 total_limit=None):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.total_limit = total_limit
+
+    def _check_object_list_is_ordered(self):
+        # Порядок задаёт сам пагинатор через ordering
+        pass
+
+    @cached_property
+    def count(self):
+        """Приблизительное число записей: не больше total_limit + 1."""
+        if self.total_limit is None:
+            return None
+        return self.object_list.order_by()[:self.total_limit + 1].count()
+
+    @property
+    def count_is_exact(self):
+        return self.count is not None and self.count <= self.total_limit
+
+    @property
+    def num_pages(self):
+        return None
+
+    @property
+    def page_range(self):
+        return range(0)
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+    def validate_number(self, number):
+        return number
+
+    def get_page(self, cursor):
+        """Как page(), но для пустого или битого курсора - первая страница."""
+        if cursor:
+            try:
+                return self.page(cursor)
+            except InvalidPage:
+                pass
+        return self.page(None)
+
+    def page(self, cursor):
+        direction, values = decode_cursor(cursor) if cursor else (NEXT, None)
+        rows = self._fetch(
+            self.object_list, self.ordering, direction, values,
+            self.per_page + 1,
+        )
+        return self._build_page(rows, direction, values)
+
+    def _fetch(self, queryset, ordering, direction, values, limit):
+        """Возвращает до limit пар (ключ, объект) в порядке обхода."""
+        if direction != NEXT:
+            ordering = tuple(self._reverse(field) for field in ordering)
+        if values is not None:
+            check_cursor_values(queryset.model, ordering, values)
+            queryset = queryset.filter(self._seek(ordering, values))
+        keys = tuple(field.lstrip('-') for field in ordering)
+        return [
+            (tuple(getattr(obj, key) for key in keys), obj)
+            for obj in queryset.order_by(*ordering)[:limit]
+        ]
+
+    def _build_page(self, rows, direction, values):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = direction == PREVIOUS, has_more
+        object_list = [obj for key, obj in rows]
+        if not rows:
+            return KeysetPage(object_list, self)
+        return KeysetPage(
+            object_list, self,
+            next_cursor=encode_cursor(NEXT, rows[-1][0]) if has_next else None,
+            previous_cursor=(
+                encode_cursor(PREVIOUS, rows[0][0]) if has_previous else None
+            ),
+        )
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _seek(ordering, values):
+        # Условие (k1, k2, ...) «после» values в порядке ordering.
+        # Отдельное ограничение по первому ключу даёт планировщику
+        # диапазон по индексу вместо разбора OR целиком.
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+class KeysetSource(namedtuple('KeysetSource', 'queryset ordering transform')):
+    """Источник для MergedKeysetPaginator.
+
+    ordering задаётся в полях самого queryset, но должен давать ключи,
+    сравнимые с ключами остальных источников; transform превращает строку
+    источника в объект страницы.
+    """
+
+    def __new__(cls, queryset, ordering=FEED_ORDERING, transform=None):
+        return super().__new__(cls, queryset, tuple(ordering), transform)
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """Курсорная пагинация по слиянию нескольких упорядоченных источников.
+
+    Каждый источник читается своим индексом тем же курсором, результаты
+    сливаются в памяти; записи с одинаковым ключом показываются один раз.
+    Все поля ordering источников должны сортироваться в одну сторону.
+    """
+
+    def __init__(self, sources, per_page):
+        self.sources = list(sources)
+        super().__init__(
+            self.sources[0].queryset, per_page, self.sources[0].ordering
+        )
+
+    def page(self, cursor):
+        direction, values = decode_cursor(cursor) if cursor else (NEXT, None)
+        limit = self.per_page + 1
+        merged = {}
+        for source in self.sources:
+            rows = self._fetch(
+                source.queryset, source.ordering, direction, values, limit
+            )
+            for key, obj in rows:
+                if source.transform is not None:
+                    obj = source.transform(obj)
+                merged.setdefault(key, obj)
+        descending = self.ordering[0].startswith('-')
+        reverse = descending if direction == NEXT else not descending
+        rows = sorted(merged.items(), key=itemgetter(0), reverse=reverse)
+        return self._build_page(rows[:limit], direction, values)
+
+
+class KeysetPage(Page):
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} objects>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        raise InvalidPage(
+            'Номера страниц не поддерживаются, используйте курсор'
+        )
+
+    previous_page_number = next_page_number
+
+
+def estimate_rows(model, using='default'):
+    """Оценка числа строк таблицы по статистике базы или None.
+
+    Для SQLite берётся из sqlite_stat1 (заполняется ANALYZE),
+    для PostgreSQL - из pg_class.reltuples.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Статистики ещё нет: ANALYZE не запускался
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки без COUNT(*) по всей таблице.
+
+    Без фильтров число записей берётся из статистики базы, если записей
+    там больше ADMIN_COUNT_LIMIT. Иначе записи считаются, но не дальше
+    ADMIN_COUNT_LIMIT + 1: страницы за этим пределом недоступны,
+    их нужно сузить фильтром или поиском.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit + 1].count()
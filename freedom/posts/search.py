@@ -0,0 +1,263 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Два индекса: posts_search - строка на пост (rowid = id поста),
+posts_search_comments - строка на комментарий (rowid = id комментария,
+id поста хранится рядом). В обоих есть служебные токены автора и группы
+поста для фильтров. Таблицы синхронно обновляют триггеры на posts_post
+и posts_comment; каждый комментарий меняет только свою строку, поэтому
+запись не дорожает с числом комментариев поста. Индексы не описаны
+в миграциях: они создаются по post_migrate, а триггеры на время migrate
+снимаются, иначе SQLite не даст пересоздать таблицы постов при изменении
+схемы.
+
+Чтобы время поиска не росло с размером базы, ранжируются только
+SEARCH_WINDOW самых новых совпадений: FTS5 отдаёт их по rowid без
+сортировки всех найденных строк, а bm25 считается лишь для них.
+"""
+import re
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+
+from .paginator import FEED_ORDERING, NEXT, KeysetPaginator
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_search_comments'
+
+
+def _fold(expression):
+    # «ё» и «е» не различаются: в запросах её часто пишут как «е»
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+NEW_TEXT = _fold('NEW.text')
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+# Вес текста поста в bm25 выше, чем у комментариев; служебные колонки не весят
+RANK = f'bm25({TABLE}, 2.0, 0.0, 0.0)'
+COMMENTS_RANK = f'bm25({COMMENTS_TABLE}, 1.0, 0.0, 0.0, 0.0)'
+
+TRIGGERS = tuple(f'{TABLE}_{name}' for name in (
+    'post_insert', 'post_update', 'post_move', 'post_delete',
+    'comment_insert', 'comment_update', 'comment_delete',
+))
+INSERT_COMMENT = f"""INSERT INTO {COMMENTS_TABLE}
+        (rowid, text, post_id, author_key, group_key)
+        SELECT NEW.id, {NEW_TEXT}, NEW.post_id,
+               'a' || author_id, 'g' || group_id
+        FROM posts_post WHERE id = NEW.post_id;"""
+
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    f"text, author_key, group_key, {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENTS_TABLE} USING fts5("
+    f"text, post_id UNINDEXED, author_key, group_key, {TOKENIZE})",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_post_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {TABLE} (rowid, text, author_key, group_key)
+        VALUES (NEW.id, {NEW_TEXT}, 'a' || NEW.author_id,
+                'g' || NEW.group_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_post_update
+    AFTER UPDATE OF text, author_id, group_id ON posts_post BEGIN
+        UPDATE {TABLE}
+        SET text = {NEW_TEXT}, author_key = 'a' || NEW.author_id,
+            group_key = 'g' || NEW.group_id
+        WHERE rowid = NEW.id;
+    END""",
+    # Токены фильтров у комментариев меняются, только если пост сменил
+    # автора или группу: это редкость, а не каждая правка текста
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_post_move
+    AFTER UPDATE OF author_id, group_id ON posts_post
+    WHEN OLD.author_id != NEW.author_id
+         OR OLD.group_id IS NOT NEW.group_id BEGIN
+        UPDATE {COMMENTS_TABLE}
+        SET author_key = 'a' || NEW.author_id,
+            group_key = 'g' || NEW.group_id
+        WHERE rowid IN (SELECT id FROM posts_comment WHERE post_id = NEW.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_post_delete
+    AFTER DELETE ON posts_post BEGIN
+        DELETE FROM {TABLE} WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_comment_insert
+    AFTER INSERT ON posts_comment BEGIN
+        {INSERT_COMMENT}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_comment_update
+    AFTER UPDATE OF text, post_id ON posts_comment BEGIN
+        DELETE FROM {COMMENTS_TABLE} WHERE rowid = OLD.id;
+        {INSERT_COMMENT}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_comment_delete
+    AFTER DELETE ON posts_comment BEGIN
+        DELETE FROM {COMMENTS_TABLE} WHERE rowid = OLD.id;
+    END""",
+)
+
+REBUILD = (
+    f'DELETE FROM {TABLE}',
+    f"""INSERT INTO {TABLE} (rowid, text, author_key, group_key)
+    SELECT id, {_fold('text')}, 'a' || author_id, 'g' || group_id
+    FROM posts_post""",
+    f'DELETE FROM {COMMENTS_TABLE}',
+    f"""INSERT INTO {COMMENTS_TABLE}
+    (rowid, text, post_id, author_key, group_key)
+    SELECT comment.id, {_fold('comment.text')}, comment.post_id,
+           'a' || post.author_id, 'g' || post.group_id
+    FROM posts_comment AS comment
+    JOIN posts_post AS post ON post.id = comment.post_id""",
+)
+
+MAX_TERMS = 10
+
+
+def install(using='default', **kwargs):
+    """Создаёт индексы и триггеры; новые индексы сразу заполняются."""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        tables = db.introspection.table_names(cursor)
+        # migrate отдельных приложений идёт и до создания таблиц постов
+        if 'posts_post' not in tables or 'posts_comment' not in tables:
+            return
+        exists = COMMENTS_TABLE in tables
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        if not exists:
+            for statement in REBUILD:
+                cursor.execute(statement)
+
+
+def drop_triggers(using='default', **kwargs):
+    """Снимает триггеры перед migrate; install() вернёт их после."""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def rebuild():
+    """Заполняет индексы заново, например после загрузки в обход триггеров."""
+    with connection.cursor() as cursor:
+        for statement in REBUILD:
+            cursor.execute(statement)
+
+
+def build_match(query, author_id=None, group_id=None):
+    """Выражение MATCH из запроса пользователя или None, если искать нечего.
+
+    Подходит к обоим индексам. Синтаксис FTS5 пользователю недоступен:
+    каждое слово берётся в кавычки, и все слова должны найтись в тексте
+    поста или одного комментария.
+    """
+    terms = re.findall(r'\w+', query.lower().replace('ё', 'е'))[:MAX_TERMS]
+    if not terms:
+        return None
+    phrases = ' '.join(f'"{term}"' for term in terms)
+    parts = [f'text : ({phrases})']
+    if author_id is not None:
+        parts.append(f'author_key : a{int(author_id)}')
+    if group_id is not None:
+        parts.append(f'group_key : g{int(group_id)}')
+    return ' AND '.join(parts)
+
+
+def matching_post_ids(match):
+    """Подзапрос с id постов, подходящих под MATCH текстом или комментарием."""
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+        f'UNION SELECT post_id FROM {COMMENTS_TABLE} '
+        f'WHERE {COMMENTS_TABLE} MATCH %s',
+        (match, match),
+    )
+
+
+def matching_comment_ids(match):
+    """Подзапрос с id комментариев, подходящих под MATCH."""
+    return RawSQL(
+        f'SELECT rowid FROM {COMMENTS_TABLE} WHERE {COMMENTS_TABLE} MATCH %s',
+        (match,),
+    )
+
+
+def ranked_hits(match, window):
+    """Пары (оценка, id) по window + 1 новейшим совпадениям, лучшие первыми.
+
+    У поста берётся лучшая оценка из его текста и комментариев.
+    """
+    best = {}
+    with connection.cursor() as cursor:
+        for rank, table in ((RANK, TABLE), (COMMENTS_RANK, COMMENTS_TABLE)):
+            post_id = 'rowid' if table == TABLE else 'post_id'
+            cursor.execute(
+                f'SELECT {rank}, {post_id} FROM {table} '
+                f'WHERE {table} MATCH %s ORDER BY rowid DESC LIMIT %s',
+                (match, window + 1),
+            )
+            for score, hit in cursor.fetchall():
+                best[hit] = min(score, best.get(hit, score))
+    newest = sorted(best, reverse=True)[:window + 1]
+    # bm25 тем меньше, чем лучше совпадение; при равенстве выше новые
+    return sorted((best[post_id], -post_id) for post_id in newest)
+
+
+class SearchPaginator(KeysetPaginator):
+    """Курсорная пагинация по результатам поиска в порядке релевантности.
+
+    Ключ записи - (оценка bm25, -id). Оценки всего окна совпадений уже
+    в памяти, из базы загружаются только посты текущей страницы.
+    """
+
+    def __init__(self, hits, posts, per_page, window):
+        super().__init__(posts, per_page, total_limit=window)
+        self.hits = hits
+
+    @property
+    def count(self):
+        return len(self.hits)
+
+    def _fetch(self, queryset, ordering, direction, values, limit):
+        keys = self.hits if direction == NEXT else self.hits[::-1]
+        if values is not None:
+            # Сравнение в памяти: строка вместо числа дала бы TypeError
+            numeric = all(isinstance(value, (int, float)) for value in values)
+            if len(values) != 2 or not numeric:
+                raise InvalidPage('Некорректный курсор страницы')
+            values = tuple(values)
+            keys = [
+                key for key in keys
+                if (key > values if direction == NEXT else key < values)
+            ]
+        keys = keys[:limit]
+        posts = queryset.in_bulk([-post_id for _, post_id in keys])
+        return [(key, posts[-key[1]]) for key in keys if -key[1] in posts]
+
+
+def search_paginator(posts, query, per_page, author_id=None, group_id=None):
+    """Пагинатор результатов поиска; None, если в запросе нет слов."""
+    window = settings.SEARCH_WINDOW
+    # Без FTS5 (не SQLite) ищем простым вхождением слов, по дате
+    if connection.vendor != 'sqlite':
+        terms = re.findall(r'\w+', query)[:MAX_TERMS]
+        if not terms:
+            return None
+        for term in terms:
+            posts = posts.filter(text__icontains=term)
+        if author_id is not None:
+            posts = posts.filter(author_id=author_id)
+        if group_id is not None:
+            posts = posts.filter(group_id=group_id)
+        return KeysetPaginator(
+            posts, per_page, FEED_ORDERING, total_limit=window
+        )
+    match = build_match(query, author_id=author_id, group_id=group_id)
+    if match is None:
+        return None
+    return SearchPaginator(
+        ranked_hits(match, window), posts, per_page, window
+    )
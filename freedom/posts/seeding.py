@@ -0,0 +1,365 @@
+"""Синтетические данные для бенчмарков и нагрузочных тестов.
+
+Распределения неравномерные, как на живом сайте: у немногих авторов
+большая часть подписчиков (среди них есть «знаменитости» ленты подписок),
+немногие посты собирают большую часть комментариев, свежих постов больше,
+чем старых, и пишут их чаще вечером.
+
+Миллионы строк через модели грузились бы часами, поэтому строки
+генерируются кортежами в нескольких процессах и пишутся одним
+executemany на порцию. Вторичные индексы и триггеры поиска на время
+загрузки снимаются и создаются заново в конце; ленты подписок, счётчики
+и поисковый индекс, которые при этом не обновляются, заполняются здесь же.
+"""
+import multiprocessing
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import AutoField, Max
+from django.utils import timezone
+from faker import Faker
+
+from . import search
+from .models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats,
+)
+
+TEXT_POOL_SIZE = 1000
+NAME_POOL_SIZE = 500
+SECONDS_PER_DAY = 24 * 60 * 60
+# Таблицы, индексы и триггеры которых снимаются на время загрузки постов
+LOAD_TABLES = (Post, Comment, TimelineEntry)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Генератор для процессов пула: наследуется при fork
+_seeder = None
+
+
+def zipf_weights(count, exponent=1.1):
+    """Накопленные веса рангов 1..count по закону Ципфа для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class RowWriter:
+    """INSERT строк модели одним executemany.
+
+    Строка - кортеж значений полей fields, уже готовых для базы;
+    остальные поля получают значения по умолчанию.
+    """
+
+    def __init__(self, model, fields):
+        opts = model._meta
+        given = [opts.get_field(name) for name in fields]
+        rest = [
+            field for field in opts.concrete_fields
+            if field not in given and not isinstance(field, AutoField)
+        ]
+        self.tail = tuple(
+            field.get_db_prep_save(field.get_default(), connection)
+            for field in rest
+        )
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in given + rest)
+        placeholders = ', '.join(['%s'] * (len(given) + len(rest)))
+        self.sql = (
+            f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+            f'VALUES ({placeholders})'
+        )
+
+    def write(self, rows):
+        if self.tail:
+            rows = [row + self.tail for row in rows]
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.sql, rows)
+
+
+@contextmanager
+def deferred_indexes(models):
+    """Снимает вторичные индексы и триггеры таблиц моделей до конца блока.
+
+    Только для SQLite: определения берутся из sqlite_master и выполняются
+    заново после загрузки, уникальные индексы при этом проверяются.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    tables = [model._meta.db_table for model in models]
+    placeholders = ', '.join(['%s'] * len(tables))
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+            f"AND tbl_name IN ({placeholders}) ORDER BY type",
+            tables,
+        )
+        schema = cursor.fetchall()
+        for kind, name, _ in schema:
+            cursor.execute(f'DROP {kind.upper()} {quote(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, _, sql in schema:
+                cursor.execute(sql)
+
+
+def _generate(chunk):
+    return _seeder.generate_chunk(*chunk)
+
+
+class Seeder:
+    """Создаёт пользователей, группы и подписки, затем наращивает посты.
+
+    Посты можно добавлять несколько раз: так бенчмарк меряет одну и ту же
+    базу на нескольких размерах. Данные воспроизводимы при том же seed
+    и размере порции.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, workers=0, follows_per_user=10,
+                 comments_per_post=2, days=365, search_index=True):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.follows_per_user = follows_per_user
+        self.comments_per_post = comments_per_post
+        self.days = days
+        self.search_index = search_index
+        self.now = timezone.now()
+        self.naive_utc = connection.vendor == 'sqlite' and settings.USE_TZ
+        self.texts = [
+            self.fake.paragraph(nb_sentences=self.rng.randint(1, 6))
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+        self.user_ids = []
+        self.group_ids = []
+        self.followers = {}
+        self.celebrities = frozenset()
+        self.counts = Counter()
+        # Секунды по этапам: генерация и запись строк, индексы, поиск
+        self.timings = Counter()
+
+    def db_datetime(self, timestamp):
+        # Так же, как adapt_datetimefield_value SQLite при USE_TZ: строка
+        # наивного времени UTC, но без преобразований часовых поясов -
+        # это заметная доля времени генерации
+        value = EPOCH + timedelta(seconds=timestamp)
+        if self.naive_utc:
+            return str(value)
+        return connection.ops.adapt_datetimefield_value(
+            value.replace(tzinfo=dt_timezone.utc)
+        )
+
+    def _write(self, model, fields, rows):
+        RowWriter(model, fields).write(rows)
+        self.counts[model._meta.model_name] += len(rows)
+
+    def create_people(self, users, groups):
+        first_names = [self.fake.first_name() for _ in range(NAME_POOL_SIZE)]
+        last_names = [self.fake.last_name() for _ in range(NAME_POOL_SIZE)]
+        user_names = [self.fake.user_name() for _ in range(NAME_POOL_SIZE)]
+        joined = self.db_datetime(
+            self.now.timestamp() - self.days * SECONDS_PER_DAY
+        )
+        first_id = (User.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        self.user_ids = list(range(first_id, first_id + users))
+        first_id = (Group.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        self.group_ids = list(range(first_id, first_id + groups))
+        follows = self._follows()
+        with transaction.atomic():
+            self._write(
+                User,
+                ('id', 'username', 'first_name', 'last_name', 'password',
+                 'date_joined'),
+                [
+                    (
+                        user_id, f'{self.rng.choice(user_names)}_{user_id}',
+                        self.rng.choice(first_names),
+                        self.rng.choice(last_names),
+                        UNUSABLE_PASSWORD_PREFIX, joined,
+                    )
+                    for user_id in self.user_ids
+                ],
+            )
+            self._write(Group, ('id', 'title', 'slug', 'description'), [
+                (
+                    group_id, self.fake.catch_phrase()[:200],
+                    f'group-{group_id}', self.fake.paragraph(),
+                )
+                for group_id in self.group_ids
+            ])
+            self._write(Follow, ('user', 'author'), follows)
+            following = Counter(user_id for user_id, _ in follows)
+            self._write(
+                UserStats,
+                ('user', 'posts_count', 'followers_count', 'following_count'),
+                [
+                    (
+                        user_id, 0, len(self.followers.get(user_id, ())),
+                        following[user_id],
+                    )
+                    for user_id in self.user_ids
+                ],
+            )
+
+    def _follows(self):
+        # Популярность автора - его ранг по Ципфу: несколько авторов
+        # собирают тысячи подписчиков, у большинства их единицы
+        authors = self.user_ids[:]
+        self.rng.shuffle(authors)
+        weights = zipf_weights(len(authors))
+        follows = []
+        for user_id in self.user_ids:
+            wanted = min(
+                len(authors) - 1,
+                int(self.rng.expovariate(1 / self.follows_per_user)),
+            )
+            chosen = set(
+                self.rng.choices(authors, cum_weights=weights, k=wanted)
+            )
+            chosen.discard(user_id)
+            for author_id in sorted(chosen):
+                follows.append((user_id, author_id))
+                self.followers.setdefault(author_id, []).append(user_id)
+        self.celebrities = frozenset(
+            author_id for author_id, followers in self.followers.items()
+            if len(followers) > settings.TIMELINE_CELEBRITY_FOLLOWERS
+        )
+        return follows
+
+    def _timestamp(self, rng):
+        # День: квадрат равномерной величины сгущает посты к настоящему
+        # моменту; время суток - пик вечером
+        day = int(self.days * rng.random() ** 2)
+        second = int(rng.gauss(20, 3) * 3600) % SECONDS_PER_DAY
+        midnight = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        timestamp = (midnight - timedelta(days=day)).timestamp() + second
+        return min(timestamp, self.now.timestamp() - rng.random() * 3600)
+
+    def generate_chunk(self, first_id, count):
+        """Строки постов first_id..first_id+count, их комментариев и лент."""
+        rng = random.Random(f'{self.seed}:{first_id}')
+        now = self.now.timestamp()
+        alpha = 1 + 1 / self.comments_per_post
+        posts, comments, entries = [], [], []
+        posts_by_author = Counter()
+        for post_id in range(first_id, first_id + count):
+            timestamp = self._timestamp(rng)
+            pub_date = self.db_datetime(timestamp)
+            author_id = rng.choices(
+                self.authors, cum_weights=self.author_weights
+            )[0]
+            group_id = None
+            if self.group_ids and rng.random() < 0.7:
+                group_id = rng.choices(
+                    self.group_ids, cum_weights=self.group_weights
+                )[0]
+            # Число комментариев распределено по Парето: у большинства
+            # постов ноль-два, у редких - сотни
+            comments_count = min(1000, int(rng.paretovariate(alpha)) - 1)
+            for _ in range(comments_count):
+                created = min(
+                    now, timestamp + rng.expovariate(1 / 12) * 3600
+                )
+                comments.append((
+                    post_id, rng.choice(self.user_ids),
+                    rng.choice(self.texts), self.db_datetime(created),
+                ))
+            posts.append((
+                post_id, rng.choice(self.texts), pub_date, pub_date,
+                author_id, group_id, comments_count,
+            ))
+            posts_by_author[author_id] += 1
+            if author_id not in self.celebrities:
+                entries.extend(
+                    (user_id, post_id, author_id, pub_date)
+                    for user_id in self.followers.get(author_id, ())
+                )
+        return posts, comments, entries, posts_by_author
+
+    def add_posts(self, count):
+        """Добавляет count постов с комментариями и раскладывает по лентам."""
+        global _seeder
+        # Активность автора не зависит от его популярности
+        self.authors = self.user_ids[:]
+        self.rng.shuffle(self.authors)
+        self.author_weights = zipf_weights(len(self.authors))
+        self.group_weights = zipf_weights(len(self.group_ids))
+        first_id = (Post.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        chunks = [
+            (start, min(self.batch_size, first_id + count - start))
+            for start in range(first_id, first_id + count, self.batch_size)
+        ]
+        posts_by_author = Counter()
+        post_writer = RowWriter(Post, (
+            'id', 'text', 'pub_date', 'updated', 'author', 'group',
+            'comments_count',
+        ))
+        comment_writer = RowWriter(
+            Comment, ('post', 'author', 'text', 'created')
+        )
+        entry_writer = RowWriter(
+            TimelineEntry, ('user', 'post', 'author', 'pub_date')
+        )
+        _seeder = self
+        pool = None
+        if self.workers > 1:
+            pool = multiprocessing.get_context('fork').Pool(self.workers)
+        try:
+            generated = (
+                pool.imap(_generate, chunks) if pool
+                else map(_generate, chunks)
+            )
+            started = time.monotonic()
+            with deferred_indexes(LOAD_TABLES):
+                # Пул генерирует следующие порции, пока текущая пишется в базу
+                for posts, comments, entries, authors in generated:
+                    with transaction.atomic():
+                        post_writer.write(posts)
+                        comment_writer.write(comments)
+                        entry_writer.write(entries)
+                    self.counts.update(
+                        post=len(posts), comment=len(comments),
+                        timelineentry=len(entries),
+                    )
+                    posts_by_author.update(authors)
+                loaded = time.monotonic()
+            self.timings['load'] += loaded - started
+            self.timings['indexes'] += time.monotonic() - loaded
+        finally:
+            _seeder = None
+            if pool:
+                pool.close()
+                pool.join()
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {UserStats._meta.db_table} '
+                'SET posts_count = posts_count + %s WHERE user_id = %s',
+                [
+                    (total, author_id)
+                    for author_id, total in posts_by_author.items()
+                ],
+            )
+        if self.search_index and connection.vendor == 'sqlite':
+            started = time.monotonic()
+            search.rebuild()
+            self.timings['search'] += time.monotonic() - started
+
+    def finish(self):
+        """Сбрасывает кэши, зависящие от данных: ленты, графы подписок."""
+        cache.clear()
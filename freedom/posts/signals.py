@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, follow_graph, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def bump_post_feeds(post, group_ids=()):
+    """Меняет версии всех лент, где виден пост."""
+    scopes = {feed_cache.GLOBAL, feed_cache.post_scope(post.pk)}
+    if post.author_id is not None:
+        scopes.add(feed_cache.author_scope(post.author_id))
+    for group_id in {post.group_id, *group_ids}:
+        if group_id is not None:
+            scopes.add(feed_cache.group_scope(group_id))
+    feed_cache.bump(*scopes)
+    feed_cache.bump_many(
+        feed_cache.follow_scope(user_id)
+        for user_id in timeline.followers_to_notify(post.author_id)
+    )
+
+
+def follow_committed(follow):
+    # Только после фиксации: иначе запрос, читающий реплику, успел бы
+    # снова положить в кэш старое множество подписок
+    follow_graph.invalidate(follow.user_id)
+    bump_follow_feeds(follow)
+
+
+def bump_follow_feeds(follow):
+    # Лента подписок читателя, кнопка подписки и счётчики в обоих профилях
+    feed_cache.bump(
+        feed_cache.follow_scope(follow.user_id),
+        feed_cache.author_scope(follow.author_id),
+        feed_cache.author_scope(follow.user_id),
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    # Вход пользователя обновляет только last_login: ленты не меняются
+    elif update_fields is None or set(update_fields) != {'last_login'}:
+        feed_cache.bump(
+            feed_cache.GLOBAL, feed_cache.author_scope(instance.pk)
+        )
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    # Пост мог сменить группу: старая группа тоже должна обновиться,
+    # а при смене картинки её варианты нужно создать заново
+    instance._previous_group_id = None
+    instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first()
+            or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    elif (instance.image.name or '') != (
+        getattr(instance, '_previous_image', None) or ''
+    ):
+        # Варианты старой картинки новой не подходят
+        instance.image_variants = ''
+        Post.objects.filter(pk=instance.pk).update(image_variants='')
+    bump_post_feeds(instance, (getattr(instance, '_previous_group_id', None),))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    bump_post_feeds(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+    feed_cache.bump(feed_cache.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    feed_cache.bump(feed_cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.group_scope(instance.pk))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты группы останутся без неё, а сигналы постов при этом не придут
+    authors = instance.posts.values_list('author_id', flat=True).distinct()
+    feed_cache.bump(
+        feed_cache.GLOBAL,
+        feed_cache.group_scope(instance.pk),
+        *(feed_cache.author_scope(author_id) for author_id in authors),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        timeline.followers_changed(instance.author_id, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        transaction.on_commit(lambda: follow_committed(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.followers_changed(instance.author_id, -1)
+    transaction.on_commit(lambda: follow_committed(instance))
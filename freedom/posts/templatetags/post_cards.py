@@ -0,0 +1,69 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.streaming import StreamedHTML
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_SEPARATOR = '\n<hr>\n'
+# Карточку с заглушкой вместо миниатюры не кэшируем: картинка скоро появится
+PENDING_MARKER = 'data-thumbnail-pending'
+
+
+def card_key(post, geometry, show_author, show_group):
+    # Ключ меняется вместе со всем, что видно в карточке: изменения поста,
+    # имя автора, адрес группы, размер и варианты картинки
+    author = post.author
+    parts = (
+        post.pk,
+        post.updated.timestamp() if post.updated else '',
+        author.get_full_name() if author else '',
+        author.username if author else '',
+        post.group.slug if show_group and post.group else '',
+        post.image_variants,
+        geometry,
+        int(show_author),
+        int(show_group),
+    )
+    digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'post_card:{post.pk}:{digest}'
+
+
+def iter_cards(posts, show_author, show_group):
+    """Карточки через CARD_SEPARATOR по одной; посты читаются
+    при первом шаге."""
+    geometry = settings.POST_CARD_THUMBNAIL_GEOMETRY
+    keys = [
+        card_key(post, geometry, show_author, show_group) for post in posts
+    ]
+    cached = cache.get_many(keys)
+    rendered = {}
+    for num, (key, post) in enumerate(zip(keys, posts)):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(CARD_TEMPLATE, {
+                'post': post,
+                'geometry': geometry,
+                'show_author': show_author,
+                'show_group': show_group,
+            })
+            if PENDING_MARKER not in card:
+                rendered[key] = card
+        yield mark_safe(CARD_SEPARATOR + card if num else card)
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+
+
+@register.simple_tag
+def post_cards(posts, show_author=True, show_group=True):
+    """Карточки постов страницы; готовый HTML берётся из кэша одним get_many.
+
+    В потоковом рендере (core.streaming) карточки уходят клиенту по одной.
+    """
+    return StreamedHTML(iter_cards(posts, show_author, show_group))
@@ -0,0 +1,11 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, geometry):
+    """Готовая миниатюра картинки поста; пока её нет - заглушка без url."""
+    return thumbnails.ready_thumbnail(post, geometry)
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginator import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.groups = [
+            Group.objects.create(title=f'Группа {num}', slug=f'group_{num}', description='Описание')
+            for num in range(5)
+        ]
+        cls.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.superuser)
+
+    def create_posts(self, count):
+        for num in range(count):
+            author = User.objects.create_user(username=f'author_{Post.objects.count()}')
+            post = Post.objects.create(
+                text=f'Пост {num}', author=author, group=self.groups[num % len(self.groups)]
+            )
+            Comment.objects.create(post=post, author=author, text='Комментарий')
+            Follow.objects.create(user=self.test_author, author=author)
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.admin_client.get(reverse(f'admin:posts_{name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_changelists_do_not_grow_with_rows(self):
+        """Число запросов списков не зависит от числа строк на странице."""
+        for name in ('post', 'comment', 'follow'):
+            with self.subTest(name=name):
+                self.create_posts(2)
+                response, few = self.changelist_queries(name)
+                self.create_posts(8)
+                response, many = self.changelist_queries(name)
+                self.assertEqual(len(few), len(many))
+
+    def test_counts_are_bounded(self):
+        """Записи считаются с пределом, без второго подсчёта всей таблицы."""
+        self.create_posts(3)
+        response, queries = self.changelist_queries('post')
+        counts = [sql for sql in queries if 'COUNT(' in sql]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT', counts[0])
+
+    def test_group_is_chosen_by_autocomplete(self):
+        """Группа в списке постов выбирается автодополнением, а не списком всех групп."""
+        self.create_posts(1)
+        response, queries = self.changelist_queries('post')
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, 'Группа 0')
+        self.assertNotContains(response, 'Группа 4')
+
+    def test_date_hierarchy(self):
+        """Навигация по датам работает в списках постов и комментариев."""
+        self.create_posts(1)
+        post = Post.objects.get()
+        for name, date in (('post', post.pub_date), ('comment', post.comments.get().created)):
+            with self.subTest(name=name):
+                response = self.admin_client.get(
+                    reverse(f'admin:posts_{name}_changelist'),
+                    {f'{"pub_date" if name == "post" else "created"}__year': date.year}
+                )
+                self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {num}', author=cls.test_author) for num in range(12)
+        )
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_count_is_capped_or_estimated(self):
+        """Без статистики число записей ограничено пределом, со статистикой - берётся из неё."""
+        queryset = Post.objects.order_by('-pk')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 6)
+        self.assertEqual(
+            EstimatedCountPaginator(queryset.filter(text='Пост 1'), 10).count, 1
+        )
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as context:
+            count = EstimatedCountPaginator(queryset, 10).count
+        self.assertEqual(count, 12)
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
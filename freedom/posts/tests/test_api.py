@@ -0,0 +1,126 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(
+            username='Test_author', first_name='Тест', last_name='Автор'
+        )
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        for num in range(12):
+            cls.test_post = Post.objects.create(
+                text=f'Тестовый пост {num}', author=cls.test_author, group=cls.test_group
+            )
+        Comment.objects.create(post=cls.test_post, author=cls.test_author, text='Комментарий')
+        cls.client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def get_json(self, url, status=200, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        return json.loads(response.content)
+
+    def test_feeds_mirror_pages(self):
+        """Ленты API отдают те же посты, что и страницы сайта, по тем же курсорам."""
+        urls = (
+            (reverse('api:posts'), reverse('posts:index')),
+            (reverse('api:group_posts', args=('test_slug',)), reverse('posts:group_list', args=('test_slug',))),
+            (reverse('api:profile', args=('Test_author',)), reverse('posts:profile', args=('Test_author',))),
+        )
+        for api_url, page_url in urls:
+            with self.subTest(url=api_url):
+                data = self.get_json(api_url)
+                page_obj = self.client.get(page_url).context['page_obj']
+                self.assertEqual([post['id'] for post in data['results']], [post.pk for post in page_obj])
+                self.assertEqual(data['next'], page_obj.next_cursor)
+                second = self.get_json(api_url, cursor=data['next'])
+                self.assertEqual(len(second['results']), 2)
+                self.assertIsNone(second['next'])
+
+    def test_post_fields(self):
+        """Пост сериализуется со всеми полями, а профиль - со счётчиками автора."""
+        data = self.get_json(reverse('api:profile', args=('Test_author',)))
+        self.assertEqual(data['author'], {
+            'username': 'Test_author',
+            'full_name': 'Тест Автор',
+            'posts_count': 12,
+            'followers_count': 0,
+            'following_count': 0,
+        })
+        self.assertEqual(data['results'][0], {
+            'id': self.test_post.pk,
+            'text': 'Тестовый пост 11',
+            'pub_date': self.test_post.pub_date.isoformat(),
+            'updated': Post.objects.get(pk=self.test_post.pk).updated.isoformat(),
+            'author': 'Test_author',
+            'group': {'slug': 'test_slug', 'title': 'Тестовая группа'},
+            'comments_count': 1,
+            'image': None,
+        })
+
+    def test_fields_limit_columns(self):
+        """Параметр fields сокращает ответ и колонки запроса."""
+        with CaptureQueriesContext(connection) as context:
+            data = self.get_json(reverse('api:posts'), fields='id,text')
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        sql = context.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"comments_count"', sql)
+        data = self.get_json(reverse('api:posts'), status=400, fields='id,password')
+        self.assertIn('password', data['error'])
+
+    def test_post_detail(self):
+        """Пост отдаётся с комментариями; неизвестные объекты - ошибка 404 в JSON."""
+        data = self.get_json(reverse('api:post_detail', args=(self.test_post.pk,)), fields='id,author')
+        self.assertEqual(data['post'], {'id': self.test_post.pk, 'author': 'Test_author'})
+        self.assertEqual([comment['text'] for comment in data['comments']], ['Комментарий'])
+        for url in (
+            reverse('api:post_detail', args=(0,)),
+            reverse('api:group_posts', args=('missing',)),
+            reverse('api:profile', args=('missing',)),
+        ):
+            with self.subTest(url=url):
+                self.assertIn('error', self.get_json(url, status=404))
+
+    def test_gzip_and_cache(self):
+        """Ответ сжимается gzip и отдаётся из кэша до изменения ленты."""
+        url = reverse('api:posts')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        with CaptureQueriesContext(connection) as context:
+            cached = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(json.loads(gzip.decompress(cached.content)), data)
+        self.assertFalse([query for query in context.captured_queries if 'posts_post' in query['sql']])
+        Post.objects.create(text='Новый пост', author=self.test_author)
+        self.assertEqual(self.get_json(url)['results'][0]['text'], 'Новый пост')
+
+    def test_image_thumbnail_urls(self):
+        """Для картинки отдаются ссылки на оригинал и готовые варианты миниатюры."""
+        Post.objects.filter(pk=self.test_post.pk).update(image='posts/cat.jpg', image_variants='480,960')
+        data = self.get_json(reverse('api:post_detail', args=(self.test_post.pk,)), fields='image')
+        image = data['post']['image']
+        self.assertEqual(image['original'], '/media/posts/cat.jpg')
+        self.assertEqual(image['url'], '/media/posts/cat_960w.jpeg')
+        self.assertIn('/media/posts/cat_480w.jpeg 480w', image['srcset'])
@@ -0,0 +1,64 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..views import COMMENTS_PER_PAGE
+
+User = get_user_model()
+
+
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_post = Post.objects.create(text='Тестовый пост', author=cls.test_author)
+        for num in range(COMMENTS_PER_PAGE + 5):
+            author = User.objects.create_user(username=f'commenter_{num}')
+            Comment.objects.create(post=cls.test_post, author=author, text=f'Комментарий {num}')
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_page(self):
+        """Страница поста показывает первую страницу комментариев и кнопку «ещё»."""
+        response = self.guest_client.get(reverse('posts:post_detail', args=(self.test_post.id,)))
+        comments = list(response.context['comments'])
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'data-fragment-url')
+        self.assertNotContains(response, f'Комментарий {COMMENTS_PER_PAGE}')
+
+    def test_fragment_returns_next_page(self):
+        """Фрагмент отдаёт следующую страницу без кнопки, если комментарии кончились."""
+        first = self.guest_client.get(reverse('posts:post_detail', args=(self.test_post.id,)))
+        cursor = first.context['comments'].next_cursor
+        url = reverse('posts:post_comments', args=(self.test_post.id,))
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(url, {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {num}' for num in range(COMMENTS_PER_PAGE, COMMENTS_PER_PAGE + 5)]
+        )
+        self.assertNotContains(response, 'data-fragment-url')
+        self.assertEqual(self.guest_client.get(reverse('posts:post_comments', args=(0,))).status_code, 404)
+
+    def test_api_comments(self):
+        """API отдаёт первую страницу комментариев с поста и следующие по курсору."""
+        data = json.loads(self.guest_client.get(
+            reverse('api:post_detail', args=(self.test_post.id,))
+        ).content)
+        self.assertEqual(len(data['comments']), COMMENTS_PER_PAGE)
+        data = json.loads(self.guest_client.get(
+            reverse('api:post_comments', args=(self.test_post.id,)), {'cursor': data['comments_next']}
+        ).content)
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['results'][0]['author'], f'commenter_{COMMENTS_PER_PAGE}')
+        self.assertIsNone(data['next'])
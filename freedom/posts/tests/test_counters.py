@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from .. import counters
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_user = User.objects.create_user(username='Test_user')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении постов, комментариев и подписок."""
+        post = Post.objects.create(text='Тестовый пост', author=self.test_author)
+        comment = Comment.objects.create(post=post, author=self.test_user, text='Комментарий')
+        Follow.objects.create(user=self.test_user, author=self.test_author)
+        self.assertEqual(self.stats(self.test_author).posts_count, 1)
+        self.assertEqual(self.stats(self.test_author).followers_count, 1)
+        self.assertEqual(self.stats(self.test_user).following_count, 1)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
+        comment.delete()
+        Follow.objects.filter(user=self.test_user).delete()
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 0)
+        self.assertEqual(self.stats(self.test_author).followers_count, 0)
+        self.assertEqual(self.stats(self.test_user).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.test_author).posts_count, 0)
+
+    def test_post_save_keeps_counters(self):
+        """Сохранение поста из памяти не затирает счётчик комментариев."""
+        post = Post.objects.create(text='Тестовый пост', author=self.test_author)
+        Comment.objects.create(post=post, author=self.test_user, text='Комментарий')
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
+
+    def test_missing_stats_are_computed(self):
+        """Отсутствующие счётчики считаются по фактическим данным."""
+        Post.objects.create(text='Тестовый пост', author=self.test_author)
+        UserStats.objects.filter(user=self.test_author).delete()
+        self.assertEqual(counters.get_stats(self.test_author.pk).posts_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        """Сверка исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(text='Тестовый пост', author=self.test_author)
+        Comment.objects.create(post=post, author=self.test_user, text='Комментарий')
+        UserStats.objects.filter(user=self.test_author).update(posts_count=10)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        UserStats.objects.filter(user=self.test_user).delete()
+        drift = counters.reconcile()
+        self.assertEqual(drift['posts_count'], 1)
+        self.assertEqual(drift['comments_count'], 1)
+        self.assertEqual(self.stats(self.test_author).posts_count, 1)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
+        self.assertTrue(UserStats.objects.filter(user=self.test_user).exists())
@@ -0,0 +1,172 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from .. import feed_cache
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_user = User.objects.create_user(username='Test_user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        cls.test_post = Post.objects.create(
+            text='Тестовый пост', author=cls.test_author, group=cls.test_group
+        )
+        Follow.objects.create(user=cls.test_user, author=cls.test_author)
+        cls.guest_client = Client()
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.test_user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_is_served_from_cache(self):
+        """Повторный запрос страницы отдаётся из кэша без рендера шаблона."""
+        url = reverse('posts:group_list', args=(self.test_group.slug,))
+        first = self.guest_client.get(url)
+        second = self.guest_client.get(url)
+        self.assertIsNotNone(first.context)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('max-age=0', second['Cache-Control'])
+
+    def test_personal_page_is_not_served_to_guest(self):
+        """Страница, закэшированная для вошедшего, не достаётся анониму:
+        ни имя пользователя, ни его CSRF-токен."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.test_group.slug,)),
+            reverse('posts:profile', args=(self.test_author.username,)),
+            reverse('posts:post_detail', args=(self.test_post.id,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                personal = self.authorized_client.get(url)
+                self.assertContains(personal, self.test_user.username)
+                response = Client().get(url)
+                self.assertNotContains(response, f'Вы авторизованы как: {self.test_user.username}')
+                self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_follow_feed_is_cached_per_session(self):
+        """Лента подписок одного пользователя не достаётся другому,
+        а у другой сессии того же пользователя свой CSRF-токен."""
+        url = reverse('posts:follow_index')
+        self.authorized_client.get(url)
+        other = Client()
+        other.force_login(self.test_author)
+        self.assertNotContains(other.get(url), 'Тестовый пост')
+        second_session = Client()
+        second_session.force_login(self.test_user)
+        second_session.cookies['csrftoken'] = 'x' * 32
+        self.assertIsNotNone(second_session.get(url).context)
+
+    def test_shared_page_with_csrf_token_is_not_cached(self):
+        """Общая страница анонима с CSRF-токеном в кэш не попадает."""
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            return HttpResponse(get_token(request))
+
+        cached_view = feed_cache.cache_feed(lambda request: [feed_cache.GLOBAL])(view)
+        factory = RequestFactory()
+        first = cached_view(factory.get('/csrf-page/'))
+        second = cached_view(factory.get('/csrf-page/'))
+        self.assertEqual(len(calls), 2)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertNotEqual(first.content, second.content)
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден во всех лентах, где он должен появиться."""
+        clients_urls = (
+            (self.guest_client, reverse('posts:index')),
+            (self.guest_client, reverse('posts:group_list', args=(self.test_group.slug,))),
+            (self.guest_client, reverse('posts:profile', args=(self.test_author.username,))),
+            (self.authorized_client, reverse('posts:follow_index')),
+        )
+        for client, url in clients_urls:
+            client.get(url)
+        Post.objects.create(text='Свежий пост', author=self.test_author, group=self.test_group)
+        for client, url in clients_urls:
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Свежий пост')
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий сразу виден на странице поста."""
+        url = reverse('posts:post_detail', args=(self.test_post.id,))
+        self.guest_client.get(url)
+        Comment.objects.create(post=self.test_post, author=self.test_user, text='Свежий комментарий')
+        self.assertContains(self.guest_client.get(url), 'Свежий комментарий')
+
+    def test_unrelated_post_keeps_group_cache(self):
+        """Пост в другой группе не сбрасывает кэш страницы группы."""
+        url = reverse('posts:group_list', args=(self.test_group.slug,))
+        self.guest_client.get(url)
+        Post.objects.create(text='Пост без группы', author=self.test_user)
+        self.assertIsNone(self.guest_client.get(url).context)
+
+    def test_conditional_get(self):
+        """Страницы отдают ETag и Last-Modified; с прежним значением - 304 без рендера."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.test_group.slug,)),
+            reverse('posts:profile', args=(self.test_author.username,)),
+            reverse('posts:post_detail', args=(self.test_post.id,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                etag = response['ETag']
+                not_modified = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertIsNone(not_modified.context)
+                self.assertEqual(not_modified['ETag'], etag)
+                not_modified = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_validators_change_with_content_and_user(self):
+        """ETag меняется при изменении страницы и у другого пользователя."""
+        url = reverse('posts:post_detail', args=(self.test_post.id,))
+        etag = self.guest_client.get(url)['ETag']
+        self.assertNotEqual(self.authorized_client.get(url)['ETag'], etag)
+        Comment.objects.create(post=self.test_post, author=self.test_user, text='Новый комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_validators_of_one_user_do_not_match_another(self):
+        """Валидаторы страницы одного пользователя не дают 304 другому:
+        Last-Modified у личных страниц нет, ETag у каждого свой."""
+        url = reverse('posts:post_detail', args=(self.test_post.id,))
+        first = self.authorized_client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        other = Client()
+        other.force_login(self.test_author)
+        response = other.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertContains(response, f'Вы авторизованы как: {self.test_author.username}')
+        guest_page = self.guest_client.get(url)
+        response = other.get(url, HTTP_IF_MODIFIED_SINCE=guest_page['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_costs_one_query(self):
+        """Ответ 304 стоит не больше одного запроса - поиска области страницы."""
+        url = reverse('posts:group_list', args=(self.test_group.slug,))
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import feed_cache, follow_graph, timeline
+from ..models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_user = User.objects.create_user(username='Test_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.test_user)
+
+    def setUp(self):
+        cache.clear()
+
+    def follow_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            result = func()
+        return result, [query for query in context.captured_queries if 'posts_follow' in query['sql']]
+
+    def test_follow_is_idempotent_and_not_self(self):
+        """Повторная подписка и подписка на себя ничего не меняют."""
+        self.assertTrue(follow_graph.follow(self.test_user, self.test_author))
+        self.assertFalse(follow_graph.follow(self.test_user, self.test_author))
+        self.assertFalse(follow_graph.follow(self.test_user, self.test_user))
+        self.authorized_client.get(reverse('posts:profile_follow', args=(self.test_user.username,)))
+        self.assertEqual(list(Follow.objects.values_list('user', 'author')), [
+            (self.test_user.pk, self.test_author.pk)
+        ])
+        self.assertFalse(follow_graph.unfollow(self.test_user, self.test_user))
+
+    def test_self_follow_is_rejected_by_database(self):
+        """Подписку на себя не пропускает ограничение в базе."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.test_user, author=self.test_user)
+
+    def test_profile_checks_follow_without_table(self):
+        """Профиль узнаёт о подписке из кэша, не обращаясь к таблице подписок."""
+        follow_graph.follow(self.test_user, self.test_author)
+        url = reverse('posts:profile', args=(self.test_author.username,))
+        follow_graph.followees(self.test_user.pk)
+        response, queries = self.follow_queries(lambda: self.authorized_client.get(url))
+        self.assertEqual(response.context['following'], 'following')
+        self.assertEqual(queries, [])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=0)
+    def test_followed_celebrities_without_table(self):
+        """Авторы-знаменитости для ленты берутся из множества подписок."""
+        follow_graph.follow(self.test_user, self.test_author)
+        follow_graph.followees(self.test_user.pk)
+        celebrities, queries = self.follow_queries(
+            lambda: timeline.followed_celebrities(self.test_user.pk)
+        )
+        self.assertEqual(celebrities, [self.test_author.pk])
+        self.assertEqual(queries, [])
+
+
+class FollowCommitTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.test_author = User.objects.create_user(username='Test_author')
+        self.test_user = User.objects.create_user(username='Test_user')
+
+    def follow_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            result = func()
+        return result, [query for query in context.captured_queries if 'posts_follow' in query['sql']]
+
+    def test_followees_are_cached_and_invalidated(self):
+        """Множество подписок читается из кэша и сбрасывается при подписке и отписке."""
+        self.assertFalse(follow_graph.is_following(self.test_user.pk, self.test_author.pk))
+        following, queries = self.follow_queries(
+            lambda: follow_graph.is_following(self.test_user.pk, self.test_author.pk)
+        )
+        self.assertFalse(following)
+        self.assertEqual(queries, [])
+        self.assertTrue(follow_graph.follow(self.test_user, self.test_author))
+        self.assertTrue(follow_graph.is_following(self.test_user.pk, self.test_author.pk))
+        self.assertTrue(follow_graph.unfollow(self.test_user, self.test_author))
+        self.assertFalse(follow_graph.is_following(self.test_user.pk, self.test_author.pk))
+
+    def test_caches_are_reset_after_commit(self):
+        """Кэш сбрасывается после фиксации: старое множество, положенное
+        параллельным запросом до неё, не остаётся в кэше."""
+        scope = feed_cache.follow_scope(self.test_user.pk)
+        version, = feed_cache.get_versions([scope])
+        with transaction.atomic():
+            Follow.objects.create(user=self.test_user, author=self.test_author)
+            cache.set(follow_graph.FOLLOWEES_KEY.format(self.test_user.pk), follow_graph._pack(()))
+            self.assertEqual(feed_cache.get_versions([scope]), [version])
+        self.assertTrue(follow_graph.is_following(self.test_user.pk, self.test_author.pk))
+        self.assertNotEqual(feed_cache.get_versions([scope]), [version])
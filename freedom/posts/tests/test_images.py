@@ -0,0 +1,127 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import images
+from ..forms import PostForm
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_jpeg(name, size=(1200, 600), orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(name=name, content=buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name):
+        return Post.objects.create(text='Пост', author=self.test_author, image=make_jpeg(name))
+
+    def test_variants_are_not_wider_than_source(self):
+        """Варианты создаются рядом с оригиналом и не шире исходной картинки."""
+        post = self.create_post('photo.jpg')
+        self.assertEqual(images.build_variants(post.pk, post.image.name), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, '480,960')
+        for width in (480, 960):
+            for image_format in images.variant_formats():
+                name = images.variant_name(post.image.name, width, image_format)
+                self.assertTrue(name.startswith('posts/photo_'))
+                with default_storage.open(name) as file:
+                    self.assertEqual(Image.open(file).size, images.variant_size(width, '960x339'))
+        self.assertFalse(default_storage.exists(images.variant_name(post.image.name, 1440, images.JPEG)))
+
+    def test_card_has_srcset_and_dimensions(self):
+        """Карточка поста с вариантами содержит srcset, sizes и размеры картинки."""
+        post = self.create_post('card.jpg')
+        images.build_variants(post.pk, post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'srcset="{images.srcset(post.image.name, [480, 960], images.JPEG)}"')
+        self.assertContains(response, f'sizes="{settings.POST_IMAGE_SIZES}"')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_new_image_resets_variants(self):
+        """После замены картинки варианты старой картинки не используются."""
+        post = self.create_post('old.jpg')
+        images.build_variants(post.pk, post.image.name)
+        post = Post.objects.get(pk=post.pk)
+        post.image = make_jpeg('new.jpg')
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, '')
+
+    def test_backfill_command_skips_processed_posts(self):
+        """Команда создаёт варианты только там, где их ещё нет."""
+        processed = self.create_post('processed.jpg')
+        Post.objects.filter(pk=processed.pk).update(image_variants='480')
+        pending = self.create_post('pending.jpg')
+        Post.objects.create(text='Без картинки', author=self.test_author)
+        out = io.StringIO()
+        call_command('build_image_variants', workers=0, stdout=out)
+        self.assertIn('Готово: 1, с ошибками: 0', out.getvalue())
+        pending.refresh_from_db()
+        self.assertEqual(pending.image_variants, '480,960')
+        self.assertFalse(
+            default_storage.exists(images.variant_name(processed.image.name, 480, images.JPEG))
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def make_form(self, upload):
+        return PostForm(data={'text': 'Пост'}, files={'image': upload})
+
+    @override_settings(POST_IMAGE_MAX_SIZE=500)
+    def test_upload_is_normalized(self):
+        """Картинка поворачивается по EXIF, уменьшается и теряет метаданные."""
+        form = self.make_form(make_jpeg('photo.jpg', size=(1200, 600), orientation=6))
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        self.assertEqual((post.image_width, post.image_height), (250, 500))
+        self.assertEqual(post.image.name, 'photo.jpg')
+        post.image.open()
+        saved = Image.open(post.image)
+        self.assertEqual(saved.size, (250, 500))
+        self.assertNotIn(0x0112, saved.getexif())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_are_rejected(self):
+        """Картинка с огромным числом пикселей не принимается."""
+        form = self.make_form(make_jpeg('bomb.jpg', size=(100, 100)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('пикселей', form.errors['image'][0])
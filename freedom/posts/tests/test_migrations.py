@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Follow, Post, TimelineEntry, UserStats
+
+BASELINE = [('posts', '0001_initial')]
+
+
+class UpgradeTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        search.drop_triggers()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {search.TABLE}')
+            cursor.execute(f'DROP TABLE {search.COMMENTS_TABLE}')
+        executor = MigrationExecutor(connection)
+        executor.migrate(BASELINE)
+        # База из migrate --run-syncdb: таблицы есть, записей о миграциях нет
+        MigrationRecorder(connection).migration_qs.filter(app='posts').delete()
+        self.apps = executor.loader.project_state(BASELINE).apps
+
+    def tearDown(self):
+        call_command('migrate', 'posts', fake_initial=True, verbosity=0)
+
+    def create_baseline_data(self):
+        User = self.apps.get_model('auth', 'User')
+        Post = self.apps.get_model('posts', 'Post')
+        Comment = self.apps.get_model('posts', 'Comment')
+        Follow = self.apps.get_model('posts', 'Follow')
+        author = User.objects.create(username='Test_author')
+        reader = User.objects.create(username='Reader')
+        post = Post.objects.create(text='Тестовый пост', author=author)
+        Comment.objects.create(post=post, author=reader, text='Первый')
+        Comment.objects.create(post=post, author=author, text='Второй')
+        # Старая схема не мешала повторным подпискам и подпискам на себя
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=author, author=author)
+        return author.pk, reader.pk, post.pk
+
+    def test_upgrade_from_baseline_schema(self):
+        """База старой схемы обновляется migrate --fake-initial и сразу работает."""
+        author_id, reader_id, post_id = self.create_baseline_data()
+        call_command('migrate', 'posts', fake_initial=True, verbosity=0)
+        post = Post.objects.get(pk=post_id)
+        self.assertEqual(post.updated, post.pub_date)
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(
+            list(Follow.objects.values_list('user_id', 'author_id')), [(reader_id, author_id)]
+        )
+        stats = UserStats.objects.get(user_id=author_id)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        self.assertEqual(UserStats.objects.get(user_id=reader_id).following_count, 1)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user_id', 'post_id')), [(reader_id, post_id)]
+        )
+        self.assertContains(self.client.get(reverse('posts:index')), 'Тестовый пост')
+        response = self.client.get(reverse('posts:search'), {'q': 'второй'})
+        self.assertEqual(list(response.context['page_obj']), [post])
@@ -11,6 +11,7 @@ class PostModelTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.test_user = User.objects.create_user(username='Test_user')
+        cls.test_author = User.objects.create_user(username='Test_author')
         cls.test_group = Group.objects.create(
             title='Название группы',
             slug='test_slug',
@@ -26,9 +27,10 @@ class PostModelTest(TestCase):
             post=cls.test_post,
             text='Тестовый комментарий'
         )
+        # Подписка на себя запрещена ограничением follow_not_self
         cls.test_follow = Follow.objects.create(
             user=cls.test_user,
-            author=cls.test_user
+            author=cls.test_author
         )
 
     def test_verbose_name_group(self):
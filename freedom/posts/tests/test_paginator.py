@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.paginator import InvalidPage
+from django.test import TestCase
+
+from ..models import Post
+from ..paginator import NEXT, KeysetPaginator
+
+User = get_user_model()
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {num}', author=cls.test_author) for num in range(25)
+        )
+        # Половина постов с одинаковой датой: порядок среди них задаёт id
+        date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        for num, post in enumerate(Post.objects.order_by('id')):
+            pub_date = date if num % 2 else date + timedelta(days=num)
+            Post.objects.filter(id=post.id).update(pub_date=pub_date)
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def paginator(self, **kwargs):
+        return KeysetPaginator(Post.objects.all(), 10, **kwargs)
+
+    def test_next_cursor_walks_whole_feed(self):
+        """Курсор вперёд обходит ленту без пропусков и повторов."""
+        paginator = self.paginator()
+        page = paginator.get_page(None)
+        seen = list(page)
+        self.assertFalse(page.has_previous())
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(page), 5)
+
+    def test_previous_cursor_returns_same_page(self):
+        """Курсор назад возвращает предыдущую страницу целиком."""
+        paginator = self.paginator()
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), self.expected[:10])
+        self.assertTrue(back.has_next())
+        self.assertFalse(back.has_previous())
+
+    def test_last_cursor(self):
+        """Курсор последней страницы отдаёт хвост ленты."""
+        paginator = self.paginator()
+        last = paginator.get_page(paginator.last_cursor)
+        self.assertEqual(list(last), self.expected[-10:])
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+
+    def test_invalid_cursor(self):
+        """Битый курсор в get_page даёт первую страницу, в page - ошибку."""
+        paginator = self.paginator()
+        self.assertEqual(list(paginator.get_page('не курсор')), self.expected[:10])
+        with self.assertRaises(InvalidPage):
+            paginator.page('не курсор')
+
+    def test_cursor_values_must_fit_ordering(self):
+        """Курсор со значениями не того типа или вне INTEGER - первая страница."""
+        paginator = self.paginator()
+        cursors = (
+            [NEXT, ['s', 'abc'], ['i', 1]],
+            [NEXT, ['i', 5], ['i', 1]],
+            [NEXT, ['d', '2022-01-01T00:00:00+00:00'], ['i', 10 ** 30]],
+        )
+        for payload in cursors:
+            with self.subTest(payload=payload):
+                cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+                with self.assertRaises(InvalidPage):
+                    paginator.page(cursor)
+                self.assertEqual(list(paginator.get_page(cursor)), self.expected[:10])
+
+    def test_total_is_capped(self):
+        """Итог ленты считается только до заданного предела."""
+        self.assertIsNone(self.paginator().count)
+        capped = self.paginator(total_limit=20)
+        self.assertEqual(capped.count, 21)
+        self.assertFalse(capped.count_is_exact)
+        exact = self.paginator(total_limit=100)
+        self.assertEqual(exact.count, 25)
+        self.assertTrue(exact.count_is_exact)
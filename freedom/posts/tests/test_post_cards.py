@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+CARDS_TEMPLATE = Template('{% load post_cards %}{% post_cards posts %}')
+
+
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        for num in range(3):
+            Post.objects.create(text=f'Тестовый пост {num}', author=cls.test_author, group=cls.test_group)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        posts = list(Post.objects.select_related('author', 'group'))
+        return CARDS_TEMPLATE.render(Context({'posts': posts}))
+
+    def test_cards_are_rendered_once(self):
+        """Карточки берутся из кэша: шаблон карточки не рендерится повторно."""
+        with self.assertTemplateUsed('posts/includes/post_card.html'):
+            first = self.render()
+        with self.assertTemplateNotUsed('posts/includes/post_card.html'):
+            second = self.render()
+        self.assertEqual(first, second)
+        self.assertEqual(first.count('<hr>'), 2)
+        self.assertIn('test_slug', first)
+
+    def test_edited_post_card_is_rerendered(self):
+        """Изменённый пост получает новую карточку, остальные берутся из кэша."""
+        self.render()
+        post = Post.objects.first()
+        post.text = 'Изменённый текст'
+        post.save()
+        html = self.render()
+        self.assertIn('Изменённый текст', html)
+        self.assertEqual(html.count('Тестовый пост'), 2)
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ViewQueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author', first_name='Имя')
+        cls.test_user = User.objects.create_user(username='Test_user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(user=cls.test_user, author=cls.test_author)
+        cls.test_post = Post.objects.create(
+            text='Тестовый пост', author=cls.test_author, group=cls.test_group
+        )
+        Comment.objects.create(post=cls.test_post, author=cls.test_user, text='Комментарий')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.test_user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов страниц не растёт вместе с числом постов и комментариев."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.test_group.slug,)),
+            reverse('posts:profile', args=(self.test_author.username,)),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', args=(self.test_post.id,)),
+        )
+        before = {url: self.count_queries(url) for url in urls}
+        for num in range(9):
+            author = User.objects.create_user(username=f'author_{num}')
+            Follow.objects.create(user=self.test_user, author=author)
+            Post.objects.create(text=f'Пост {num}', author=author, group=self.test_group)
+            Comment.objects.create(post=self.test_post, author=author, text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
@@ -0,0 +1,118 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Таблицы, запросы к которым делает не код лент, а сессии и авторизация
+IGNORED_TABLES = ('django_session',)
+
+
+# SQLite до 3.36 пишет «SCAN TABLE posts_post», новые - «SCAN posts_post»
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def is_problem(detail, tables):
+    """Полный обход таблицы или сортировка во временном B-дереве."""
+    if 'TEMP B-TREE' in detail:
+        return True
+    # «SCAN subquery» - обход уже ограниченного подзапроса, а не таблицы
+    scan = SCAN.match(detail)
+    return scan is not None and scan.group(1) in tables and 'USING' not in detail.split()
+
+
+def plan_problems(sql):
+    """Строки EXPLAIN QUERY PLAN с полным обходом таблицы или сортировкой во временном B-дереве."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        details = [row[-1] for row in cursor.fetchall()]
+    tables = set(connection.introspection.table_names())
+    return [detail for detail in details if is_problem(detail, tables)]
+
+
+class PlanParsingTests(SimpleTestCase):
+
+    def test_scan_formats_of_sqlite_versions(self):
+        """Полный обход находится в выводе и старых, и новых версий SQLite."""
+        tables = {'posts_post'}
+        for detail in ('SCAN posts_post', 'SCAN TABLE posts_post', 'SCAN TABLE posts_post AS T'):
+            with self.subTest(detail=detail):
+                self.assertTrue(is_problem(detail, tables))
+        for detail in (
+            'SCAN posts_post USING INDEX post_date_idx',
+            'SCAN TABLE posts_post USING COVERING INDEX post_date_idx',
+            'SCAN SUBQUERY 1',
+            'SEARCH TABLE posts_post USING INTEGER PRIMARY KEY (rowid=?)',
+        ):
+            with self.subTest(detail=detail):
+                self.assertFalse(is_problem(detail, tables))
+        self.assertTrue(is_problem('USE TEMP B-TREE FOR ORDER BY', tables))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Планы запросов проверяются для SQLite')
+class FeedQueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_user = User.objects.create_user(username='Test_user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(user=cls.test_user, author=cls.test_author)
+        for num in range(15):
+            post = Post.objects.create(
+                text=f'Тестовый пост {num}',
+                author=cls.test_author,
+                group=cls.test_group
+            )
+            Comment.objects.create(post=post, author=cls.test_user, text='Комментарий')
+        cls.test_post = post
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.test_user)
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_plans_use_indexes(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and not any(table in query['sql'] for table in IGNORED_TABLES)
+        ]
+        self.assertTrue(queries)
+        for sql in queries:
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(plan_problems(sql), [])
+        return response
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент и их вторых страниц читают данные по индексам без сортировки."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.test_group.slug,)),
+            reverse('posts:profile', args=(self.test_author.username,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            response = self.assert_plans_use_indexes(url)
+            next_cursor = response.context['page_obj'].next_cursor
+            self.assertIsNotNone(next_cursor)
+            self.assert_plans_use_indexes(f'{url}?cursor={next_cursor}')
+
+    def test_post_detail_queries_use_indexes(self):
+        """Запросы страницы поста читают данные по индексам без сортировки."""
+        self.assert_plans_use_indexes(reverse('posts:post_detail', args=(self.test_post.id,)))
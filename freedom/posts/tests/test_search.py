@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Group, Post
+from ..paginator import NEXT, encode_cursor
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.other_author = User.objects.create_user(username='Other_author')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        cls.text_post = Post.objects.create(
+            text='Пост про ёжиков и кактусы', author=cls.test_author, group=cls.test_group
+        )
+        cls.comment_post = Post.objects.create(text='Пост без ключевых слов', author=cls.other_author)
+        cls.comment = Comment.objects.create(
+            post=cls.comment_post, author=cls.test_author, text='Сколько у вас ЁЖИКОВ?'
+        )
+        cls.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.superuser)
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        page_obj = response.context['page_obj']
+        return list(page_obj) if page_obj is not None else []
+
+    def test_posts_and_comments_are_found_by_rank(self):
+        """Находятся посты по тексту и комментариям; совпадение в тексте выше."""
+        self.assertEqual(self.search(q='ёжиков'), [self.text_post, self.comment_post])
+        self.assertEqual(self.search(q='кактусы ежиков'), [self.text_post])
+        self.assertEqual(self.search(q='!!!'), [])
+
+    def test_index_follows_changes(self):
+        """Изменения постов и комментариев сразу видны в поиске."""
+        text_post = Post.objects.get(pk=self.text_post.pk)
+        comment_post = Post.objects.get(pk=self.comment_post.pk)
+        Comment.objects.filter(pk=self.comment.pk).delete()
+        self.assertEqual(self.search(q='ёжиков'), [text_post])
+        Comment.objects.create(post=comment_post, author=self.test_author, text='Кактусы цветут')
+        self.assertEqual(self.search(q='цветут'), [comment_post])
+        text_post.text = 'Пост про хомяков'
+        text_post.save()
+        self.assertEqual(self.search(q='хомяков'), [text_post])
+        self.assertEqual(self.search(q='кактусы'), [comment_post])
+        comment_post.delete()
+        self.assertEqual(self.search(q='цветут'), [])
+
+    def test_author_and_group_filters(self):
+        """Фильтры по автору и группе сужают результаты поиска."""
+        self.assertEqual(self.search(q='ёжиков', author='Other_author'), [self.comment_post])
+        self.assertEqual(self.search(q='ёжиков', group='test_slug'), [self.text_post])
+        self.assertEqual(self.search(q='ёжиков', author='nobody'), [])
+
+    def test_comment_filters_follow_post(self):
+        """Комментарии ищутся с фильтром по новой группе поста."""
+        self.assertEqual(self.search(q='ёжиков', group='test_slug'), [self.text_post])
+        Post.objects.filter(pk=self.comment_post.pk).update(group=self.test_group)
+        self.assertEqual(
+            self.search(q='ёжиков', group='test_slug'), [self.text_post, self.comment_post]
+        )
+
+    def test_install_waits_for_post_tables(self):
+        """До создания таблиц постов индекс не создаётся и migrate не падает."""
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]), \
+                CaptureQueriesContext(connection) as queries:
+            search.install()
+        self.assertEqual(len(queries), 0)
+
+    def test_pagination_keeps_query(self):
+        """Страницы результатов идут по курсору и сохраняют запрос в ссылках."""
+        for num in range(12):
+            Post.objects.create(text=f'Лимонад номер {num}', author=self.test_author)
+        response = self.client.get(reverse('posts:search'), {'q': 'лимонад'})
+        first = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?q=%D0%BB%D0%B8%D0%BC%D0%BE%D0%BD%D0%B0%D0%B4&amp;cursor={next_cursor}')
+        second = self.search(q='лимонад', cursor=next_cursor)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+
+    def test_tampered_cursor_gives_first_page(self):
+        """Курсор с ключом не того типа даёт первую страницу результатов."""
+        cursor = encode_cursor(NEXT, ['abc', 1])
+        self.assertEqual(self.search(q='ёжиков', cursor=cursor), [self.text_post, self.comment_post])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты и комментарии через индекс."""
+        response = self.admin_client.get(reverse('admin:posts_post_changelist'), {'q': 'кактусы'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.text_post])
+        response = self.admin_client.get(reverse('admin:posts_comment_changelist'), {'q': 'ЁЖИКОВ'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.comment])
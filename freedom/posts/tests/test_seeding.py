@@ -0,0 +1,59 @@
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+
+from .. import counters, search, timeline
+from ..models import Comment, Follow, Post, TimelineEntry, User
+from ..seeding import LOAD_TABLES, Seeder
+
+
+class SeederTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.seeder = Seeder(seed=1, batch_size=50)
+        cls.seeder.create_people(users=40, groups=3)
+        cls.seeder.add_posts(150)
+        cls.seeder.add_posts(50)
+        cls.seeder.finish()
+
+    def test_rows_are_created(self):
+        """Создаются пользователи, подписки, посты и комментарии без дублей id."""
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(Comment.objects.exists())
+        self.assertFalse(Follow.objects.filter(user_id=F('author_id')).exists())
+
+    def test_dates_are_spread(self):
+        """Даты публикации разные и не позже момента генерации."""
+        dates = set(Post.objects.values_list('pub_date', flat=True))
+        self.assertGreater(len(dates), 190)
+        self.assertLessEqual(max(dates), self.seeder.now)
+
+    def test_derived_data_matches(self):
+        """Ленты подписок и счётчики совпадают с пересчитанными заново."""
+        entries = set(TimelineEntry.objects.values_list('user_id', 'post_id'))
+        self.assertTrue(entries)
+        timeline.rebuild()
+        self.assertEqual(set(TimelineEntry.objects.values_list('user_id', 'post_id')), entries)
+        self.assertFalse(any(counters.reconcile().values()))
+
+    def test_indexes_are_restored(self):
+        """Индексы и триггеры поиска, снятые на время загрузки, создаются заново."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                "AND tbl_name IN (%s, %s, %s)",
+                [model._meta.db_table for model in LOAD_TABLES],
+            )
+            names = {name for name, in cursor.fetchall()}
+        self.assertLessEqual(
+            {'post_date_idx', 'comment_post_created_idx', 'timeline_user_date_idx',
+             'posts_search_post_insert', 'posts_search_comment_insert'},
+            names,
+        )
+        post = Post.objects.first()
+        word = post.text.split()[0].strip('.,')
+        found = search.search_paginator(Post.objects.all(), word, 1000).get_page(None)
+        self.assertIn(post, list(found))
@@ -0,0 +1,122 @@
+import re
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware import QueryBudgetMiddleware
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+CSRF_TOKEN = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+
+
+class StreamingRenderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        for num in range(12):
+            Post.objects.create(
+                text=f'Тестовый пост {num}', author=cls.test_author, group=cls.test_group
+            )
+        Follow.objects.create(user=cls.reader, author=cls.test_author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get(self, client, url, streaming):
+        cache.clear()
+        with override_settings(STREAMING_RENDER=streaming):
+            response = client.get(url)
+            self.assertEqual(response.streaming, streaming)
+            if streaming:
+                chunks = list(response.streaming_content)
+                return response, chunks
+            return response, [response.content]
+
+    def test_streamed_pages_match_regular_render(self):
+        """Потоковая страница совпадает с обычной, шаблоны не меняются."""
+        urls = (
+            (self.client, reverse('posts:index')),
+            (self.client, reverse('posts:group_list', kwargs={'slug': 'test_slug'})),
+            (self.client, reverse('posts:profile', kwargs={'username': 'Test_author'})),
+            (self.reader_client, reverse('posts:follow_index')),
+            (self.client, reverse('posts:search') + '?q=пост'),
+        )
+        for client, url in urls:
+            with self.subTest(url=url):
+                _, regular = self.get(client, url, streaming=False)
+                _, streamed = self.get(client, url, streaming=True)
+                self.assertEqual(
+                    CSRF_TOKEN.sub(b'', b''.join(streamed)),
+                    CSRF_TOKEN.sub(b'', b''.join(regular)),
+                )
+
+    def test_shell_is_sent_before_cards(self):
+        """Первая часть ответа - шапка страницы, карточки идут следом по одной."""
+        _, chunks = self.get(self.client, reverse('posts:index'), streaming=True)
+        self.assertIn(b'<head>', chunks[0])
+        self.assertNotIn('Тестовый пост'.encode(), chunks[0])
+        cards = [chunk for chunk in chunks if 'Тестовый пост'.encode() in chunk]
+        self.assertEqual(len(cards), 10)
+
+    def test_cards_inside_if_are_streamed(self):
+        """Карточки внутри {% if %} (страница поиска) тоже идут по одной."""
+        _, chunks = self.get(self.client, reverse('posts:search') + '?q=пост', streaming=True)
+        self.assertNotIn('Тестовый пост'.encode(), chunks[0])
+        cards = [chunk for chunk in chunks if 'Тестовый пост'.encode() in chunk]
+        self.assertEqual(len(cards), 10)
+
+    def test_if_branches_match_regular_render(self):
+        """Ветки {% elif %} и пустой поиск выводятся как при обычном рендере."""
+        for query in ('?q=нет-такого', '', '?q=пост&page=2'):
+            with self.subTest(query=query):
+                url = reverse('posts:search') + query
+                _, regular = self.get(self.client, url, streaming=False)
+                _, streamed = self.get(self.client, url, streaming=True)
+                self.assertEqual(b''.join(streamed), b''.join(regular))
+
+    def test_session_and_csrf_cookie(self):
+        """Сессия и CSRF-cookie выставляются до начала потока."""
+        response, chunks = self.get(self.reader_client, reverse('posts:follow_index'), streaming=True)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn(b'Reader', b''.join(chunks))
+
+    def test_errors_before_stream_keep_error_pages(self):
+        """Ошибка до начала потока даёт обычную страницу ошибки."""
+        with override_settings(STREAMING_RENDER=True):
+            response = self.client.get(reverse('posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.streaming)
+
+    def test_error_in_stream_is_logged(self):
+        """Ошибка посреди потока пишется в лог и закрывает страницу сообщением."""
+        with mock.patch(
+            'posts.templatetags.post_cards.render_to_string', side_effect=RuntimeError
+        ), self.assertLogs('django.request', 'ERROR'):
+            _, chunks = self.get(self.client, reverse('posts:index'), streaming=True)
+        self.assertIn(b'<head>', chunks[0])
+        self.assertIn(b'alert-danger', chunks[-1])
+
+    def test_stream_queries_count_against_budget(self):
+        """Запросы во время потока входят в бюджет view."""
+        self.get(self.client, reverse('posts:index'), streaming=False)
+        regular, _ = QueryBudgetMiddleware.stats['posts:index']
+        self.get(self.client, reverse('posts:index'), streaming=True)
+        streamed, _ = QueryBudgetMiddleware.stats['posts:index']
+        self.assertEqual(streamed, regular)
+        self.assertGreater(streamed, 0)
@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import background, images, thumbnails
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.test_author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name):
+        image = SimpleUploadedFile(name=name, content=SMALL_GIF, content_type='image/gif')
+        return Post.objects.create(text='Пост с картинкой', author=self.test_author, image=image)
+
+    def test_thumbnail_is_created_after_post_create(self):
+        """После создания поста миниатюра и варианты картинки готовы и показываются на странице."""
+        image = SimpleUploadedFile(name='created.gif', content=SMALL_GIF, content_type='image/gif')
+        self.author_client.post(reverse('posts:post_create'), data={'text': 'Пост', 'image': image})
+        post = Post.objects.get(text='Пост')
+        thumbnail = thumbnails.backend.get_ready_thumbnail(
+            post.image, settings.POST_CARD_THUMBNAIL_GEOMETRY, **thumbnails.THUMBNAIL_OPTIONS
+        )
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(post.image_variants, '480')
+        response = self.author_client.get(reverse('posts:post_detail', args=(post.id,)))
+        self.assertContains(response, images.variant_url(post.image.name, 480, images.JPEG))
+        self.assertNotContains(response, 'data-thumbnail-pending')
+
+    @override_settings(POST_THUMBNAIL_WORKERS=2)
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюра создаётся, страницы показывают заглушку, задача ставится один раз."""
+        post = self.create_post('pending.gif')
+        with mock.patch.object(background, '_get_executor') as get_executor:
+            first = self.client.get(reverse('posts:index'))
+            thumbnails.schedule(post)
+        self.assertContains(first, 'data-thumbnail-pending')
+        get_executor.return_value.submit.assert_called_once_with(
+            thumbnails.generate, post.image.name, post.pk, post.author_id, post.group_id
+        )
+        # Пул закончил работу: ленты обновляются, блокировка снимается
+        thumbnails.generate(post.image.name, post.pk, post.author_id, post.group_id)
+        self.assertFalse(cache.get(thumbnails.LOCK_KEY.format(post.image.name)))
+        second = self.client.get(reverse('posts:index'))
+        self.assertNotContains(second, 'data-thumbnail-pending')
+        self.assertContains(second, '<img class="card-img my-2"')
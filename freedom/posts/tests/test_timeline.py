@@ -0,0 +1,97 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import background, timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_user = User.objects.create_user(username='Test_user')
+        cls.old_post = Post.objects.create(text='Старый пост', author=cls.test_author)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, user):
+        return list(timeline.follow_paginator(user, 10).get_page(None))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет в ленту посты автора, отписка убирает их."""
+        Follow.objects.create(user=self.test_user, author=self.test_author)
+        self.assertEqual(self.feed(self.test_user), [self.old_post])
+        Follow.objects.filter(user=self.test_user, author=self.test_author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.test_user).exists())
+        self.assertEqual(self.feed(self.test_user), [])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.test_user, author=self.test_author)
+        new_post = Post.objects.create(text='Новый пост', author=self.test_author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.test_user, post=new_post).exists()
+        )
+        self.assertEqual(self.feed(self.test_user), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=0)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты знаменитостей не копируются, но видны в ленте без повторов."""
+        Follow.objects.create(user=self.test_user, author=self.test_author)
+        cache.clear()
+        new_post = Post.objects.create(text='Новый пост', author=self.test_author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.test_user, post=new_post).exists()
+        )
+        # Запись, оставшаяся с тех пор, когда автор не был знаменитостью,
+        # не должна дублировать пост, прочитанный напрямую
+        TimelineEntry.objects.get_or_create(
+            user=self.test_user, post=self.old_post,
+            author=self.test_author, pub_date=self.old_post.pub_date
+        )
+        self.assertEqual(self.feed(self.test_user), [new_post, self.old_post])
+
+    def test_rebuild(self):
+        """Пересборка восстанавливает ленту по подпискам."""
+        Follow.objects.create(user=self.test_user, author=self.test_author)
+        TimelineEntry.objects.all().delete()
+        timeline.rebuild()
+        self.assertEqual(self.feed(self.test_user), [self.old_post])
+
+
+class FormerCelebrityTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=1)
+    def test_posts_of_former_celebrity_stay_in_feed(self):
+        """Когда знаменитость опускается до порога, её посты, не попавшие
+        в ленты, добавляются подписчикам в фоне: отписка этого не ждёт."""
+        cache.clear()
+        author = User.objects.create_user(username='Test_author')
+        reader = User.objects.create_user(username='Test_user')
+        other = User.objects.create_user(username='Other_user')
+        old_post = Post.objects.create(text='Старый пост', author=author)
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=other, author=author)
+        celebrity_post = Post.objects.create(text='Пост знаменитости', author=author)
+        self.assertFalse(TimelineEntry.objects.filter(post=celebrity_post).exists())
+        client = Client()
+        client.force_login(other)
+        with mock.patch.object(background, 'submit') as submit:
+            response = client.get(reverse('posts:profile_unfollow', args=(author.username,)))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        submit.assert_called_once_with(timeline.backfill_followers, author.pk)
+        self.assertFalse(TimelineEntry.objects.filter(post=celebrity_post).exists())
+        timeline.backfill_followers(author.pk)
+        self.assertTrue(TimelineEntry.objects.filter(user=reader, post=celebrity_post).exists())
+        feed = list(timeline.follow_paginator(reader, 10).get_page(None))
+        self.assertEqual(feed, [celebrity_post, old_post])
@@ -0,0 +1,149 @@
+import gzip
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentTransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_author = User.objects.create_user(username='Test_author')
+        cls.test_user = User.objects.create_user(username='Test_user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(user=cls.test_user, author=cls.test_author)
+        cls.pub_date = datetime(2020, 5, 1, 12, 0, tzinfo=timezone.utc)
+        for num in range(5):
+            post = Post.objects.create(
+                text=f'Пост {num}', author=cls.test_author, group=cls.test_group
+            )
+            Comment.objects.create(post=post, author=cls.test_user, text=f'Комментарий {num}')
+        Post.objects.update(pub_date=cls.pub_date)
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.temp_dir, 'content.ndjson.gz')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def export_and_clear(self, **options):
+        call_command('export_content', self.path, stdout=StringIO(), **options)
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_round_trip_restores_content(self):
+        """Выгрузка и загрузка в пустую базу восстанавливают контент, счётчики и ленты."""
+        self.export_and_clear()
+        call_command('import_content', self.path, batch_size=2, stdout=StringIO())
+        author = User.objects.get(username='Test_author')
+        user = User.objects.get(username='Test_user')
+        posts = Post.objects.filter(author=author, group__slug='test_slug')
+        self.assertEqual(posts.count(), 5)
+        self.assertEqual(set(posts.values_list('pub_date', flat=True)), {self.pub_date})
+        self.assertEqual(
+            set(Comment.objects.values_list('post__text', 'text', 'author')),
+            {(f'Пост {num}', f'Комментарий {num}', user.pk) for num in range(5)}
+        )
+        self.assertEqual(set(posts.values_list('comments_count', flat=True)), {1})
+        self.assertTrue(Follow.objects.filter(user=user, author=author).exists())
+        self.assertEqual(UserStats.objects.get(user=author).posts_count, 5)
+        self.assertEqual(TimelineEntry.objects.filter(user=user).count(), 5)
+
+    def test_import_remaps_ids_and_reuses_users(self):
+        """Повторная загрузка не затирает посты, а пользователи и группы переиспользуются."""
+        call_command('export_content', self.path, stdout=StringIO())
+        ids = set(Post.objects.values_list('pk', flat=True))
+        call_command('import_content', self.path, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Post.objects.count(), 10)
+        new_posts = Post.objects.exclude(pk__in=ids)
+        self.assertEqual(
+            set(new_posts.values_list('comments__text', flat=True)),
+            {f'Комментарий {num}' for num in range(5)}
+        )
+        # Подписчик автора получает в ленту и загруженные посты
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.test_user).count(), 10
+        )
+
+    def test_media_files_are_copied(self):
+        """Картинки постов копируются через каталог выгрузки."""
+        post = Post.objects.first()
+        post.image = default_storage.save('posts/small.gif', ContentFile(b'GIF89a'))
+        post.save()
+        media_dir = os.path.join(self.temp_dir, 'media')
+        self.export_and_clear(media_dir=media_dir)
+        default_storage.delete('posts/small.gif')
+        call_command(
+            'import_content', self.path, media_dir=media_dir, stdout=StringIO()
+        )
+        post = Post.objects.exclude(image='').get()
+        with default_storage.open(post.image.name) as image:
+            self.assertEqual(image.read(), b'GIF89a')
+
+    def test_passwords_are_exported_only_on_request(self):
+        """Хэши паролей попадают в выгрузку только с --include-passwords."""
+        author = User.objects.get(username='Test_author')
+        author.set_password('Пароль-123')
+        author.save()
+        password = author.password
+        self.export_and_clear()
+        with gzip.open(self.path, 'rt', encoding='utf-8') as stream:
+            self.assertNotIn('"password"', stream.read())
+        call_command('import_content', self.path, stdout=StringIO())
+        author = User.objects.get(username='Test_author')
+        self.assertFalse(author.has_usable_password())
+
+        User.objects.filter(pk=author.pk).update(password=password)
+        self.export_and_clear(include_passwords=True)
+        call_command('import_content', self.path, stdout=StringIO())
+        author = User.objects.get(username='Test_author')
+        self.assertTrue(author.check_password('Пароль-123'))
+
+    def test_comment_without_post_is_rejected(self):
+        """Комментарий к посту, которого нет в выгрузке, - ошибка загрузки."""
+        path = self.path.replace('.gz', '')
+        with open(path, 'w') as stream:
+            stream.write(
+                '{"model": "meta", "version": 1}\n'
+                '{"model": "comment", "fields": {"post_id": 100000, '
+                '"author__username": "Test_user", "text": "Текст", '
+                '"created": "2020-05-01T12:00:00+00:00"}}\n'
+            )
+        with self.assertRaisesMessage(CommandError, 'Нет поста комментария'):
+            call_command('import_content', path, stdout=StringIO())
+        self.assertEqual(Comment.objects.count(), 5)
+
+    def test_broken_file_is_rejected(self):
+        """Битая строка останавливает загрузку с номером строки."""
+        with open(self.path.replace('.gz', ''), 'w') as stream:
+            stream.write('{"model": "meta", "version": 1}\nnot json\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            call_command(
+                'import_content', self.path.replace('.gz', ''), stdout=StringIO()
+            )
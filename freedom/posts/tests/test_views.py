@@ -71,6 +71,10 @@ class PostViewTests(TestCase):
         cache.clear()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        # Ответ из кэша страниц не содержит контекста шаблона
+        cache.clear()
+
     def test_post_views_urls_uses_correct_template(self):
         """Views функции приложения posts используют соответствующий шаблон."""
         cache.clear()
@@ -157,13 +161,12 @@ class PostViewTests(TestCase):
         cache.clear()
         paginator_amount = 10
         second_page_amount = 3
-        posts = [
-            Post(
+        # Посты создаются по одному: лента подписок заполняется при сохранении
+        for num in range(1, paginator_amount + second_page_amount):
+            Post.objects.create(
                 text=f'text {num}', author=PostViewTests.test_author,
                 group=PostViewTests.test_group
-            ) for num in range(1, paginator_amount + second_page_amount)
-        ]
-        Post.objects.bulk_create(posts)
+            )
         paginator_page = {
             'posts:index': None,
             'posts:group_list': (PostViewTests.test_group.slug,),
@@ -171,15 +174,16 @@ class PostViewTests(TestCase):
             'posts:follow_index': None,
         }
         for reverse_name, args in paginator_page.items():
-            post_page = {
-                paginator_amount: '',
-                second_page_amount: '?page=2'
-            }
-            for amount, page in post_page.items():
-                with self.subTest(reverse=reverse(reverse_name, args=args), amount=amount, page=page):
-                    response = PostViewTests.authorized_client.get(reverse(reverse_name, args=args) + page)
-                    self.assertEqual(response.status_code, HTTPStatus.OK)
-                    self.assertEqual(len(response.context['page_obj']), amount)
+            with self.subTest(reverse=reverse(reverse_name, args=args)):
+                url = reverse(reverse_name, args=args)
+                response = PostViewTests.authorized_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(len(response.context['page_obj']), paginator_amount)
+                next_cursor = response.context['page_obj'].next_cursor
+                response = PostViewTests.authorized_client.get(url, {'cursor': next_cursor})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(len(response.context['page_obj']), second_page_amount)
+                self.assertFalse(response.context['page_obj'].has_next())
 
     def test_caches_index_page(self):
         """Тестирование кэша страницы index"""
@@ -217,4 +221,14 @@ class PostViewTests(TestCase):
         )
         response = PostViewTests.author_client.get(reverse('posts:follow_index'))
         context_post = response.context['page_obj']
-        self.assertEqual(context_post.object_list.count(), 0)
+        self.assertEqual(len(context_post), 0)
+
+    def test_repeated_follow_is_idempotent(self):
+        """Повторная подписка не создаёт второй записи и не падает."""
+        url = reverse('posts:profile_follow', args=(PostViewTests.test_author.username,))
+        for _ in range(2):
+            response = PostViewTests.authorized_client.get(url)
+            self.assertRedirects(response, reverse('posts:profile', args=(PostViewTests.test_author.username,)))
+        self.assertEqual(
+            Follow.objects.filter(user=PostViewTests.test_user, author=PostViewTests.test_author).count(), 1
+        )
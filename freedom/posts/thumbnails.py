@@ -0,0 +1,134 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Тег {% thumbnail %} создаёт миниатюру прямо во время запроса, когда её
+впервые запросили, и несколько воркеров могут одновременно кодировать
+одну и ту же картинку. Здесь миниатюры известных размеров создаются
+в пуле процессов сразу после сохранения поста, одна задача на картинку
+(блокировка через cache.add). Шаблоны только ищут готовую миниатюру
+в хранилище ключей sorl и, пока её нет, показывают заглушку. Там же
+создаются варианты картинки разной ширины для srcset (posts.images).
+"""
+import logging
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from core import metrics
+
+from . import background, images
+from .models import Post
+from .signals import bump_post_feeds
+
+logger = logging.getLogger(__name__)
+
+# Параметры, с которыми миниатюры показываются во всех шаблонах
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+LOCK_KEY = 'thumbnail:lock:{}'
+
+Placeholder = namedtuple('Placeholder', 'url width height')
+Responsive = namedtuple(
+    'Responsive', 'url width height srcset webp_srcset sizes'
+)
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Ищет готовую миниатюру, никогда не создавая её."""
+
+    @metrics.timed('thumbnail')
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        # Имя файла миниатюры считается так же, как в get_thumbnail
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ReadyThumbnailBackend()
+
+
+@metrics.timed('thumbnail')
+def generate(name, post_id, author_id, group_id):
+    """Создаёт миниатюры всех известных размеров и обновляет ленты с постом."""
+    started = time.perf_counter()
+    try:
+        for geometry in settings.POST_THUMBNAIL_GEOMETRIES:
+            get_thumbnail(name, geometry, **THUMBNAIL_OPTIONS)
+        images.build_variants(post_id, name)
+        # В закэшированных страницах вместо картинки стоит заглушка
+        bump_post_feeds(
+            Post(pk=post_id, author_id=author_id, group_id=group_id)
+        )
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        cache.delete(LOCK_KEY.format(name))
+        metrics.observe(
+            'yatube_thumbnail_seconds', '', time.perf_counter() - started
+        )
+        if settings.POST_THUMBNAIL_WORKERS:
+            # Процесс пула завершается без atexit: сбрасываем сразу,
+            # запись редкая по сравнению с самой генерацией
+            metrics.flush()
+
+
+def schedule(post):
+    """Ставит создание миниатюр картинки поста в очередь, если его не ждут."""
+    if not post.image:
+        return
+    name = post.image.name
+    locked = cache.add(
+        LOCK_KEY.format(name), True, settings.POST_THUMBNAIL_LOCK_TIMEOUT
+    )
+    if not locked:
+        return
+    background.submit(generate, name, post.pk, post.author_id, post.group_id)
+
+
+def ready_thumbnail(post, geometry):
+    """Варианты картинки, готовая миниатюра или заглушка того же размера."""
+    if post.image_variants:
+        return responsive(post, geometry)
+    thumbnail = backend.get_ready_thumbnail(
+        post.image, geometry, **THUMBNAIL_OPTIONS
+    )
+    if thumbnail is not None:
+        return thumbnail
+    # Пост мог появиться не через сайт, и миниатюры для него не заказаны.
+    # Без пула их не создаём: страница не должна платить за кодирование
+    if settings.POST_THUMBNAIL_WORKERS:
+        schedule(post)
+    width, height = parse_geometry(geometry)
+    return Placeholder(None, width, height)
+
+
+def responsive(post, geometry):
+    name = post.image.name
+    widths = images.parse_widths(post.image_variants)
+    width, height = images.variant_size(parse_geometry(geometry)[0], geometry)
+    # Для src берём вариант не уже миниатюры, а если такого нет - самый широкий
+    src_width = min((w for w in widths if w >= width), default=widths[-1])
+    formats = images.variant_formats()
+    return Responsive(
+        images.variant_url(name, src_width, images.JPEG),
+        width,
+        height,
+        images.srcset(name, widths, images.JPEG),
+        images.srcset(name, widths, images.WEBP)
+        if images.WEBP in formats else '',
+        settings.POST_IMAGE_SIZES,
+    )
@@ -0,0 +1,174 @@
+"""Материализованная лента подписок.
+
+Обычные авторы раскладывают свои посты по лентам подписчиков при
+публикации (fan-out on write). Посты авторов с огромным числом подписчиков
+(«знаменитостей») в ленты не копируются и подмешиваются при чтении
+(fan-out on read), чтобы одна публикация не превращалась в миллион вставок.
+Автор, опустившийся до порога после отписок, докладывает в ленты
+подписчиков посты, которые в них не копировались: это делается в фоновом
+пуле (followers_changed).
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import background, feed_cache, follow_graph
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import KeysetSource, MergedKeysetPaginator
+
+logger = logging.getLogger(__name__)
+
+CELEBRITIES_CACHE_KEY = 'timeline:celebrities'
+
+
+def celebrity_ids():
+    """Id авторов, чьи посты читаются в ленту напрямую, а не копируются."""
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(
+            UserStats.objects.filter(
+                followers_count__gt=settings.TIMELINE_CELEBRITY_FOLLOWERS
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(
+            CELEBRITIES_CACHE_KEY, ids, settings.TIMELINE_CELEBRITIES_TIMEOUT
+        )
+    return ids
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = followers_to_notify(post.author_id)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id, post=post, author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя уже опубликованные посты автора."""
+    if author_id in celebrity_ids():
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list('id', 'pub_date')
+        .iterator(chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id, post_id=post_id, author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты заново, например после смены порога знаменитостей."""
+    follows = Follow.objects.all()
+    entries = TimelineEntry.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+    entries.delete()
+    pairs = follows.values_list('user_id', 'author_id').iterator()
+    for user_id, author_id in pairs:
+        backfill(user_id, author_id)
+
+
+def followers_changed(author_id, delta):
+    """Следит за переходом автора через порог знаменитостей.
+
+    Пока автор был знаменитостью, его посты в ленты не копировались: когда
+    он опускается до порога, они добавляются в ленты всех подписчиков.
+    Подписчиков может быть до порога, поэтому это делает фоновый пул после
+    фиксации отписки, а не запрос.
+    """
+    threshold = settings.TIMELINE_CELEBRITY_FOLLOWERS
+    crossing = threshold + 1 if delta > 0 else threshold
+    followers = (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list('followers_count', flat=True).first()
+    )
+    if followers != crossing:
+        return
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    if delta < 0:
+        transaction.on_commit(
+            lambda: background.submit(backfill_followers, author_id)
+        )
+
+
+def backfill_followers(author_id):
+    """Добавляет посты автора в ленты всех подписчиков и обновляет их."""
+    try:
+        readers = list(
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)
+        )
+        for user_id in readers:
+            backfill(user_id, author_id)
+        feed_cache.bump_many(
+            feed_cache.follow_scope(user_id) for user_id in readers
+        )
+    except Exception:
+        logger.exception(
+            'Не удалось дополнить ленты подписчиков автора %s', author_id
+        )
+
+
+def followed_celebrities(user_id):
+    """Id знаменитостей, на которых подписан пользователь."""
+    return sorted(follow_graph.followees(user_id) & celebrity_ids())
+
+
+def followers_to_notify(author_id):
+    """Id подписчиков, чьи материализованные ленты зависят от постов автора."""
+    if author_id is None or author_id in celebrity_ids():
+        return iter(())
+    return (
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+
+def follow_paginator(user, per_page):
+    """Пагинатор ленты подписок: материализованная лента плюс знаменитости."""
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+    sources = [
+        KeysetSource(
+            entries, ('-pub_date', '-post_id'),
+            transform=lambda entry: entry.post,
+        ),
+    ]
+    followed = followed_celebrities(user.id)
+    if followed:
+        posts = Post.objects.filter(author_id__in=followed).select_related(
+            'author', 'group'
+        )
+        sources.append(KeysetSource(posts))
+    return MergedKeysetPaginator(sources, per_page)
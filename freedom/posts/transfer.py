@@ -0,0 +1,344 @@
+"""Перенос контента между окружениями в формате NDJSON.
+
+Каждая строка файла - одна запись {"model": ..., "fields": {...}}.
+Пользователи и группы ссылаются друг на друга по username и slug, поэтому
+при загрузке совпадающие записи переиспользуются. Посты получают новые id
+сдвигом на постоянную величину: комментариям не нужна таблица
+соответствия id, и память не растёт с размером выгрузки.
+
+Хэши паролей выгружаются только по явной просьбе (include_passwords):
+без них пользователи загружаются с непригодным паролем и входят после
+его сброса.
+"""
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+from contextlib import contextmanager
+
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed_cache, timeline
+from .models import Comment, Follow, Group, Post, User
+
+FORMAT_VERSION = 1
+
+USER_FIELDS = (
+    'username', 'first_name', 'last_name', 'email', 'is_active',
+    'date_joined',
+)
+GROUP_FIELDS = ('slug', 'title', 'description')
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'updated', 'author__username', 'group__slug',
+    'image', 'image_width', 'image_height',
+)
+COMMENT_FIELDS = ('post_id', 'author__username', 'text', 'created')
+FOLLOW_FIELDS = ('user__username', 'author__username')
+
+# Порядок выгрузки: каждая модель ссылается только на предыдущие
+EXPORT_ORDER = (
+    ('user', User.objects.order_by('pk'), USER_FIELDS),
+    ('group', Group.objects.order_by('pk'), GROUP_FIELDS),
+    ('post', Post.objects.order_by('pk'), POST_FIELDS),
+    ('comment', Comment.objects.order_by('pk'), COMMENT_FIELDS),
+    ('follow', Follow.objects.order_by('pk'), FOLLOW_FIELDS),
+)
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Файл, сжатый gzip файл (*.gz) или stdin/stdout для «-»."""
+    if path == '-':
+        stream = sys.stdin if 'r' in mode else sys.stdout
+        yield stream
+    elif path.endswith('.gz'):
+        with gzip.open(path, mode + 't', encoding='utf-8') as stream:
+            yield stream
+    else:
+        with io.open(path, mode, encoding='utf-8') as stream:
+            yield stream
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def export_records(chunk_size=2000, include_passwords=False):
+    """Генератор (модель, поля, строка NDJSON) в порядке EXPORT_ORDER."""
+    meta = {'version': FORMAT_VERSION}
+    yield 'meta', meta, json.dumps({'model': 'meta', **meta})
+    for name, queryset, fields in EXPORT_ORDER:
+        if name == 'user' and include_passwords:
+            fields += ('password',)
+        rows = queryset.values(*fields).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = {'model': name, 'fields': row}
+            yield name, row, json.dumps(
+                record, ensure_ascii=False, default=_json_default
+            )
+
+
+def copy_media_out(name, media_dir):
+    """Копирует файл из хранилища в media_dir с тем же относительным именем."""
+    target = os.path.join(media_dir, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name, 'rb') as source:
+        with open(target, 'wb') as destination:
+            shutil.copyfileobj(source, destination)
+
+
+@contextmanager
+def keep_dates():
+    """Отключает auto_now: даты из выгрузки сохраняются как есть."""
+    fields = [
+        field
+        for model in (Post, Comment) for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class TransferError(Exception):
+    pass
+
+
+def distinct_batches(queryset, field, batch_size):
+    """Различные непустые значения field порциями по возрастанию.
+
+    Каждая порция - отдельный запрос с условием field > последнего
+    значения, поэтому в памяти не больше batch_size значений.
+    """
+    values = (
+        queryset.filter(**{f'{field}__isnull': False})
+        .order_by(field).values_list(field, flat=True).distinct()
+    )
+    batch = list(values[:batch_size])
+    while batch:
+        yield batch
+        batch = list(values.filter(**{f'{field}__gt': batch[-1]})[:batch_size])
+
+
+class Importer:
+    """Загружает записи порциями bulk_create, каждую в своей транзакции.
+
+    Память занимает только текущая порция. Затронутых авторов, группы
+    и подписчиков для пересчёта лент refresh_derived находит в базе:
+    загруженные посты и подписки - это строки с id больше, чем были
+    до загрузки.
+    """
+
+    def __init__(self, batch_size=1000, media_dir=None):
+        self.batch_size = batch_size
+        self.media_dir = media_dir
+        self.model = None
+        self.batch = []
+        self.counts = {}
+        # Новые id постов: старый id плюс сдвиг за пределы занятых
+        self.post_offset = Post.objects.aggregate(top=Max('pk'))['top'] or 0
+        self.follow_offset = (
+            Follow.objects.aggregate(top=Max('pk'))['top'] or 0
+        )
+
+    def feed(self, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+            model = record['model']
+        except (ValueError, KeyError, TypeError):
+            raise TransferError(f'Некорректная строка: {line[:100]}')
+        if model == 'meta':
+            if record.get('version') != FORMAT_VERSION:
+                raise TransferError(
+                    f'Неподдерживаемая версия формата: {record.get("version")}'
+                )
+            return
+        if model not in self.LOADERS:
+            raise TransferError(f'Неизвестная модель: {model}')
+        if model != self.model or len(self.batch) >= self.batch_size:
+            self.flush()
+            self.model = model
+        self.batch.append(record['fields'])
+
+    def flush(self):
+        if not self.batch:
+            return
+        try:
+            with keep_dates(), transaction.atomic():
+                created = self.LOADERS[self.model](self, self.batch)
+        except IntegrityError as error:
+            raise TransferError(f'Порция записей {self.model}: {error}')
+        self.counts[self.model] = self.counts.get(self.model, 0) + created
+        self.batch = []
+
+    def _user_ids(self, usernames):
+        return dict(
+            User.objects.filter(username__in=set(usernames))
+            .values_list('username', 'pk')
+        )
+
+    def _load_users(self, rows):
+        users = []
+        for row in rows:
+            user = User(**{field: row.get(field) for field in USER_FIELDS})
+            user.date_joined = parse_datetime(user.date_joined)
+            if row.get('password'):
+                user.password = row['password']
+            else:
+                user.set_unusable_password()
+            users.append(user)
+        existing = set(self._user_ids(user.username for user in users))
+        User.objects.bulk_create(
+            [user for user in users if user.username not in existing],
+            ignore_conflicts=True,
+        )
+        return len(users) - len(existing)
+
+    def _load_groups(self, rows):
+        existing = set(
+            Group.objects.filter(slug__in={row['slug'] for row in rows})
+            .values_list('slug', flat=True)
+        )
+        groups = [Group(**row) for row in rows if row['slug'] not in existing]
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        return len(groups)
+
+    def _load_posts(self, rows):
+        users = self._user_ids(row['author__username'] for row in rows)
+        groups = dict(
+            Group.objects.filter(slug__in={row['group__slug'] for row in rows})
+            .values_list('slug', 'pk')
+        )
+        posts = []
+        for row in rows:
+            image = row['image'] or ''
+            if image and self.media_dir:
+                image = self._copy_media_in(image)
+            post = Post(
+                id=row['id'] + self.post_offset,
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                updated=parse_datetime(row['updated']),
+                author_id=users.get(row['author__username']),
+                group_id=groups.get(row['group__slug']),
+                image=image,
+                image_width=row['image_width'],
+                image_height=row['image_height'],
+            )
+            posts.append(post)
+        Post.objects.bulk_create(posts)
+        return len(posts)
+
+    def _load_comments(self, rows):
+        users = self._user_ids(row['author__username'] for row in rows)
+        post_ids = set(
+            Post.objects.filter(
+                pk__in={row['post_id'] + self.post_offset for row in rows}
+            ).values_list('pk', flat=True)
+        )
+        comments = []
+        for row in rows:
+            author_id = users.get(row['author__username'])
+            if author_id is None:
+                raise TransferError(
+                    f'Нет автора комментария: {row["author__username"]}'
+                )
+            post_id = row['post_id'] + self.post_offset
+            if post_id not in post_ids:
+                raise TransferError(
+                    f'Нет поста комментария: {row["post_id"]}'
+                )
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=author_id,
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            ))
+        Comment.objects.bulk_create(comments)
+        return len(comments)
+
+    def _load_follows(self, rows):
+        users = self._user_ids(
+            name for row in rows
+            for name in (row['user__username'], row['author__username'])
+        )
+        follows = [
+            Follow(
+                user_id=users[row['user__username']],
+                author_id=users[row['author__username']],
+            )
+            for row in rows
+            if row['user__username'] in users
+            and row['author__username'] in users
+            and row['user__username'] != row['author__username']
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        return len(follows)
+
+    LOADERS = {
+        'user': _load_users,
+        'group': _load_groups,
+        'post': _load_posts,
+        'comment': _load_comments,
+        'follow': _load_follows,
+    }
+
+    def _copy_media_in(self, name):
+        """Сохраняет файл из media_dir в хранилище; возвращает итоговое имя."""
+        source = os.path.join(self.media_dir, name)
+        if not os.path.exists(source):
+            return name
+        with open(source, 'rb') as stream:
+            return default_storage.save(name, stream)
+
+    def finish(self):
+        """Сбрасывает последнюю порцию и сдвигает последовательности id."""
+        self.flush()
+        sql = connection.ops.sequence_reset_sql(no_style(), [Post])
+        if sql:
+            with connection.cursor() as cursor:
+                for statement in sql:
+                    cursor.execute(statement)
+
+    def refresh_derived(self):
+        """Пересчитывает обойдённое bulk_create: счётчики, ленты и их кэш."""
+        counters.reconcile()
+        posts = Post.objects.filter(pk__gt=self.post_offset)
+        # Ленты меняются у новых подписчиков и у подписчиков авторов
+        # загруженных постов
+        readers = Follow.objects.filter(
+            Q(pk__gt=self.follow_offset)
+            | Q(author_id__in=posts.values('author_id'))
+        )
+        size = self.batch_size
+        for user_ids in distinct_batches(readers, 'user_id', size):
+            timeline.rebuild(user_ids)
+            feed_cache.bump_many(
+                feed_cache.follow_scope(user_id) for user_id in user_ids
+            )
+        for author_ids in distinct_batches(posts, 'author_id', size):
+            feed_cache.bump_many(
+                feed_cache.author_scope(author_id) for author_id in author_ids
+            )
+        for group_ids in distinct_batches(posts, 'group_id', size):
+            feed_cache.bump_many(
+                feed_cache.group_scope(group_id) for group_id in group_ids
+            )
+        feed_cache.bump(feed_cache.GLOBAL)
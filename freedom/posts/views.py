@@ -1,78 +1,212 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import redirect, render, get_object_or_404
-from django.views.decorators.cache import cache_page
+from django.utils.functional import SimpleLazyObject
+
+from core import streaming
+from core.decorators import query_budget
 
+from . import counters, feed_cache, follow_graph, search, thumbnails, timeline
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
+from .models import Comment, Post, Group, User
+from .paginator import KeysetPaginator
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# Комментарии идут от старых к новым, ключ курсора совпадает с индексом
+# (post, created, id)
+COMMENTS_ORDERING = ('created', 'id')
+# Сверх этого числа записей точный итог ленты не считаем
+FEED_TOTAL_LIMIT = 1000
+
+
+def get_page_obj(request, post_list, total_limit=FEED_TOTAL_LIMIT):
+    # Страница выбирается по курсору из параметра cursor, а не по номеру:
+    # так глубокие страницы не становятся медленнее первой
+    # Страница читается при первом обращении: в потоковом рендере
+    # шапка уходит клиенту раньше запроса постов
+    paginator = KeysetPaginator(
+        post_list, POSTS_PER_PAGE, total_limit=total_limit
+    )
+    return SimpleLazyObject(
+        lambda: paginator.get_page(request.GET.get('cursor'))
+    )
+
+
+def get_comments_page(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related('author')
+    paginator = KeysetPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=COMMENTS_ORDERING
+    )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+# Области кэша страниц (см. posts.feed_cache): каждая функция стоит
+# не больше одного запроса по индексу; None - страницу не кэшируем
+
+
+def index_scopes(request):
+    return [feed_cache.GLOBAL]
+
+
+def group_scopes(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('id', flat=True).first()
+    )
+    return None if group_id is None else [feed_cache.group_scope(group_id)]
+
+
+def profile_scopes(request, username):
+    user_id = (
+        User.objects.filter(username=username)
+        .values_list('id', flat=True).first()
+    )
+    return None if user_id is None else [feed_cache.author_scope(user_id)]
+
+
+def post_detail_scopes(request, post_id):
+    post = Post.objects.filter(pk=post_id).values_list('author_id', flat=True)
+    if not post:
+        return None
+    return [feed_cache.post_scope(post_id), feed_cache.author_scope(post[0])]
+
 
+def follow_scopes(request):
+    return [feed_cache.follow_scope(request.user.id)] + [
+        feed_cache.author_scope(author_id)
+        for author_id in timeline.followed_celebrities(request.user.id)
+    ]
 
-@cache_page(20)
+
+@query_budget(4)
+@feed_cache.cache_feed(index_scopes)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_page_obj(request, post_list)
     # Отдаем в словаре контекста
     context = {
         'page_obj': page_obj,
         'index': 'index',
     }
     template = 'posts/index.html'
-    return render(request, template, context)
+    return streaming.render(request, template, context)
 
 
+@query_budget(6)
+@feed_cache.cache_feed(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author', 'group')
+    page_obj = get_page_obj(request, post_list)
     context = {
         'page_obj': page_obj,
         'group': group,
     }
     template = 'posts/group_list.html'
-    return render(request, template, context)
+    return streaming.render(request, template, context)
 
 
+@query_budget(6)
+@feed_cache.cache_feed(profile_scopes)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
-    count = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = counters.stats_for(user)
+    post_list = user.posts.select_related('author', 'group')
+    # Число постов берём из счётчика, пагинатору считать итог не нужно
+    page_obj = get_page_obj(request, post_list, total_limit=None)
     context = {
         'username': user,
-        'count': count,
+        'count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
     }
-    if request.user.is_authenticated:
-        follower = User.objects.get(username=request.user)
-        if Follow.objects.filter(author=user, user=follower).exists():
-            context.update({'following': 'following'})
+    if follow_graph.is_following(request.user.id, user.id):
+        context.update({'following': 'following'})
     template = 'posts/profile.html'
-    return render(request, template, context)
+    return streaming.render(request, template, context)
 
 
+@query_budget(5)
+@feed_cache.cache_feed(post_detail_scopes)
 def post_detail(request, post_id):
-    post_detail = get_object_or_404(Post, id=post_id)
-    count = post_detail.author.posts.count()
+    post_detail = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    count = counters.stats_for(post_detail.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post_detail.comments.all()
+    # Показываем первую страницу комментариев, следующие подгружаются
+    # фрагментами из post_comments
+    comments = get_comments_page(request, post_id)
     context = {
         'count': count,
         'post_detail': post_detail,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'post_id': post_id,
     }
     template = 'posts/post_detail.html'
     return render(request, template, context)
 
 
+@query_budget(4)
+@feed_cache.cache_feed(post_detail_scopes)
+def post_comments(request, post_id):
+    """Следующая страница комментариев поста HTML-фрагментом."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Пост не найден')
+    context = {
+        'comments': get_comments_page(request, post_id),
+        'post_id': post_id,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(8)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    author_name = request.GET.get('author', '').strip()
+    group_slug = request.GET.get('group', '').strip()
+    author = group = None
+    found_filters = True
+    if author_name:
+        author = User.objects.filter(username=author_name).first()
+        found_filters = author is not None
+    if group_slug:
+        group = Group.objects.filter(slug=group_slug).first()
+        found_filters = found_filters and group is not None
+    page_obj = None
+    if query and found_filters:
+        paginator = search.search_paginator(
+            Post.objects.select_related('author', 'group'),
+            query,
+            POSTS_PER_PAGE,
+            author_id=author.pk if author else None,
+            group_id=group.pk if group else None,
+        )
+        if paginator is not None:
+            page_obj = paginator.get_page(request.GET.get('cursor'))
+    # Ссылки пагинатора должны сохранять запрос и фильтры
+    params = {key: value for key, value in (
+        ('q', query), ('author', author_name), ('group', group_slug)
+    ) if value}
+    context = {
+        'query': query,
+        'author_name': author_name,
+        'group_slug': group_slug,
+        'groups': Group.objects.order_by('title').values_list('slug', 'title'),
+        'page_obj': page_obj,
+        'page_query': urlencode(params) + '&',
+    }
+    return streaming.render(request, 'posts/search.html', context)
+
+
+# Без пула процессов (POST_THUMBNAIL_WORKERS = 0) миниатюры картинки
+# создаются прямо в запросе, и их запросы тоже входят в бюджет
+@query_budget(16)
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -87,6 +221,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', username=request.user)
     # Если условие if form.is_valid() ложно и данные не прошли валидацию - 
     # передадим полученный объект в шаблон,
@@ -96,9 +231,10 @@ def post_create(request):
     return render(request, template, {'form': form})
 
 
+@query_budget(12)
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post_id=post_id)
     if request.method == 'POST':
         form = PostForm(
@@ -109,7 +245,7 @@ def post_edit(request, post_id):
     else:
         form = PostForm(instance=post)
     if form.is_valid():
-        form.save()
+        thumbnails.schedule(form.save())
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -120,6 +256,7 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@query_budget(5)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -132,46 +269,36 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(7)
 @login_required
+@feed_cache.cache_feed(follow_scopes)
 def follow_index(request):
-    # информация о текущем пользователе доступна в переменной request.test_user
-    # Напишите view-функцию страницы, куда будут выведены посты авторов, на которых подписан текущий пользователь.
-    user = User.objects.get(username=request.user).follower.all()
-    author = []
-    for i in user:
-        author.append(i.author_id)
-    posts = Post.objects.filter(author__in=author)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = timeline.follow_paginator(request.user, POSTS_PER_PAGE)
+    page_obj = SimpleLazyObject(
+        lambda: paginator.get_page(request.GET.get('cursor'))
+    )
     context = {
         'page_obj': page_obj,
         'follow': 'follow',
     }
     template = 'posts/follow.html'
-    return render(request, template, context)
+    return streaming.render(request, template, context)
 
 
+@query_budget(12)
 @login_required
 def profile_follow(request, username):
-    follower_user = User.objects.get(username=request.user)
+    # Подписаться на автора: повторная подписка и подписка на себя
+    # ничего не меняют
     following_user = get_object_or_404(User, username=username)
-    Follow.objects.create(
-        user=follower_user,
-        author=following_user
-    )
+    follow_graph.follow(request.user, following_user)
     return redirect('posts:profile', username=username)
-    # Подписаться на автора
 
 
+@query_budget(12)
 @login_required
 def profile_unfollow(request, username):
     # Дизлайк, отписка
-    follower_user = User.objects.get(username=request.user)
     following_user = get_object_or_404(User, username=username)
-    dislike = Follow.objects.filter(
-        user=follower_user,
-        author=following_user
-    )
-    dislike.delete()
+    follow_graph.unfollow(request.user, following_user)
     return redirect('posts:profile', username=username)
@@ -0,0 +1,22 @@
+// Подгрузка следующей страницы комментариев на место кнопки «Показать ещё»
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('[data-fragment-url]');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    var more = link.closest('[data-comments-more]');
+    fetch(link.dataset.fragmentUrl, {credentials: 'same-origin'})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.text();
+        })
+        .then(function (html) {
+            more.outerHTML = html;
+        })
+        .catch(function () {
+            window.location = link.href;
+        });
+});
@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -24,6 +28,12 @@ SECRET_KEY = ')e!b%@-#7$&7sat90u9u1er$#ewlqj_7h5014ag*+isppjy5ps'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Превышение бюджета SQL-запросов view - ошибка при разработке и в тестах
+QUERY_BUDGET_RAISE = DEBUG or 'test' in sys.argv
+# Запросы sorl-thumbnail к своему хранилищу ключей в бюджет view не входят:
+# при тёплом кэше их нет, а при холодном их число зависит от картинок
+QUERY_BUDGET_IGNORE_TABLES = ('thumbnail_kvstore',)
+
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'testserver', '[::1]', ]
 
 # Application definition
@@ -44,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +72,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,11 +92,35 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Один файл SQLite, два соединения: основное для записи и только для чтения
+# (core.routers.ReadWriteRouter). Соединения живут между запросами,
+# каждое новое настраивается прагмами SQLITE_PRAGMAS (core.signals)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+    },
+    'replica': {
+        'ENGINE': 'core.sqlite',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'READ_ONLY': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['core.routers.ReadWriteRouter']
+SQLITE_PRAGMAS = {
+    # Читатели не ждут писателя, писатель - читателей
+    'journal_mode': 'wal',
+    # Сколько миллисекунд ждать блокировку записи, прежде чем вернуть ошибку
+    'busy_timeout': 5000,
+    # В режиме WAL NORMAL не теряет целостность, fsync - только на checkpoint
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер кэша страниц в КиБ
+    'cache_size': -64000,
+    'temp_store': 'memory',
 }
 
 # Password validation
@@ -139,11 +175,76 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Тесты держат общие файлы SQLite (кэш и метрики) во временном каталоге,
+# чтобы не трогать файлы сайта. ':memory:' не годится: у каждого
+# соединения, а значит и у каждого потока, была бы своя пустая база
+TEST_DATA_DIR = None
+if 'test' in sys.argv:
+    TEST_DATA_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+    atexit.register(shutil.rmtree, TEST_DATA_DIR, ignore_errors=True)
+
+# Один файл SQLite на хост: все воркеры видят общий кэш и общие версии лент
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(TEST_DATA_DIR or BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
+# Страницы лент сбрасываются сменой версий при изменении данных,
+# поэтому хранить их можно долго
+FEED_CACHE_TIMEOUT = 60 * 60
+# Потоковый рендер лент (core.streaming): шапка страницы уходит сразу,
+# карточки постов - по мере готовности. Потоковые ответы не попадают
+# в кэш страниц, поэтому режим выключен по умолчанию
+STREAMING_RENDER = False
+# Карточки постов кэшируются по ключу из id поста, даты изменения
+# и размера картинки, поэтому устаревать сами по себе им не нужно
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+POST_CARD_THUMBNAIL_GEOMETRY = '960x339'
+# Миниатюры этих размеров создаются в пуле процессов сразу после сохранения
+# поста; без пула (в тестах) - прямо в запросе
+POST_THUMBNAIL_GEOMETRIES = (POST_CARD_THUMBNAIL_GEOMETRY,)
+# Размер пула (posts.background); там же догружаются ленты подписчиков
+# автора, опустившегося до порога знаменитостей
+POST_THUMBNAIL_WORKERS = 0 if 'test' in sys.argv else 2
+POST_THUMBNAIL_LOCK_TIMEOUT = 5 * 60
+# Варианты картинок для srcset: ширины, качество и ширина карточки на экране
+POST_IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+POST_IMAGE_VARIANT_QUALITY = 80
+POST_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+# Нормализация загруженных картинок: наибольшая сторона после уменьшения,
+# предел числа пикселей до распаковки и качество JPEG
+POST_IMAGE_MAX_SIZE = 2560
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_UPLOAD_QUALITY = 90
+# Поиск ранжирует столько самых новых совпадений: время ответа не растёт с базой
+SEARCH_WINDOW = 1000
+# Админка считает записи не дальше этого предела, без фильтров - по статистике
+ADMIN_COUNT_LIMIT = 10000
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+# Метрики Prometheus (core.metrics): процессы раз в METRICS_FLUSH_INTERVAL
+# секунд прибавляют свои значения к общему файлу, страница метрик
+# отдаётся только с адресов METRICS_ALLOWED_IPS
+METRICS_DB = os.path.join(TEST_DATA_DIR or BASE_DIR, 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 10
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+# Разбивка запроса по фазам (SQL, кэш, шаблоны, миниатюры): строка JSON
+# в логгер core.metrics.timing для каждого запроса и заголовок Server-Timing,
+# который получают только адреса METRICS_ALLOWED_IPS и сотрудники
+SERVER_TIMING = True
+SERVER_TIMING_LOG = True
+
+# Лента подписок: авторы, у которых подписчиков больше порога, не копируют
+# посты в ленты подписчиков, а подмешиваются в ленту при чтении
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+TIMELINE_CELEBRITIES_TIMEOUT = 60 * 5
+TIMELINE_BATCH_SIZE = 500
+# Множества подписок в кэше сбрасываются при подписке и отписке,
+# срок жизни только ограничивает ошибку при гонке с чтением
+FOLLOW_GRAPH_TIMEOUT = 60 * 60